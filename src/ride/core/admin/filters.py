@@ -0,0 +1,57 @@
+from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.exceptions import ValidationError
+from django.http import QueryDict
+
+
+class RelatedIdFilter(admin.SimpleListFilter):
+    """
+    Filters on a foreign key by the id typed in a text box, where filtering
+    on the field itself would render every related row as an option.
+    """
+    template = 'admin/core/id_filter.html'
+    # field the id is matched against, e.g. 'id_ride'
+    field_name = None
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value is None:
+            return queryset
+        field = queryset.model._meta.get_field(self.field_name).target_field
+        try:
+            value = field.to_python(value.strip())
+        except ValidationError:
+            return queryset.none()
+        return queryset.filter(**{self.field_name: value})
+
+    def choices(self, changelist):
+        # The other filters of the list, kept when the id is submitted
+        query = QueryDict(changelist.get_query_string(remove=[self.parameter_name, PAGE_VAR])[1:])
+        yield {
+            'hidden_params': [(name, value) for name, values in query.lists() for value in values],
+            'value': self.value() or '',
+        }
+
+
+class RideIdFilter(RelatedIdFilter):
+    title = 'ride id'
+    parameter_name = 'id_ride'
+    field_name = 'id_ride'
+
+
+class RiderIdFilter(RelatedIdFilter):
+    title = 'rider id'
+    parameter_name = 'id_rider'
+    field_name = 'id_rider'
+
+
+class DriverIdFilter(RelatedIdFilter):
+    title = 'driver id'
+    parameter_name = 'id_driver'
+    field_name = 'id_driver'
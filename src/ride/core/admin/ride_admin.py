@@ -1,9 +1,15 @@
 from django.contrib import admin
+from core.admin.filters import DriverIdFilter, RiderIdFilter
+from core.admin.scalable_admin import ScalableModelAdmin
 from core.models.ride import Ride
 
 @admin.register(Ride)
-class RideAdmin(admin.ModelAdmin):
+class RideAdmin(ScalableModelAdmin):
     model = Ride
     list_display = ('id_ride', 'id_driver', 'id_rider', 'status')
-    list_filter = ('status',)
-    ordering = ('-created_at',)
\ No newline at end of file
+    list_select_related = ('id_driver', 'id_rider')
+    list_filter = ('status', DriverIdFilter, RiderIdFilter)
+    search_fields = ('=id_ride',)
+    autocomplete_fields = ('id_driver', 'id_rider')
+    # newest first along the primary key; created_at is not indexed
+    ordering = ('-id_ride',)
\ No newline at end of file
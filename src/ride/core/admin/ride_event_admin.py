@@ -1,10 +1,15 @@
 from django.contrib import admin
+from core.admin.filters import RideIdFilter
+from core.admin.scalable_admin import ScalableModelAdmin
 from core.models.ride_event import RideEvent
 
 @admin.register(RideEvent)
-class RideEventAdmin(admin.ModelAdmin):
+class RideEventAdmin(ScalableModelAdmin):
     model = RideEvent
     list_display = ('id_ride_event', 'id_ride', 'description', 'created_at', 'updated_at')
-    search_fields = ('description',)
-    list_filter = ('id_ride',)
+    # a ride is labelled with its rider and driver
+    list_select_related = ('id_ride__id_rider', 'id_ride__id_driver')
+    search_fields = ('=id_ride_event', '=id_ride')
+    list_filter = (RideIdFilter,)
+    raw_id_fields = ('id_ride',)
     ordering = ('-id_ride_event',)
@@ -0,0 +1,51 @@
+from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR, PAGE_VAR
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import Q
+
+from core.utils.count_helpers import CountingPaginator, get_count_cache_key
+
+# Changelist params that do not change which rows are counted
+UNCOUNTED_PARAMS = (PAGE_VAR, ORDER_VAR, '_changelist_filters')
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    """
+    Changelist for tables of millions of rows. The total comes from
+    `CountingPaginator` (the planner estimate for the whole table, a cached
+    exact count once filtered) and the unfiltered total is not counted a
+    second time. Searches compare the whole term to `=<field>` search fields
+    only, so that each one is an index lookup.
+    """
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        params = request.GET.copy()
+        for param in UNCOUNTED_PARAMS:
+            params.pop(param, None)
+        return CountingPaginator(
+            queryset, per_page, count_cache_key=get_count_cache_key(queryset, params),
+            orphans=orphans, allow_empty_first_page=allow_empty_first_page,
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Rows whose `search_fields` equal the term, case-insensitively for
+        text. Fields the term is not a valid value of (e.g. a name for an id)
+        are skipped.
+        """
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        query = Q()
+        for name in self.search_fields:
+            name = name.removeprefix('=')
+            field = self.model._meta.get_field(name)
+            try:
+                value = field.to_python(term)
+            except ValidationError:
+                continue
+            lookup = f'{name}__iexact' if isinstance(field, models.CharField) else name
+            query |= Q(**{lookup: value})
+        return (queryset.filter(query) if query else queryset.none()), False
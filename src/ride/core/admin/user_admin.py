@@ -1,10 +1,12 @@
 from django.contrib import admin
+from core.admin.scalable_admin import ScalableModelAdmin
 from core.models.user import User
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(ScalableModelAdmin):
     model = User
     list_display = ('id_user', 'role', 'first_name', 'last_name', 'email', 'phone_number')
-    search_fields = ('first_name', 'last_name', 'email')
+    # email through user_email_upper_idx
+    search_fields = ('=id_user', '=email')
     list_filter = ('role',)
     ordering = ('-id_user',)
\ No newline at end of file
@@ -0,0 +1,312 @@
+import json
+import platform
+import random
+import subprocess
+import time
+from io import StringIO
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Ride, User
+from core.utils.explain_helpers import explain, rows_scanned
+from core.utils.synthetic_data_helpers import parse_count_range
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples, percent):
+    """Nearest-rank percentile of sorted samples."""
+    index = max(0, min(len(samples) - 1, -(-len(samples) * percent // 100) - 1))
+    return samples[index]
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks latency, queries and rows scanned of the API hot paths on seeded datasets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[1000, 10000, 100000],
+            help='Number of rides of each seeded dataset',
+        )
+        parser.add_argument(
+            '--existing-data',
+            action='store_true',
+            help='Benchmark the data already in the database instead of seeding datasets',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='Timed requests per case',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=5,
+            help='Untimed requests per case before timing',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Seed of the datasets and request parameters',
+        )
+        parser.add_argument(
+            '--events-per-ride',
+            type=parse_count_range,
+            default='2-5',
+            help='Events per ride of the seeded datasets, as N or MIN-MAX',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes loading the seeded datasets',
+        )
+        parser.add_argument(
+            '--with-cache',
+            action='store_true',
+            help='Keep the ride list and count caches enabled (by default every request hits the database)',
+        )
+        parser.add_argument(
+            '--username',
+            default='admin',
+            help='Admin user to obtain tokens for',
+        )
+        parser.add_argument(
+            '--password',
+            default='admin123',
+            help='Password of the admin user',
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the results as JSON to this file',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Results file of a previous run; exit with an error on regressions',
+        )
+        parser.add_argument(
+            '--max-regression',
+            type=float,
+            default=0.2,
+            help='Tolerated relative increase of p95 latency and rows scanned over the baseline (default 0.2)',
+        )
+        parser.add_argument(
+            '--noinput', '--no-input',
+            action='store_false',
+            dest='interactive',
+            help='Do not ask for confirmation before replacing the data',
+        )
+
+    def handle(self, *args, **kwargs):
+        if kwargs['repeat'] < 1:
+            raise CommandError('--repeat must be positive.')
+
+        if not kwargs['existing_data'] and kwargs['interactive']:
+            confirm = input(
+                'Seeding the benchmark datasets deletes every user, ride and ride event in the '
+                f'"{connection.settings_dict["NAME"]}" database.\nType \'yes\' to continue: '
+            )
+            if confirm != 'yes':
+                raise CommandError('Benchmark cancelled.')
+
+        cache_settings = {} if kwargs['with_cache'] else {'RIDE_LIST_CACHE_TIMEOUT': 0, 'COUNT_CACHE_TIMEOUT': 0}
+        results = []
+        with override_settings(**cache_settings):
+            if kwargs['existing_data']:
+                results += self.run_cases(Ride.objects.count(), kwargs)
+            else:
+                for size in kwargs['sizes']:
+                    self.seed_dataset(size, kwargs)
+                    results += self.run_cases(size, kwargs)
+
+        report = {'meta': self.get_meta(kwargs), 'results': results}
+        if kwargs['output']:
+            with open(kwargs['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Results written to {kwargs["output"]}'))
+
+        if kwargs['baseline']:
+            self.compare_with_baseline(report, kwargs['baseline'], kwargs['max_regression'])
+
+    def seed_dataset(self, size, kwargs):
+        self.stdout.write(f'Seeding {size} rides...')
+        call_command(
+            'init_data',
+            clean=True,
+            users=max(15, size // 100),
+            rides=size,
+            events_per_ride=kwargs['events_per_ride'],
+            seed=kwargs['seed'],
+            workers=kwargs['workers'],
+            stdout=StringIO(),
+        )
+        # Fresh planner statistics, so plans match what production would pick
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def get_cases(self, rng, repeat, credentials):
+        """
+        `(name, method, request)` of each benchmarked case, where `request(i)`
+        returns the path and data of the ith request. Ride ids and rider
+        emails are drawn up front so the lookups are not part of the timing.
+        """
+        rider_emails = list(
+            User.objects.filter(role='rider').order_by('id_user').values_list('email', flat=True)[:1000]
+        )
+        ride_ids = []
+        last_ride_id = Ride.objects.order_by('-id_ride').values_list('id_ride', flat=True).first() or 0
+        for _ in range(repeat):
+            ride_id = Ride.objects.filter(
+                id_ride__gte=rng.randint(1, max(last_ride_id, 1))
+            ).order_by('id_ride').values_list('id_ride', flat=True).first()
+            if ride_id is not None:
+                ride_ids.append(ride_id)
+
+        cases = [
+            ('ride list', 'get', lambda i: ('/api/rides/', {})),
+            ('ride list status', 'get', lambda i: ('/api/rides/', {'status': 'en-route'})),
+            ('ride list distance', 'get', lambda i: (
+                '/api/rides/', {'latitude': 37.7749, 'longitude': -122.4194, 'ordering': 'distance_to_pickup'}
+            )),
+            ('event list', 'get', lambda i: ('/api/ride-events/', {})),
+            ('token obtain', 'post', lambda i: ('/api/token/', credentials)),
+        ]
+        if rider_emails:
+            cases.insert(2, ('ride list rider', 'get', lambda i: (
+                '/api/rides/', {'rider_email': rider_emails[i % len(rider_emails)]}
+            )))
+        if ride_ids:
+            cases.insert(-2, ('ride retrieve', 'get', lambda i: (f'/api/rides/{ride_ids[i % len(ride_ids)]}/', {})))
+        return cases
+
+    def run_cases(self, size, kwargs):
+        credentials = {'username': kwargs['username'], 'password': kwargs['password']}
+        client = APIClient()
+        response = client.post('/api/token/', credentials)
+        if response.status_code != 200:
+            raise CommandError(f'Could not obtain a token for {kwargs["username"]}: {response.content.decode()}')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+
+        rng = random.Random(kwargs['seed'])
+        results = []
+        self.stdout.write(
+            f'{"rides":>10} {"case":<20} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"queries":>8} {"rows scanned":>13}'
+        )
+        for name, method, request in self.get_cases(rng, kwargs['repeat'], credentials):
+            send = getattr(client, method)
+
+            for i in range(kwargs['warmup']):
+                send(*request(i))
+
+            samples = []
+            for i in range(kwargs['repeat']):
+                path, data = request(i)
+                start = time.perf_counter()
+                response = send(path, data)
+                samples.append((time.perf_counter() - start) * 1000)
+                if response.status_code >= 400:
+                    raise CommandError(f'{name}: {method.upper()} {path} returned {response.status_code}')
+            samples.sort()
+
+            queries, scanned = self.measure_queries(send, *request(0))
+            result = {
+                'rides': size,
+                'case': name,
+                **{f'p{percent}_ms': round(percentile(samples, percent), 3) for percent in PERCENTILES},
+                'mean_ms': round(sum(samples) / len(samples), 3),
+                'queries': queries,
+                'rows_scanned': scanned,
+            }
+            results.append(result)
+            self.stdout.write(
+                f'{size:>10} {name:<20} {result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f} '
+                f'{result["p99_ms"]:>9.2f} {queries:>8} {"n/a" if scanned is None else scanned:>13}'
+            )
+        return results
+
+    def measure_queries(self, send, path, data):
+        """
+        Queries issued by one request and, on Postgres, the rows their plans
+        scanned according to `EXPLAIN ANALYZE`.
+        """
+        with CaptureQueriesContext(connection) as context:
+            send(path, data)
+
+        if connection.vendor != 'postgresql':
+            return len(context.captured_queries), None
+
+        scanned = 0
+        for query in context.captured_queries:
+            if query['sql'].lstrip().upper().startswith('SELECT'):
+                scanned += rows_scanned(explain(query['sql'], analyze=True))
+        return len(context.captured_queries), scanned
+
+    def get_meta(self, kwargs):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'created_at': timezone.now().isoformat(),
+            'commit': commit,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'database_version': getattr(connection, 'pg_version', None),
+            'seed': kwargs['seed'],
+            'repeat': kwargs['repeat'],
+            'with_cache': kwargs['with_cache'],
+            'existing_data': kwargs['existing_data'],
+        }
+
+    def compare_with_baseline(self, report, path, max_regression):
+        """
+        Fail on any case slower at p95, issuing more queries or scanning more
+        rows than the same case in the baseline.
+        """
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        for key in ('database', 'seed', 'repeat', 'with_cache'):
+            if baseline['meta'].get(key) != report['meta'][key]:
+                self.stdout.write(self.style.WARNING(
+                    f'Baseline {key} differs ({baseline["meta"].get(key)} vs {report["meta"][key]}), '
+                    'results may not be comparable'
+                ))
+
+        previous = {(result['rides'], result['case']): result for result in baseline['results']}
+        regressions = []
+        for result in report['results']:
+            old = previous.get((result['rides'], result['case']))
+            if old is None:
+                continue
+            label = f'{result["case"]} ({result["rides"]} rides)'
+            if result['p95_ms'] > old['p95_ms'] * (1 + max_regression):
+                regressions.append(f'{label}: p95 {old["p95_ms"]:.2f} ms -> {result["p95_ms"]:.2f} ms')
+            if result['queries'] > old['queries']:
+                regressions.append(f'{label}: queries {old["queries"]} -> {result["queries"]}')
+            if (
+                result['rows_scanned'] is not None and old.get('rows_scanned') is not None
+                and result['rows_scanned'] > old['rows_scanned'] * (1 + max_regression)
+            ):
+                regressions.append(f'{label}: rows scanned {old["rows_scanned"]} -> {result["rows_scanned"]}')
+
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(regression)
+            raise CommandError(f'{len(regressions)} performance regression(s) against {path}')
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {path}'))
@@ -0,0 +1,66 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Ride
+from core.serializers import FastRideSerializer, RideSerializer
+from core.utils.location_helpers import calculate_distance_annotation
+
+
+class Command(BaseCommand):
+    help = 'Compares RideSerializer with the compiled read-only serializer on ride list pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page-sizes',
+            type=int,
+            nargs='+',
+            default=[10, 100],
+            help='Page sizes to benchmark',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=200,
+            help='Number of timed runs per page size and serializer',
+        )
+        parser.add_argument(
+            '--with-distance',
+            action='store_true',
+            help='Annotate distance_to_pickup like a distance-ordered list',
+        )
+
+    def handle(self, *args, **kwargs):
+        renderer = JSONRenderer()
+        queryset = Ride.objects.select_related('id_rider', 'id_driver').order_by('-pickup_time')
+        if kwargs['with_distance']:
+            queryset = queryset.annotate(distance_to_pickup=calculate_distance_annotation(37.7749, -122.4194))
+
+        self.stdout.write(f'{"page size":>10} {"serializer":>12} {"median ms":>10} {"p95 ms":>8} {"speedup":>8}')
+        for page_size in kwargs['page_sizes']:
+            page = list(queryset[:page_size])
+            if len(page) < page_size:
+                raise CommandError(
+                    f'Only {len(page)} rides available for a page of {page_size}; load more data with init_data'
+                )
+
+            regular = renderer.render(RideSerializer(page, many=True).data)
+            fast = renderer.render(FastRideSerializer(page, many=True).data)
+            if regular != fast:
+                raise CommandError(f'Serializers disagree on a page of {page_size} rides')
+
+            timings = {}
+            for name, serializer_class in (('regular', RideSerializer), ('compiled', FastRideSerializer)):
+                samples = []
+                for _ in range(kwargs['repeat']):
+                    start = time.perf_counter()
+                    renderer.render(serializer_class(page, many=True).data)
+                    samples.append((time.perf_counter() - start) * 1000)
+                samples.sort()
+                timings[name] = (statistics.median(samples), samples[int(len(samples) * 0.95) - 1])
+
+            for name, (median, p95) in timings.items():
+                speedup = timings['regular'][0] / median
+                self.stdout.write(f'{page_size:>10} {name:>12} {median:>10.3f} {p95:>8.3f} {speedup:>7.2f}x')
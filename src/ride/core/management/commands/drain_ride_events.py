@@ -0,0 +1,101 @@
+import json
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+
+from core.utils.ingest_helpers import drain_batch, get_stream, ingest_stats
+
+
+class Command(BaseCommand):
+    help = 'Writes the ride events queued by the ingestion endpoint to the database, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of events read from the stream and inserted per batch',
+        )
+        parser.add_argument(
+            '--block-ms',
+            type=int,
+            default=1000,
+            help='Time to wait for new events when the stream is empty',
+        )
+        parser.add_argument(
+            '--consumer',
+            default=f'{socket.gethostname()}-{os.getpid()}',
+            help='Name of this worker in the consumer group; the default is unique per process',
+        )
+        parser.add_argument(
+            '--claim-idle-ms',
+            type=int,
+            default=settings.RIDE_EVENT_INGEST_CLAIM_IDLE_MS,
+            help='Take over the events another worker left unacknowledged for this long',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the stream is drained instead of waiting for new events',
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Print the lag of the stream as JSON and exit',
+        )
+
+    def handle(self, *args, **kwargs):
+        if kwargs['stats']:
+            self.stdout.write(json.dumps(ingest_stats(), indent=2))
+            return
+
+        stream = get_stream()
+        if stream.backend == 'memory':
+            self.stderr.write('The cache is not Redis: only events ingested by this process can be drained.')
+
+        stopping = []
+        # Finish the current batch on SIGTERM/SIGINT so it is acknowledged
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stopping.append(True))
+
+        totals = {'written': 0, 'duplicates': 0, 'rejected': 0, 'dead': 0}
+        while not stopping:
+            close_old_connections()
+            entries = stream.read(
+                kwargs['consumer'], kwargs['batch_size'], 0 if kwargs['once'] else kwargs['block_ms'],
+                kwargs['claim_idle_ms'],
+            )
+            if not entries:
+                if kwargs['once']:
+                    break
+                continue
+            try:
+                written, duplicates, rejected, failed, dead = drain_batch(stream, entries)
+            except DatabaseError as exc:
+                # Left pending: claimed again after --claim-idle-ms
+                self.stderr.write(f'Batch of {len(entries)} events not written: {exc}')
+                time.sleep(1)
+                continue
+
+            totals['written'] += written
+            totals['duplicates'] += duplicates
+            totals['rejected'] += len(rejected)
+            totals['dead'] += len(dead)
+            if rejected:
+                self.stderr.write(f'Dropped {len(rejected)} events of unknown rides: {", ".join(rejected)}')
+            if failed:
+                self.stderr.write(f'{len(failed)} events failed and stay pending: {", ".join(failed)}')
+            if dead:
+                self.stderr.write(f'Moved {len(dead)} events to the dead letter stream: {", ".join(dead)}')
+            if self.verbosity > 1:
+                self.stdout.write(f'Wrote {written} events ({duplicates} duplicates).')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {totals["written"]} events, skipped {totals["duplicates"]} duplicates '
+            f'and {totals["rejected"]} events of unknown rides, dead-lettered {totals["dead"]} events.'
+        ))
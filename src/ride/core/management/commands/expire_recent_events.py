@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Ride
+from core.utils.cache_helpers import invalidate_ride_lists
+from core.utils.ride_event_helpers import refresh_recent_events
+
+
+class Command(BaseCommand):
+    help = 'Drops expired entries from the recent events window of rides'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rides refreshed per batch',
+        )
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        now = timezone.now()
+        expired = Ride.objects.filter(recent_events_expire_at__lte=now)
+
+        total = 0
+        while True:
+            batch = list(expired.values_list('id_ride', 'status')[:batch_size])
+            if not batch:
+                break
+            refresh_recent_events([ride_id for ride_id, _ in batch], now=now)
+            invalidate_ride_lists(*{status for _, status in batch})
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Refreshed recent events of {total} rides.'))
@@ -1,10 +1,21 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User as DjangoUser
-from django.utils import timezone
+from django.db import connection, connections, transaction
+from django.db.models import IntegerField, Max
+from django.db.models.functions import Cast, Substr
 from core.models import User, Ride, RideEvent
-import random
-import datetime
-import json
+from core.utils.cache_helpers import invalidate_ride_lists, invalidate_user_lists
+from core.utils.rollup_helpers import rebuild_rollups
+from core.utils.synthetic_data_helpers import (
+    SyntheticDataGenerator, load_rows, parse_count_range, reset_sequences
+)
+import multiprocessing
+import time
+
+DEFAULT_USERS = 15
+DEFAULT_RIDES = 30
 
 class Command(BaseCommand):
     help = 'Initializes application with sample data'
@@ -22,214 +33,241 @@ class Command(BaseCommand):
         )
         parser.add_argument(
             '--rides',
-            action='store_true',
-            help='Create rides only',
+            type=int,
+            nargs='?',
+            const=DEFAULT_RIDES,
+            help=f'Number of rides to create (default {DEFAULT_RIDES}). '
+                 'Without --users, only rides and ride events are recreated',
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            help=f'Number of drivers and riders to create, one third drivers (default {DEFAULT_USERS})',
+        )
+        parser.add_argument(
+            '--events-per-ride',
+            type=parse_count_range,
+            default='2-5',
+            help='Events per ride, as N or MIN-MAX (default 2-5)',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=3,
+            help='Days of ride history before today (default 3)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='Random seed; the same seed generates the same data',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50000,
+            help='Rides generated and loaded per transaction (default 50000)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes generating and loading batches in parallel (default 1)',
         )
 
     def handle(self, *args, **kwargs):
         self.stdout.write(self.style.SUCCESS('Starting data initialization...'))
-        
+
+        rides = kwargs['rides']
+        users = kwargs['users']
+        if (rides is not None and rides < 0) or (users is not None and users < 2):
+            raise CommandError('--rides must not be negative and --users must be at least 2.')
+        if kwargs['batch_size'] < 1 or kwargs['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be positive.')
+
         # Clean existing data if needed
         if kwargs.get('clean', False):
             self.clean_data()
 
-        if kwargs.get('rides', False):
+        if rides is not None and users is None:
             self.clean_data(rides_only=True)
-
-            # Create rides only
-            self.create_rides()
-            # Create ride events
-            self.create_ride_events()
         else:
             # Create Django users and custom users
-            self.create_users()
-            
-            # Create rides
-            self.create_rides()
-            
-            # Create ride events
-            self.create_ride_events()
-        
+            self.create_users(DEFAULT_USERS if users is None else users)
+
+        # Create rides and their ride events
+        self.create_rides(
+            DEFAULT_RIDES if rides is None else rides,
+            events_per_ride=kwargs['events_per_ride'],
+            days=kwargs['days'],
+            seed=kwargs['seed'],
+            batch_size=kwargs['batch_size'],
+            workers=kwargs['workers'],
+        )
+
+        # The rows are loaded without model signals
+        self.stdout.write('Rebuilding analytics rollups...')
+        rebuild_rollups()
+
+        invalidate_user_lists()
+        invalidate_ride_lists()
         self.stdout.write(self.style.SUCCESS('Data initialization completed successfully!'))
-    
+
     def clean_data(self, rides_only=False):
         """Clean existing data"""
         self.stdout.write('Cleaning existing data...')
 
-        if rides_only:
-            RideEvent.objects.all().delete()
-            Ride.objects.all().delete()
-        else:
-            RideEvent.objects.all().delete()
-            Ride.objects.all().delete()
+        # Rides and events are flushed (TRUNCATE on Postgres) rather than deleted row by row
+        tables = [RideEvent._meta.db_table, Ride._meta.db_table]
+        connection.ops.execute_sql_flush(connection.ops.sql_flush(no_style(), tables, allow_cascade=True))
+
+        if not rides_only:
             User.objects.all().delete()
             DjangoUser.objects.filter(is_superuser=False).delete()
         self.stdout.write(self.style.SUCCESS('Existing data cleaned.'))
-    
-    def create_users(self):
-        """Create sample users with different roles"""
-        self.stdout.write('Creating users...')
-        
-        # Admin user
-        admin_user = DjangoUser.objects.create_user(
-            username='admin', 
-            email='admin@example.com', 
-            password='admin123',
-            is_staff=True
-        )
-        
-        admin_custom = User.objects.create(
-            id_user=admin_user.id,
-            role='admin',
-            first_name='Admin',
-            last_name='User',
-            email='admin@example.com',
-            phone_number='1234567890',
-            created_by=admin_user,
-            modified_by=admin_user
-        )
-        
-        # Create 5 drivers
-        drivers = []
-        for i in range(1, 6):
-            driver_user = DjangoUser.objects.create_user(
-                username=f'driver{i}',
-                email=f'driver{i}@example.com',
-                password='driver123'
-            )
-            
-            driver_custom = User.objects.create(
-                id_user=driver_user.id,
-                role='driver',
-                first_name=f'Driver{i}',
-                last_name='User',
-                email=f'driver{i}@example.com',
-                phone_number=f'2{i}34567890',
-                created_by=admin_user,
-                modified_by=admin_user
-            )
-            drivers.append(driver_custom)
-        
-        # Create 10 riders
-        riders = []
-        for i in range(1, 11):
-            rider_user = DjangoUser.objects.create_user(
-                username=f'rider{i}',
-                email=f'rider{i}@example.com',
-                password='rider123'
+
+    def get_admin_user(self):
+        admin_user = DjangoUser.objects.filter(username='admin').first()
+        if admin_user is None:
+            admin_user = DjangoUser.objects.create_user(
+                username='admin',
+                email='admin@example.com',
+                password='admin123',
+                is_staff=True
             )
-            
-            rider_custom = User.objects.create(
-                id_user=rider_user.id,
-                role='rider',
-                first_name=f'Rider{i}',
+        if not User.objects.filter(id_user=admin_user.id).exists():
+            User.objects.create(
+                id_user=admin_user.id,
+                role='admin',
+                first_name='Admin',
                 last_name='User',
-                email=f'rider{i}@example.com',
-                phone_number=f'3{i}34567890',
+                email='admin@example.com',
+                phone_number='1234567890',
                 created_by=admin_user,
                 modified_by=admin_user
             )
-            riders.append(rider_custom)
-        
-        self.stdout.write(self.style.SUCCESS(f'Created {len(drivers)} drivers and {len(riders)} riders.'))
-    
-    def create_rides(self):
-        """Create sample rides with various statuses"""
-        self.stdout.write('Creating rides...')
-        
-        # Get users by role
-        admin_user = DjangoUser.objects.get(username='admin')
-        drivers = User.objects.filter(role='driver')
-        riders = User.objects.filter(role='rider')
-        
-        # Status options with weights for random selection
-        statuses = ['pending', 'en-route', 'pickup', 'dropoff', 'completed', 'cancelled']
-        status_weights = [0.1, 0.2, 0.1, 0.1, 0.4, 0.1]  # More completed rides
-        
-        # Create 30 rides with different statuses
-        now = timezone.now()
-        rides = []
-        
-        for i in range(30):
-            # Random driver and rider
-            driver = random.choice(drivers)
-            rider = random.choice(riders)
-            
-            # Random status
-            status = random.choices(statuses, weights=status_weights)[0]
-            
-            # Random pickup time within +/- 3 days from now
-            pickup_time = now + datetime.timedelta(
-                days=random.randint(-3, 3),
-                hours=random.randint(-12, 12),
-                minutes=random.randint(-30, 30)
-            )
-            
-            # Random coordinates in a reasonable range
-            # These are roughly in the US
-            pickup_lat = random.uniform(37.0, 38.0)
-            pickup_long = random.uniform(-122.5, -121.5)
-            dropoff_lat = random.uniform(37.0, 38.0)
-            dropoff_long = random.uniform(-122.5, -121.5)
-            
-            ride = Ride.objects.create(
-                status=status,
-                id_rider=rider,
-                id_driver=driver,
-                pickup_latitude=pickup_lat,
-                pickup_longitude=pickup_long,
-                dropoff_latitude=dropoff_lat,
-                dropoff_longitude=dropoff_long,
-                pickup_time=pickup_time,
-                created_by=admin_user,
-                modified_by=admin_user
-            )
-            rides.append(ride)
-        
-        self.stdout.write(self.style.SUCCESS(f'Created {len(rides)} rides.'))
-    
-    def create_ride_events(self):
-        """Create sample ride events for the rides"""
-        self.stdout.write('Creating ride events...')
-        
-        admin_user = DjangoUser.objects.get(username='admin')
-        rides = Ride.objects.all()
-        event_descriptions = [
-            "Ride requested",
-            "Driver assigned",
-            "Driver en-route to pickup",
-            "Driver arrived at pickup location",
-            "Ride started",
-            "Approaching destination",
-            "Ride completed",
-            "Payment processed",
-            "Ride cancelled by rider",
-            "Ride cancelled by driver",
-            "Route changed",
-            "Unexpected delay",
-            "Traffic encountered"
-        ]
-        
-        events = []
-        # Create 2-5 events for each ride
-        for ride in rides:
-            num_events = random.randint(2, 5)
-            
-            # For completed rides, ensure they have the full flow
-            if ride.status == 'completed':
-                ride_events = event_descriptions[:7]  # Get the complete flow events
-                random.shuffle(ride_events)  # Shuffle to get a random subset if needed
-                ride_events = ride_events[:num_events]  # Take only the number we need
-            else:
-                ride_events = random.sample(event_descriptions, num_events)
-            
-            for event_desc in ride_events:
-                event = RideEvent.objects.create(
-                    id_ride=ride,
-                    description=event_desc,
+        return admin_user
+
+    def create_users(self, count):
+        """Create the admin user, then `count` drivers and riders in bulk"""
+        self.stdout.write('Creating users...')
+
+        admin_user = self.get_admin_user()
+        drivers = self.create_role_users('driver', 'Driver', '2', count // 3, admin_user)
+        riders = self.create_role_users('rider', 'Rider', '3', count - count // 3, admin_user)
+
+        self.stdout.write(self.style.SUCCESS(f'Created {drivers} drivers and {riders} riders.'))
+
+    def create_role_users(self, role, name, phone_prefix, count, admin_user):
+        # Every user of a role shares one password, so it is hashed only once
+        password = make_password(f'{role}123')
+        start = self.last_user_number(role) + 1
+        numbers = range(start, start + count)
+
+        django_users = DjangoUser.objects.bulk_create(
+            [
+                DjangoUser(username=f'{role}{i}', email=f'{role}{i}@example.com', password=password)
+                for i in numbers
+            ],
+            batch_size=5000
+        )
+        User.objects.bulk_create(
+            [
+                User(
+                    id_user=django_user.id,
+                    role=role,
+                    first_name=f'{name}{i}',
+                    last_name='User',
+                    email=f'{role}{i}@example.com',
+                    phone_number=f'{phone_prefix}{i}34567890',
                     created_by=admin_user,
                     modified_by=admin_user
                 )
-                events.append(event)
-        
-        self.stdout.write(self.style.SUCCESS(f'Created {len(events)} ride events.'))
\ No newline at end of file
+                for i, django_user in zip(numbers, django_users)
+            ],
+            batch_size=5000
+        )
+        reset_sequences([User])
+        return count
+
+    def last_user_number(self, role):
+        """Highest N of the existing `<role>N` usernames, so deleted users leave gaps instead of clashes"""
+        return DjangoUser.objects.filter(username__regex=rf'^{role}[0-9]+$').annotate(
+            number=Cast(Substr('username', len(role) + 1), IntegerField())
+        ).aggregate(last=Max('number'))['last'] or 0
+
+    def create_rides(self, count, events_per_ride, days, seed, batch_size, workers):
+        """Generate rides and their ride events, loaded in batches"""
+        self.stdout.write('Creating rides and ride events...')
+
+        admin_user = self.get_admin_user()
+        driver_ids = list(User.objects.filter(role='driver').values_list('id_user', flat=True))
+        rider_ids = list(User.objects.filter(role='rider').values_list('id_user', flat=True))
+        if count and not (driver_ids and rider_ids):
+            raise CommandError('Rides need at least one driver and one rider.')
+
+        generator = SyntheticDataGenerator(
+            rider_ids, driver_ids, user_id=admin_user.id, seed=seed, days=days, events_per_ride=events_per_ride
+        )
+
+        # Ids are assigned here so events can reference rides of the same batch;
+        # each batch owns a fixed range of event ids so batches are independent
+        first_ride_id = (Ride.objects.aggregate(last=Max('id_ride'))['last'] or 0) + 1
+        first_event_id = (RideEvent.objects.aggregate(last=Max('id_ride_event'))['last'] or 0) + 1
+        events_per_batch = batch_size * events_per_ride[1]
+        batches = [
+            (
+                index,
+                first_ride_id + offset,
+                min(batch_size, count - offset),
+                first_event_id + index * events_per_batch,
+            )
+            for index, offset in enumerate(range(0, count, batch_size))
+        ]
+
+        if connection.vendor == 'sqlite':
+            # SQLite serializes writers
+            workers = 1
+
+        started = time.monotonic()
+        created_rides = created_events = 0
+        if workers > 1:
+            # Child processes open their own connections
+            connections.close_all()
+            with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(generator,)) as pool:
+                for rides, events in pool.imap_unordered(_load_batch, batches):
+                    created_rides += rides
+                    created_events += events
+                    self.report_progress(created_rides, created_events, count, started)
+        else:
+            _init_worker(generator)
+            for batch in batches:
+                rides, events = _load_batch(batch)
+                created_rides += rides
+                created_events += events
+                self.report_progress(created_rides, created_events, count, started)
+
+        reset_sequences([Ride, RideEvent])
+        self.stdout.write(self.style.SUCCESS(f'Created {created_rides} rides and {created_events} ride events.'))
+
+    def report_progress(self, created_rides, created_events, count, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'  {created_rides}/{count} rides, {created_events} events '
+            f'({created_rides / elapsed if elapsed else 0:.0f} rides/s)'
+        )
+
+
+_generator = None
+
+
+def _init_worker(generator):
+    global _generator
+    _generator = generator
+
+
+def _load_batch(batch):
+    rides, events = _generator.batch(*batch)
+    with transaction.atomic():
+        load_rows(Ride, rides)
+        load_rows(RideEvent, events)
+    return len(rides), len(events)
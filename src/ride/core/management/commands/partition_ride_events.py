@@ -0,0 +1,98 @@
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from core.utils.partition_helpers import (
+    INTERVALS, convert_to_partitioned, count_default_rows, create_default_partition, create_partitions,
+    detach_partition, expired_partitions, is_partitioned, next_period, period_start
+)
+
+
+class Command(BaseCommand):
+    help = 'Maintains the range partitions of ride events: pre-creates future ones and applies the retention policy'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Convert the ride events table into a partitioned table (once, takes an exclusive lock)',
+        )
+        parser.add_argument(
+            '--interval',
+            choices=INTERVALS,
+            default=settings.RIDE_EVENT_PARTITION_INTERVAL,
+            help='Range of each partition',
+        )
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=settings.RIDE_EVENT_PARTITIONS_AHEAD,
+            help='Number of future partitions to keep created',
+        )
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            default=settings.RIDE_EVENT_RETENTION_DAYS,
+            help='Remove partitions holding only events older than this many days',
+        )
+        parser.add_argument(
+            '--detach-only',
+            action='store_true',
+            help='Detach expired partitions without dropping them (e.g. to archive them first)',
+        )
+        parser.add_argument(
+            '--backfill-from',
+            type=date.fromisoformat,
+            help='Also create the missing partitions from this date (YYYY-MM-DD), e.g. before loading history',
+        )
+
+    def handle(self, *args, **kwargs):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Ride event partitioning requires PostgreSQL.')
+        interval = kwargs['interval']
+        now = timezone.now()
+
+        if kwargs['convert']:
+            if is_partitioned():
+                raise CommandError('Ride events are already partitioned.')
+            history = convert_to_partitioned(interval)
+            if history:
+                self.stdout.write(self.style.SUCCESS(f'Converted; existing events are in partition {history}.'))
+            else:
+                self.stdout.write(self.style.SUCCESS('Converted an empty ride events table.'))
+        elif not is_partitioned():
+            raise CommandError('Ride events are not partitioned yet; run with --convert first.')
+
+        # Tables converted before the DEFAULT partition existed get one now
+        name = create_default_partition()
+        if name:
+            self.stdout.write(f'Created partition {name}')
+
+        until = period_start(now, interval)
+        for _ in range(kwargs['ahead']):
+            until = next_period(until, interval)
+
+        start = None
+        if kwargs['backfill_from']:
+            start = datetime.combine(kwargs['backfill_from'], time(), tzinfo=dt_timezone.utc)
+        for name in create_partitions(until, interval, start=start):
+            self.stdout.write(f'Created partition {name}')
+
+        retention_days = kwargs['retention_days']
+        if retention_days:
+            cutoff = now - timedelta(days=retention_days)
+            for name in expired_partitions(cutoff):
+                detach_partition(name, drop=not kwargs['detach_only'])
+                self.stdout.write(f'{"Detached" if kwargs["detach_only"] else "Dropped"} partition {name}')
+
+        stray = count_default_rows()
+        if stray:
+            # Left over when no partition was created for their period, e.g. late events of dropped periods
+            self.stderr.write(self.style.WARNING(
+                f'{stray} ride events are in the default partition; create their partitions with --backfill-from.'
+            ))
+
+        self.stdout.write(self.style.SUCCESS('Ride event partitions are up to date.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.utils.driver_helpers import prune_drivers
+
+
+class Command(BaseCommand):
+    help = 'Removes the drivers silent for DRIVER_LOCATION_TTL_SECONDS from the driver locations'
+
+    def handle(self, *args, **kwargs):
+        removed = prune_drivers()
+        self.stdout.write(self.style.SUCCESS(f'Removed {len(removed)} silent drivers.'))
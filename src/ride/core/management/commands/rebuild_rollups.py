@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.utils.rollup_helpers import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the analytics rollups of rides and ride events from their tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Only rebuild the hours from this ISO datetime on (default: every hour)',
+        )
+        parser.add_argument(
+            '--hours',
+            type=int,
+            help='Only rebuild the last N hours, e.g. from cron to catch up lost deltas',
+        )
+
+    def handle(self, *args, **kwargs):
+        since = None
+        if kwargs['since'] and kwargs['hours'] is not None:
+            raise CommandError('Give either --since or --hours.')
+        if kwargs['since']:
+            since = parse_datetime(kwargs['since'])
+            if since is None:
+                raise CommandError(f'Invalid --since datetime: {kwargs["since"]}')
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+        elif kwargs['hours'] is not None:
+            if kwargs['hours'] < 1:
+                raise CommandError('--hours must be positive.')
+            since = timezone.now() - timedelta(hours=kwargs['hours'])
+
+        rides, events = rebuild_rollups(since)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rides} ride rollup rows and {events} event rollup rows.'))
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_ride_pickup_time_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['pickup_latitude', 'pickup_longitude'], name='ride_pickup_lat_lon_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+from core.utils import geohash
+
+
+def backfill_pickup_geohash(apps, schema_editor):
+    Ride = apps.get_model('core', 'Ride')
+    batch = []
+    queryset = Ride.objects.only('id_ride', 'pickup_latitude', 'pickup_longitude')
+    for ride in queryset.iterator(chunk_size=2000):
+        ride.pickup_geohash = geohash.encode(ride.pickup_latitude, ride.pickup_longitude)
+        batch.append(ride)
+        if len(batch) >= 2000:
+            Ride.objects.bulk_update(batch, ['pickup_geohash'])
+            batch = []
+    if batch:
+        Ride.objects.bulk_update(batch, ['pickup_geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_ride_pickup_lat_lon_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ride',
+            name='pickup_geohash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=12),
+        ),
+        migrations.RunPython(backfill_pickup_geohash, migrations.RunPython.noop),
+    ]
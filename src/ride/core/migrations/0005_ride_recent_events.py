@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_recent_events(apps, schema_editor):
+    Ride = apps.get_model('core', 'Ride')
+    RideEvent = apps.get_model('core', 'RideEvent')
+    window = timedelta(hours=24)
+
+    rides = {}
+    events = RideEvent.objects.filter(
+        created_at__gte=timezone.now() - window
+    ).order_by('id_ride_event')
+    for event in events.iterator(chunk_size=2000):
+        ride = rides.setdefault(event.id_ride_id, Ride(id_ride=event.id_ride_id, recent_events=[]))
+        ride.recent_events.append({
+            'id_ride_event': event.id_ride_event,
+            'id_ride': event.id_ride_id,
+            'description': event.description,
+            'created_at': event.created_at.isoformat(),
+        })
+        expire_at = event.created_at + window
+        if ride.recent_events_expire_at is None or expire_at < ride.recent_events_expire_at:
+            ride.recent_events_expire_at = expire_at
+
+    Ride.objects.bulk_update(list(rides.values()), ['recent_events', 'recent_events_expire_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_ride_pickup_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ride',
+            name='recent_events',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='recent_events_expire_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_recent_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+from core.utils.migration_helpers import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # Indexes are built concurrently, which cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0005_ride_recent_events'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='ride',
+            index=models.Index(fields=['status', 'pickup_time', 'id_ride'], name='ride_status_pickup_time_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ride',
+            index=models.Index(fields=['id_rider', 'pickup_time', 'id_ride'], name='ride_rider_pickup_time_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ride',
+            index=models.Index(
+                condition=models.Q(('recent_events_expire_at__isnull', False)),
+                fields=['recent_events_expire_at'],
+                name='ride_recent_events_expiry_idx',
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='rideevent',
+            index=models.Index(fields=['id_ride', 'created_at'], name='rideevent_ride_created_at_idx'),
+        ),
+        # Replaced by the partial ride_recent_events_expiry_idx
+        migrations.AlterField(
+            model_name='ride',
+            name='recent_events_expire_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        # The foreign key indexes are redundant with the composite indexes leading with them
+        migrations.AlterField(
+            model_name='ride',
+            name='id_rider',
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='rides_as_rider',
+                to='core.user',
+            ),
+        ),
+        migrations.AlterField(
+            model_name='rideevent',
+            name='id_ride',
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='ride_events',
+                to='core.ride',
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The key column is added without a default, so no row is rewritten, and
+    # the partial unique index holds no entry for the existing rows
+
+    dependencies = [
+        ('core', '0006_ride_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rideevent',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='rideevent',
+            name='dedup_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='rideevent',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('dedup_key__isnull', False)), fields=('dedup_key', 'created_at'),
+                name='rideevent_dedup_key_uniq',
+            ),
+        ),
+    ]
@@ -0,0 +1,61 @@
+from datetime import timezone
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Substr, TruncHour
+
+
+def backfill_rollups(apps, schema_editor):
+    Ride = apps.get_model('core', 'Ride')
+    RideEvent = apps.get_model('core', 'RideEvent')
+    RideRollup = apps.get_model('core', 'RideRollup')
+    RideEventRollup = apps.get_model('core', 'RideEventRollup')
+
+    # Aggregated by the database: one row per hour, status and cell comes back
+    ride_counts = Ride.objects.annotate(
+        hour=TruncHour('pickup_time', tzinfo=timezone.utc),
+        cell=Substr('pickup_geohash', 1, settings.RIDE_ROLLUP_CELL_PRECISION),
+    ).values('hour', 'status', 'cell').annotate(count=Count('*')).order_by()
+    RideRollup.objects.bulk_create([RideRollup(**row) for row in ride_counts.iterator()], batch_size=1000)
+
+    event_counts = RideEvent.objects.annotate(
+        hour=TruncHour('created_at', tzinfo=timezone.utc),
+    ).values('hour', 'description').annotate(count=Count('*')).order_by()
+    RideEventRollup.objects.bulk_create([RideEventRollup(**row) for row in event_counts.iterator()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_ridetrace'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RideEventRollup',
+            fields=[
+                ('id_ride_event_rollup', models.BigAutoField(primary_key=True, serialize=False)),
+                ('hour', models.DateTimeField()),
+                ('description', models.CharField(max_length=255)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('hour', 'description'), name='rideeventrollup_hour_description_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RideRollup',
+            fields=[
+                ('id_ride_rollup', models.BigAutoField(primary_key=True, serialize=False)),
+                ('hour', models.DateTimeField()),
+                ('status', models.CharField(max_length=20)),
+                ('cell', models.CharField(max_length=12)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('hour', 'status', 'cell'), name='riderollup_hour_status_cell_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+import django.db.models.functions.text
+from django.db import migrations, models
+
+from core.utils.migration_helpers import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # Indexes are built concurrently, which cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0009_rollups'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Upper('email'), name='user_email_upper_idx'),
+        ),
+    ]
@@ -1,3 +1,5 @@
 from .ride import *
 from .ride_event import *
+from .ride_trace import *
+from .rollup import *
 from .user import *
\ No newline at end of file
@@ -1,5 +1,6 @@
 from django.db import models
 from core.models.timestamp import TimeStampedModel
+from core.utils import geohash
 
 from core.models.user import User
 
@@ -15,13 +16,69 @@ class Ride(TimeStampedModel):
     
     id_ride = models.AutoField(primary_key=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES)
-    id_rider = models.ForeignKey(User, on_delete=models.CASCADE, related_name='rides_as_rider')
+    # indexed by ride_rider_pickup_time_idx, which leads with this column
+    id_rider = models.ForeignKey(User, on_delete=models.CASCADE, related_name='rides_as_rider', db_index=False)
     id_driver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='rides_as_driver')
     pickup_latitude = models.FloatField()
     pickup_longitude = models.FloatField()
     dropoff_latitude = models.FloatField()
     dropoff_longitude = models.FloatField()
     pickup_time = models.DateTimeField()
+    # geohash of the pickup position, searched by prefix at any precision
+    pickup_geohash = models.CharField(max_length=12, db_index=True, blank=True, default='')
+    # rolling window of the ride's latest events, maintained when events are written
+    recent_events = models.JSONField(default=list, blank=True)
+    recent_events_expire_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # keyset pagination seeks on (pickup_time, id_ride) in both directions
+            models.Index(fields=['pickup_time', 'id_ride'], name='ride_pickup_time_id_idx'),
+            # bounding box prefilter of the radius search
+            models.Index(fields=['pickup_latitude', 'pickup_longitude'], name='ride_pickup_lat_lon_idx'),
+            # status lists in pickup order
+            models.Index(fields=['status', 'pickup_time', 'id_ride'], name='ride_status_pickup_time_idx'),
+            # a rider's rides in pickup order
+            models.Index(fields=['id_rider', 'pickup_time', 'id_ride'], name='ride_rider_pickup_time_idx'),
+            # expiry of today's events; only rides with recent events are indexed
+            models.Index(
+                fields=['recent_events_expire_at'],
+                name='ride_recent_events_expiry_idx',
+                condition=models.Q(recent_events_expire_at__isnull=False),
+            ),
+        ]
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted status so saves can detect transitions, and
+        # the pickup that places the ride in the analytics rollups
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_pickup = (instance.__dict__.get('pickup_time'), instance.__dict__.get('pickup_geohash'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Keep the spatial cell key in sync with the pickup position
+        self.pickup_geohash = geohash.encode(self.pickup_latitude, self.pickup_longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'pickup_latitude', 'pickup_longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'pickup_geohash'}
+        super().save(*args, **kwargs)
+        self._loaded_status = self.status
+        self._loaded_pickup = (self.pickup_time, self.pickup_geohash)
+
+    @property
+    def previous_status(self):
+        """Status as last loaded from or saved to the database, None for new rides."""
+        return getattr(self, '_loaded_status', None)
+
+    @property
+    def previous_pickup(self):
+        """
+        `(pickup_time, pickup_geohash)` as last loaded or saved, None for new
+        rides. Parts that were not loaded are None.
+        """
+        return getattr(self, '_loaded_pickup', None)
+
     def __str__(self):
         return f"Ride {self.id_ride}: {self.status} - {self.id_rider} with {self.id_driver}"
\ No newline at end of file
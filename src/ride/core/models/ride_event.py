@@ -1,11 +1,32 @@
 from django.db import models
+from django.utils import timezone
 from core.models.timestamp import TimeStampedModel
 from core.models.ride import Ride
 
 class RideEvent(TimeStampedModel):
     id_ride_event = models.AutoField(primary_key=True)
-    id_ride = models.ForeignKey(Ride, on_delete=models.CASCADE, related_name='ride_events')
+    # indexed by rideevent_ride_created_at_idx, which leads with this column
+    id_ride = models.ForeignKey(Ride, on_delete=models.CASCADE, related_name='ride_events', db_index=False)
     description = models.CharField(max_length=255)
+    # A given value is kept, so events drained from the ingestion stream keep
+    # the time they were ingested at
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Idempotency key of ingested events (the client's key or the stream entry id)
+    dedup_key = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # a ride's events within a time window (today's events, created_at filters)
+            models.Index(fields=['id_ride', 'created_at'], name='rideevent_ride_created_at_idx'),
+        ]
+        constraints = [
+            # A unique index on a partitioned table must include the partition key;
+            # a redelivered stream entry carries the same created_at
+            models.UniqueConstraint(
+                fields=['dedup_key', 'created_at'], condition=models.Q(dedup_key__isnull=False),
+                name='rideevent_dedup_key_uniq',
+            ),
+        ]
     
     def __str__(self):
-        return f"Event {self.id_ride_event} for Ride {self.id_ride}: {self.description}"
\ No newline at end of file
+        return f"Event {self.id_ride_event} for Ride {self.id_ride}: {self.description}"
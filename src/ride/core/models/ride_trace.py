@@ -0,0 +1,19 @@
+from django.db import models
+from core.models.timestamp import TimeStampedModel
+from core.models.ride import Ride
+
+class RideTrace(TimeStampedModel):
+    """
+    GPS trace of a finished ride, compressed into one value by
+    `trace_helpers.encode_trace` instead of a row per location ping.
+    """
+    id_ride = models.OneToOneField(Ride, on_delete=models.CASCADE, primary_key=True, related_name='trace')
+    points = models.BinaryField()
+    # points stored after simplification, and pings received
+    point_count = models.PositiveIntegerField()
+    ping_count = models.PositiveIntegerField()
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Trace of Ride {self.id_ride_id}: {self.point_count} points"
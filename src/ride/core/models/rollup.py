@@ -0,0 +1,37 @@
+from django.db import models
+
+class RideRollup(models.Model):
+    """
+    Number of rides in each status, by hour of pickup and pickup cell (a
+    geohash prefix). Maintained by `rollup_helpers` as rides change.
+    """
+    id_ride_rollup = models.BigAutoField(primary_key=True)
+    hour = models.DateTimeField()
+    status = models.CharField(max_length=20)
+    cell = models.CharField(max_length=12)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # the conflict target of the count upserts; also serves hour range scans
+            models.UniqueConstraint(fields=['hour', 'status', 'cell'], name='riderollup_hour_status_cell_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.count} {self.status} rides at {self.hour:%Y-%m-%d %H:00} in {self.cell}"
+
+
+class RideEventRollup(models.Model):
+    """Number of ride events by hour of creation and description."""
+    id_ride_event_rollup = models.BigAutoField(primary_key=True)
+    hour = models.DateTimeField()
+    description = models.CharField(max_length=255)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'description'], name='rideeventrollup_hour_description_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.count} \"{self.description}\" events at {self.hour:%Y-%m-%d %H:00}"
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Upper
 from core.models.timestamp import TimeStampedModel
 
 
@@ -15,6 +16,12 @@ class User(TimeStampedModel):
     last_name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
     phone_number = models.CharField(max_length=20)
+
+    class Meta:
+        indexes = [
+            # case-insensitive email lookups (admin search and autocomplete)
+            models.Index(Upper('email'), name='user_email_upper_idx'),
+        ]
     
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.role})"
\ No newline at end of file
@@ -1,3 +1,5 @@
 from .ride_event_serializers import RideEventSerializer
 from .ride_serializers import RideSerializer
-from .user_serializers import UserSerializer
\ No newline at end of file
+from .user_serializers import UserSerializer
+from .token_serializers import RoleTokenObtainPairSerializer
+from .compiled_serializers import FastRideSerializer
\ No newline at end of file
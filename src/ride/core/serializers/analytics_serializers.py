@@ -0,0 +1,37 @@
+from rest_framework import serializers
+
+from core.models import Ride
+from core.utils.geohash import BASE32
+from core.utils.rollup_helpers import RIDE_GROUPS, default_analytics_window
+
+
+class RideAnalyticsSerializer(serializers.Serializer):
+    """
+    Query parameters of the ride analytics. The range defaults to the last
+    `RIDE_ANALYTICS_DEFAULT_HOURS` hours.
+    """
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    group_by = serializers.CharField(default='status')
+    status = serializers.ChoiceField(choices=Ride.STATUS_CHOICES, required=False)
+    cell = serializers.CharField(max_length=12, required=False)
+
+    def validate_group_by(self, value):
+        groups = [group for group in value.split(',') if group]
+        invalid = [group for group in groups if group not in RIDE_GROUPS]
+        if invalid or not groups:
+            raise serializers.ValidationError(f'Must be a comma-separated list of: {", ".join(RIDE_GROUPS)}.')
+        return groups
+
+    def validate_cell(self, value):
+        if any(char not in BASE32 for char in value):
+            raise serializers.ValidationError('Must be a geohash prefix.')
+        return value
+
+    def validate(self, data):
+        since, until = default_analytics_window()
+        data.setdefault('since', since)
+        data.setdefault('until', until)
+        if data['since'] >= data['until']:
+            raise serializers.ValidationError({'until': 'Must be after since.'})
+        return data
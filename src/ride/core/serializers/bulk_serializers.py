@@ -0,0 +1,37 @@
+from rest_framework import serializers
+
+from core.models.ride import Ride
+
+
+class RideBulkSerializer(serializers.Serializer):
+    """
+    One item of a bulk ride write. Foreign keys are plain ids so the whole
+    batch can be resolved with a single query instead of one per item.
+    """
+    id_ride = serializers.IntegerField(required=False)
+    status = serializers.ChoiceField(choices=Ride.STATUS_CHOICES)
+    id_rider = serializers.IntegerField()
+    id_driver = serializers.IntegerField()
+    pickup_latitude = serializers.FloatField(min_value=-90, max_value=90)
+    pickup_longitude = serializers.FloatField(min_value=-180, max_value=180)
+    dropoff_latitude = serializers.FloatField(min_value=-90, max_value=90)
+    dropoff_longitude = serializers.FloatField(min_value=-180, max_value=180)
+    pickup_time = serializers.DateTimeField()
+
+
+class RideEventBulkSerializer(serializers.Serializer):
+    """
+    One item of a bulk ride event write.
+    """
+    id_ride_event = serializers.IntegerField(required=False)
+    id_ride = serializers.IntegerField()
+    description = serializers.CharField(max_length=255)
+
+
+class RideEventIngestSerializer(RideEventBulkSerializer):
+    """
+    One ride event sent to the ingestion stream. The ride is only resolved
+    by the worker draining the stream, so validating it needs no query.
+    """
+    id_ride_event = None
+    dedup_key = serializers.CharField(max_length=64, required=False)
@@ -0,0 +1,115 @@
+from functools import lru_cache
+from operator import attrgetter
+
+from django.db import models
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+
+from core.serializers.ride_serializers import RideSerializer
+
+
+def compile_serializer(serializer):
+    """
+    Turn a bound DRF serializer into a plain `instance -> dict` function.
+
+    The field instances of the serializer are reused as-is, so every value
+    goes through the same `to_representation` as the regular serializer and
+    the rendered JSON is byte-for-byte identical. What is saved is the
+    per-request serializer construction and the generic attribute lookup:
+    plain model fields are read with a precompiled `attrgetter`.
+    """
+    getters = []
+    for field in serializer._readable_fields:
+        if isinstance(field, serializers.ListSerializer):
+            represent = _compile_list(compile_serializer(field.child))
+        elif isinstance(field, serializers.BaseSerializer):
+            represent = compile_serializer(field)
+        else:
+            represent = field.to_representation
+        getters.append((field.field_name, _compile_getter(field), represent))
+
+    def to_representation(instance):
+        ret = {}
+        for field_name, get_attribute, represent in getters:
+            try:
+                attribute = get_attribute(instance)
+            except SkipField:
+                continue
+
+            check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+            if check_for_none is None:
+                ret[field_name] = None
+            else:
+                ret[field_name] = represent(attribute)
+        return ret
+
+    return to_representation
+
+
+def _compile_getter(field):
+    if field.source == '*' or len(field.source_attrs) != 1 or isinstance(field, serializers.RelatedField):
+        return field.get_attribute
+
+    getter = attrgetter(field.source_attrs[0])
+
+    def get_attribute(instance):
+        try:
+            return getter(instance)
+        except AttributeError:
+            # Missing attributes (e.g. an absent annotation) follow DRF's
+            # rules: default, None or SkipField
+            return field.get_attribute(instance)
+
+    return get_attribute
+
+
+def _compile_list(represent_child):
+    def to_representation(data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        return [represent_child(item) for item in iterable]
+
+    return to_representation
+
+
+class CompiledSerializer:
+    """
+    Read-only drop-in for a DRF serializer in list/retrieve responses.
+
+    Accepts the same `(instance, many=..., context=...)` arguments that
+    `GenericAPIView.get_serializer` passes, plus the `fields`/`nested_fields`
+    of `CoreSerializer`, and exposes `.data`. The wrapped serializer is
+    compiled once per process and fieldset.
+    """
+    serializer_class = None
+
+    def __init__(self, instance=None, many=False, context=None, fields=None, nested_fields=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+        self.fields = tuple(sorted(fields)) if fields is not None else None
+        self.nested_fields = tuple(sorted((name, tuple(sorted(value))) for name, value in (nested_fields or {}).items()))
+
+    @classmethod
+    @lru_cache(maxsize=128)
+    def get_compiled(cls, fields=None, nested_fields=()):
+        kwargs = {}
+        if fields is not None:
+            kwargs['fields'] = fields
+        if nested_fields:
+            kwargs['nested_fields'] = dict(nested_fields)
+        return compile_serializer(cls.serializer_class(**kwargs))
+
+    def to_representation(self, instance):
+        return self.get_compiled(self.fields, self.nested_fields)(instance)
+
+    @property
+    def data(self):
+        to_representation = self.get_compiled(self.fields, self.nested_fields)
+        if self.many:
+            return [to_representation(instance) for instance in self.instance]
+        return to_representation(self.instance)
+
+
+class FastRideSerializer(CompiledSerializer):
+    serializer_class = RideSerializer
@@ -12,11 +12,14 @@ class CoreSerializer(serializers.ModelSerializer):
             **kwargs: Arbitrary keyword arguments
                         - fields (list, optional): List of field names to include in the serializer.
                         If provided, only these fields will be kept in the serializer.
+                        - nested_fields (dict, optional): Maps a nested serializer field name to the
+                        list of its own fields to keep.
         Note:
-            The 'fields' parameter is popped from kwargs before passing to the parent initializer.
+            The 'fields' and 'nested_fields' parameters are popped from kwargs before passing to the parent initializer.
             If 'fields' is provided, any field not in the list will be removed from the serializer.
         """
         fields = kwargs.pop('fields', None)
+        nested_fields = kwargs.pop('nested_fields', None)
         super(CoreSerializer, self).__init__(*args, **kwargs)
 
         if fields is not None:
@@ -25,6 +28,14 @@ class CoreSerializer(serializers.ModelSerializer):
             for field_name in existing - allowed:
                 self.fields.pop(field_name)
 
+        for field_name, nested_allowed in (nested_fields or {}).items():
+            nested = self.fields.get(field_name)
+            nested = getattr(nested, 'child', nested)
+            if not isinstance(nested, serializers.Serializer):
+                continue
+            for nested_name in set(nested.fields.keys()) - set(nested_allowed):
+                nested.fields.pop(nested_name)
+
 class CoreModelSerializer(CoreSerializer):
     created_by = serializers.ReadOnlyField()
     modified_by = serializers.ReadOnlyField()
@@ -0,0 +1,43 @@
+import numpy as np
+from django.conf import settings
+from rest_framework import serializers
+
+
+class PositionsField(serializers.Field):
+    """`[[latitude, longitude], ...]`, validated and kept as an `(n, 2)` array."""
+    default_error_messages = {
+        'invalid': 'Must be a list of [latitude, longitude] pairs.',
+        'range': 'Latitudes must be within [-90, 90] and longitudes within [-180, 180].',
+        'size': 'Must hold between 1 and {max} positions.',
+    }
+
+    def to_internal_value(self, data):
+        try:
+            positions = np.asarray(data, dtype=np.float64)
+        except (TypeError, ValueError):
+            self.fail('invalid')
+        if positions.ndim != 2 or positions.shape[1] != 2:
+            self.fail('invalid')
+        if not 1 <= len(positions) <= settings.DISTANCE_MATRIX_MAX_POSITIONS:
+            self.fail('size', max=settings.DISTANCE_MATRIX_MAX_POSITIONS)
+        if not (np.isfinite(positions).all() and (np.abs(positions) <= (90, 180)).all()):
+            self.fail('range')
+        return positions
+
+
+class DistanceMatrixSerializer(serializers.Serializer):
+    """
+    Body of a distance matrix request. Without `k` the full matrix is
+    returned, so its size is capped by `DISTANCE_MATRIX_MAX_CELLS`.
+    """
+    origins = PositionsField()
+    destinations = PositionsField()
+    k = serializers.IntegerField(min_value=1, max_value=100, required=False)
+
+    def validate(self, data):
+        cells = len(data['origins']) * len(data['destinations'])
+        if 'k' not in data and cells > settings.DISTANCE_MATRIX_MAX_CELLS:
+            raise serializers.ValidationError({
+                'k': f'Required for more than {settings.DISTANCE_MATRIX_MAX_CELLS} origin/destination pairs.'
+            })
+        return data
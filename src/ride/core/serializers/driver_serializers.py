@@ -0,0 +1,20 @@
+from rest_framework import serializers
+
+
+class DriverLocationSerializer(serializers.Serializer):
+    """
+    Position reported by a driver. Drivers report their own; `id_driver` is
+    only read from admins.
+    """
+    id_driver = serializers.IntegerField(required=False)
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    available = serializers.BooleanField(default=True)
+
+
+class NearestDriversSerializer(serializers.Serializer):
+    """Query parameters of the nearest available drivers search."""
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    k = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    radius_km = serializers.FloatField(min_value=0, max_value=100, default=10)
@@ -1,10 +1,8 @@
 from rest_framework import serializers
 from core.serializers.core_serializers import CoreModelSerializer
-from django.utils import timezone
-from datetime import timedelta
 from core.models.ride import Ride
 from core.serializers.user_serializers import UserSerializer
-from core.serializers.ride_event_serializers import RideEventSerializer
+from core.utils.ride_event_helpers import current_recent_events
 
 class RideSerializer(CoreModelSerializer):
 
@@ -13,6 +11,9 @@ class RideSerializer(CoreModelSerializer):
     todays_ride_events = serializers.SerializerMethodField()
     distance_to_pickup = serializers.FloatField(read_only=True, required=False)
 
+    # model columns read by method fields, used to narrow sparse fieldset queries
+    method_field_sources = {'todays_ride_events': ('recent_events',)}
+
     class Meta:
         model = Ride
         fields = (
@@ -25,4 +26,4 @@ class RideSerializer(CoreModelSerializer):
 
 
     def get_todays_ride_events(self, obj):
-        return RideEventSerializer(obj.prefetched_todays_events, many=True).data
\ No newline at end of file
+        return current_recent_events(obj.recent_events)
\ No newline at end of file
@@ -0,0 +1,10 @@
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+from core.utils.token_helpers import add_role_claims
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+
+    @classmethod
+    def get_token(cls, user):
+        return add_role_claims(super().get_token(user), user)
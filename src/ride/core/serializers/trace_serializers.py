@@ -0,0 +1,14 @@
+from rest_framework import serializers
+
+
+class TracePingSerializer(serializers.Serializer):
+    """Location ping of an active ride; `recorded_at` defaults to the time it is received."""
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    recorded_at = serializers.DateTimeField(required=False)
+
+
+class TraceReplaySerializer(serializers.Serializer):
+    """Query parameters of a trace replay."""
+    output = serializers.ChoiceField(choices=['ndjson', 'csv'], default='ndjson')
+    simplify_m = serializers.FloatField(min_value=0, max_value=1000, default=0)
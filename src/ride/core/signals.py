@@ -0,0 +1,169 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from core.models import Ride, RideEvent, User
+from core.utils.cache_helpers import invalidate_ride_lists, invalidate_user_lists
+from core.utils.pool_helpers import record_connection_opened
+from core.utils.push_helpers import publish, ride_event_delta, ride_status_delta
+from core.utils.rollup_helpers import apply_event_deltas, apply_ride_deltas, event_deltas, ride_deltas
+from core.utils.ride_event_helpers import refresh_recent_events
+from core.utils.token_helpers import revoke_user_tokens
+from core.utils.trace_helpers import FINISHED_STATUSES, finalize_ride_traces
+
+# Bulk writes skip the per-instance model signals; these are sent once per
+# batch after the transaction commits instead, with `send_robust`: the write
+# is committed, so a failing receiver (e.g. Redis being down for a push) is
+# logged and does not keep the others from running.
+# rides_bulk_saved: rides (list of Ride), created (bool)
+rides_bulk_saved = Signal()
+# ride_events_bulk_saved: events (list of RideEvent), rides (every Ride whose
+# events changed, with its status and rider loaded), created (bool)
+ride_events_bulk_saved = Signal()
+
+
+@receiver(pre_save, sender=User)
+def revoke_tokens_on_role_change(sender, instance, **kwargs):
+    """
+    Tokens carry the role as a claim, so a role change must invalidate them
+    """
+    if instance.pk is None:
+        return
+    previous_role = User.objects.filter(pk=instance.pk).values_list('role', flat=True).first()
+    if previous_role is not None and previous_role != instance.role:
+        revoke_user_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def revoke_tokens_on_delete(sender, instance, **kwargs):
+    revoke_user_tokens(instance.pk)
+
+
+@receiver(post_save, sender=Ride)
+@receiver(post_delete, sender=Ride)
+def invalidate_ride_lists_on_ride_change(sender, instance, **kwargs):
+    statuses = (instance.previous_status, instance.status)
+    # After commit, so a concurrent read cannot cache the old rows under the new generation
+    transaction.on_commit(lambda: invalidate_ride_lists(*statuses))
+
+
+@receiver(post_save, sender=Ride)
+def push_ride_status_change(sender, instance, created, **kwargs):
+    if created or instance.previous_status != instance.status:
+        delta = ride_status_delta(instance)
+        # Best effort: a failed push must not cancel the callbacks registered after it
+        transaction.on_commit(lambda: publish([delta]), robust=True)
+
+
+@receiver(post_save, sender=Ride)
+def store_trace_of_finished_ride(sender, instance, **kwargs):
+    if instance.status in FINISHED_STATUSES and instance.previous_status != instance.status:
+        ride_id = instance.pk
+        # A failed write puts the pings back, to be stored when the ride finishes again
+        transaction.on_commit(lambda: finalize_ride_traces([ride_id]), robust=True)
+
+
+@receiver(post_save, sender=Ride)
+@receiver(post_delete, sender=Ride)
+def count_ride_in_rollups(sender, instance, **kwargs):
+    deltas = ride_deltas([instance], deleted='created' not in kwargs)
+    transaction.on_commit(lambda: apply_ride_deltas(deltas))
+
+
+def _event_ride(event):
+    """
+    The ride of an event with its status and rider, loaded once for every
+    receiver. None when the ride is being deleted with its events.
+    """
+    if not RideEvent.id_ride.is_cached(event):
+        ride = Ride.objects.only('id_ride', 'status', 'id_rider').filter(pk=event.id_ride_id).first()
+        if ride is None:
+            return None
+        event.id_ride = ride
+    return event.id_ride
+
+
+@receiver(post_save, sender=RideEvent)
+@receiver(post_delete, sender=RideEvent)
+def refresh_ride_on_event_change(sender, instance, **kwargs):
+    ride_id = instance.id_ride_id
+    # Ride lists embed today's events, so only lists showing this ride's status are stale
+    ride = _event_ride(instance)
+    status = ride.status if ride is not None else None
+
+    def refresh():
+        refresh_recent_events([ride_id])
+        invalidate_ride_lists(status)
+
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=RideEvent)
+def push_ride_event(sender, instance, created, **kwargs):
+    if created:
+        delta = ride_event_delta(instance, _event_ride(instance))
+        transaction.on_commit(lambda: publish([delta]), robust=True)
+
+
+@receiver(post_save, sender=RideEvent)
+@receiver(post_delete, sender=RideEvent)
+def count_ride_event_in_rollups(sender, instance, **kwargs):
+    # Edits keep the event counted under its original description
+    if kwargs.get('created', True):
+        deltas = event_deltas([instance], sign=1 if 'created' in kwargs else -1)
+        transaction.on_commit(lambda: apply_event_deltas(deltas))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_lists_on_user_change(sender, instance, **kwargs):
+    # Users are nested in every ride list
+    transaction.on_commit(invalidate_user_lists)
+
+
+@receiver(rides_bulk_saved)
+def invalidate_ride_lists_on_bulk_save(sender, rides, **kwargs):
+    statuses = {status for ride in rides for status in (ride.previous_status, ride.status)}
+    invalidate_ride_lists(*statuses)
+
+
+@receiver(ride_events_bulk_saved)
+def refresh_rides_on_bulk_event_save(sender, rides, **kwargs):
+    refresh_recent_events([ride.pk for ride in rides])
+    invalidate_ride_lists(*{ride.status for ride in rides})
+
+
+@receiver(rides_bulk_saved)
+def push_bulk_ride_status_changes(sender, rides, **kwargs):
+    publish([ride_status_delta(ride) for ride in rides if ride.previous_status != ride.status])
+
+
+@receiver(rides_bulk_saved)
+def store_traces_of_bulk_finished_rides(sender, rides, **kwargs):
+    finalize_ride_traces([
+        ride.pk for ride in rides if ride.status in FINISHED_STATUSES and ride.previous_status != ride.status
+    ])
+
+
+@receiver(ride_events_bulk_saved)
+def push_bulk_ride_events(sender, events, rides, created, **kwargs):
+    if created:
+        rides = {ride.pk: ride for ride in rides}
+        publish([ride_event_delta(event, rides[event.id_ride_id]) for event in events])
+
+
+@receiver(rides_bulk_saved)
+def count_bulk_rides_in_rollups(sender, rides, **kwargs):
+    apply_ride_deltas(ride_deltas(rides))
+
+
+@receiver(ride_events_bulk_saved)
+def count_bulk_ride_events_in_rollups(sender, events, created, **kwargs):
+    if created:
+        apply_event_deltas(event_deltas(events))
+
+
+@receiver(connection_created)
+def count_database_connection(sender, connection, **kwargs):
+    record_connection_opened(connection.alias)
@@ -1,3 +1,1612 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User as DjangoUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.models import Ride, RideEvent, RideRollup, RideTrace, User
+from core.serializers import FastRideSerializer, RideSerializer
+from core.signals import ride_events_bulk_saved, rides_bulk_saved
+from core.utils import geohash
+from core.utils.cache_helpers import get_generations, status_generation
+from core.utils.db_router import PrimaryReplicaRouter
+from core.utils.driver_helpers import LiveDriverIndex, MemoryDriverStore, get_driver_store, get_live_index
+from core.utils.explain_helpers import explain, explain_queryset, iter_plan_nodes
+from core.utils.ingest_helpers import MemoryEventStream, drain_batch, ingest_stats, write_ingested_events
+from core.utils.location_helpers import calculate_distance_annotation, haversine_km
+from core.utils.partition_helpers import (
+    convert_to_partitioned, create_partitions, default_partition, expired_partitions, detach_partition,
+    is_partitioned, list_partitions, period_start
+)
+from core.utils.ride_event_helpers import refresh_recent_events
+from core.utils.token_helpers import get_tokens_for_user, revoke_token, revoke_user_tokens
+from core.utils.trace_helpers import (
+    MemoryTraceBuffer, buffered_points, decode_trace, encode_trace, finalize_ride_traces, record_pings, to_point
+)
+from core.utils.synthetic_data_helpers import SyntheticDataGenerator, load_rows, reset_sequences
+
+
+def create_user(username, role, **django_fields):
+    """A Django user and the `User` sharing its id, as registration creates them."""
+    django_user = DjangoUser.objects.create_user(username=username, email=f'{username}@example.com', **django_fields)
+    user = User.objects.create(
+        id_user=django_user.id, role=role, first_name=username.capitalize(), last_name='User',
+        email=f'{username}@example.com', phone_number='1234567890',
+    )
+    return django_user, user
+
+
+def create_users(count, driver_every):
+    """`count` riders and drivers, every `driver_every`-th one a driver."""
+    users = []
+    for i in range(count):
+        role = 'driver' if i % driver_every == 0 else 'rider'
+        django_user = DjangoUser.objects.create(username=f'{role}{i}')
+        users.append(User(
+            id_user=django_user.id, role=role, first_name=f'User{i}', last_name='User',
+            email=f'{role}{i}@example.com', phone_number='1234567890',
+        ))
+    return User.objects.bulk_create(users)
+
+
+def load_synthetic_rides(users, user_id, count):
+    """`count` synthetic rides of `users` with their events; returns the ride and event rows."""
+    generator = SyntheticDataGenerator(
+        [user.id_user for user in users if user.role == 'rider'],
+        [user.id_user for user in users if user.role == 'driver'],
+        user_id=user_id,
+        seed=1,
+    )
+    rides, events = generator.batch(0, 1, count, 1)
+    load_rows(Ride, rides)
+    load_rows(RideEvent, events)
+    reset_sequences([Ride, RideEvent])
+    return rides, events
+
+
+def create_ride(rider, driver=None, status='pending', **fields):
+    return Ride.objects.create(**{
+        'status': status, 'id_rider': rider, 'id_driver': driver or rider,
+        'pickup_latitude': 37.77, 'pickup_longitude': -122.41,
+        'dropoff_latitude': 37.78, 'dropoff_longitude': -122.42,
+        'pickup_time': timezone.now(),
+        **fields,
+    })
+
+
+class AdminAPITestCase(TestCase):
+    """
+    Requests authenticated as an admin: `admin` is the Django user,
+    `admin_user` the `User` of the same id. Each test starts with an empty
+    cache, as the local memory cache outlives the test that filled it.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin, cls.admin_user = create_user('admin', 'admin')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    RIDE_LIST_CACHE_TIMEOUT=0,
+    DATABASE_REPLICAS=[],
+)
+class RideCursorPaginationTests(AdminAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        now = timezone.now()
+        # Two pickups share a time and a position, so the id breaks the ties
+        cls.rides = [
+            create_ride(
+                cls.admin_user, pickup_time=now - timedelta(minutes=(i + 1) // 2),
+                pickup_latitude=37.77 + (i + 1) // 2 * 0.01,
+            )
+            for i in range(7)
+        ]
+
+    def walk(self, params):
+        """Follow the `next` links from the first page, then the `previous` links back."""
+        response = self.client.get('/api/rides/', {**params, 'pagination': 'cursor', 'page_size': 2})
+        pages = []
+        while True:
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertNotIn('count', response.data)
+            pages.append([ride['id_ride'] for ride in response.data['results']])
+            if response.data['next'] is None:
+                break
+            response = self.client.get(response.data['next'])
+        backwards = [pages[-1]]
+        while response.data['previous'] is not None:
+            response = self.client.get(response.data['previous'])
+            self.assertEqual(response.status_code, 200, response.data)
+            backwards.append([ride['id_ride'] for ride in response.data['results']])
+        self.assertEqual(backwards[::-1], pages)
+        return [id_ride for page in pages for id_ride in page]
+
+    def test_next_and_previous_pages(self):
+        newest_first = sorted(self.rides, key=lambda ride: (ride.pickup_time, ride.pk), reverse=True)
+        self.assertEqual(self.walk({}), [ride.pk for ride in newest_first])
+        self.assertEqual(self.walk({'ordering': 'pickup_time'}), [ride.pk for ride in newest_first[::-1]])
+
+    def test_seek_by_distance(self):
+        position = {'latitude': 37.80, 'longitude': -122.41}
+        closest_first = sorted(self.rides, key=lambda ride: (
+            round(haversine_km(position['latitude'], position['longitude'], ride.pickup_latitude, ride.pickup_longitude), 6),
+            ride.pk,
+        ))
+        self.assertEqual(
+            self.walk({**position, 'ordering': 'distance_to_pickup'}), [ride.pk for ride in closest_first]
+        )
+
+    def test_cursor_must_match_the_ordering(self):
+        response = self.client.get('/api/rides/', {'pagination': 'cursor', 'page_size': 2})
+        response = self.client.get(response.data['next'] + '&ordering=pickup_time')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/api/rides/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    COUNT_CACHE_TIMEOUT=60,
+    DATABASE_REPLICAS=[],
+)
+class ListCountTests(AdminAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        create_users(3, driver_every=3)
+        cls.rides = [create_ride(cls.admin_user) for _ in range(2)]
+        for ride in cls.rides:
+            for description in ('Status changed to pickup', 'Status changed to dropoff'):
+                RideEvent.objects.create(id_ride=ride, description=description)
+
+    def events(self, **params):
+        response = self.client.get('/api/ride-events/', {'page_size': 3, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_pages_follow_the_rows(self):
+        data = self.events()
+        self.assertEqual((data['count'], data['count_is_estimate']), (4, False))
+        self.assertIsNotNone(data['next'])
+        self.assertIsNone(self.events(page=2)['next'])
+        self.assertEqual(self.client.get('/api/ride-events/', {'page_size': 3, 'page': 3}).status_code, 404)
+
+    def test_large_unfiltered_lists_report_the_estimate(self):
+        with mock.patch('core.utils.count_helpers.get_planner_estimate', return_value=50000):
+            data = self.events(page_size=10)
+            # next comes from the rows, not from the estimate
+            self.assertEqual((data['count'], data['count_is_estimate'], data['next']), (50000, True, None))
+            # filtered lists are counted
+            self.assertEqual(self.events(id_ride=self.rides[0].pk)['count_is_estimate'], False)
+
+    def test_filtered_counts_are_cached(self):
+        ride = self.rides[0]
+        self.assertEqual(self.events(id_ride=ride.pk)['count'], 2)
+        RideEvent.objects.create(id_ride=ride, description='Ride completed')
+        # the page and page size do not change the cached count
+        self.assertEqual(self.events(id_ride=ride.pk, page_size=1)['count'], 2)
+        self.assertEqual(self.events(id_ride=ride.pk, created_at__gte='2000-01-01T00:00:00Z')['count'], 3)
+
+    def test_default_order_is_primary_key(self):
+        ids = [event['id_ride_event'] for event in self.events(page_size=10)['results']]
+        self.assertEqual(ids, sorted(ids))
+        response = self.client.get('/api/users/')
+        ids = [user['id_user'] for user in response.data['results']]
+        self.assertEqual(ids, sorted(ids))
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    RIDE_LIST_CACHE_TIMEOUT=0,
+    DATABASE_REPLICAS=[],
+)
+class NearbyRideTests(AdminAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # 0, 1.1, 2.2 and 3.3 km north of the searched position, and one in New York
+        cls.rides = [create_ride(cls.admin_user, pickup_latitude=37.77 + i * 0.01) for i in range(4)]
+        cls.far = create_ride(cls.admin_user, pickup_latitude=40.71, pickup_longitude=-74.0)
+        cls.position = {'latitude': 37.77, 'longitude': -122.41, 'radius_km': 3}
+
+    def test_closest_rides_in_one_page(self):
+        response = self.client.get('/api/rides/', self.position)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            [ride['id_ride'] for ride in response.data['results']], [ride.pk for ride in self.rides[:3]]
+        )
+        self.assertEqual(
+            (response.data['count'], response.data['next'], response.data['previous']), (3, None, None)
+        )
+        response = self.client.get('/api/rides/', {**self.position, 'limit': 2})
+        self.assertEqual([ride['id_ride'] for ride in response.data['results']], [ride.pk for ride in self.rides[:2]])
+
+    def test_detail_actions_are_not_limited(self):
+        # the third closest ride is past a limit of 2 but within the radius
+        ride = self.rides[2]
+        params = {**self.position, 'limit': 2}
+        response = self.client.get(f'/api/rides/{ride.pk}/', params)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.patch(f'/api/rides/{ride.pk}/?latitude=37.77&longitude=-122.41&radius_km=3&limit=2', {
+            'status': 'completed',
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        response = self.client.get('/api/rides/export/', params)
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 3)
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class NearestRideTests(AdminAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        _, cls.rider = create_user('rider', 'rider')
+        rng = random.Random(4)
+        # Dense around San Francisco, sparse around the world
+        positions = [(37.77 + rng.uniform(-0.05, 0.05), -122.41 + rng.uniform(-0.05, 0.05)) for _ in range(120)]
+        positions += [(rng.uniform(-80, 80), rng.uniform(-180, 180)) for _ in range(30)]
+        cls.rides = [
+            create_ride(
+                cls.rider if i % 3 == 0 else cls.admin_user,
+                pickup_latitude=round(latitude, 6), pickup_longitude=round(longitude, 6),
+            )
+            for i, (latitude, longitude) in enumerate(positions)
+        ]
+
+    def nearest(self, latitude, longitude, **params):
+        response = self.client.get('/api/rides/nearest/', {'latitude': latitude, 'longitude': longitude, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return [ride['id_ride'] for ride in response.data]
+
+    def brute_force(self, latitude, longitude, k, rides):
+        return [ride.pk for ride in sorted(rides, key=lambda ride: (
+            haversine_km(latitude, longitude, ride.pickup_latitude, ride.pickup_longitude), ride.pk
+        ))[:k]]
+
+    def test_matches_brute_force(self):
+        # in the dense area, between it and the sparse rides, across the antimeridian and near a pole
+        for latitude, longitude in [(37.77, -122.41), (37.9, -122.2), (0, 179.9), (-85, 10)]:
+            for k in (1, 5, 40):
+                with self.subTest(latitude=latitude, longitude=longitude, k=k):
+                    self.assertEqual(
+                        self.nearest(latitude, longitude, k=k), self.brute_force(latitude, longitude, k, self.rides)
+                    )
+
+    def test_rider_email_filter(self):
+        own = [ride for ride in self.rides if ride.id_rider_id == self.rider.pk]
+        self.assertEqual(
+            self.nearest(37.77, -122.41, k=10, rider_email=self.rider.email), self.brute_force(37.77, -122.41, 10, own)
+        )
+        self.assertEqual(self.nearest(37.77, -122.41, rider_email='nobody@example.com'), [])
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    DATABASE_REPLICAS=[],
+)
+class RoleClaimTests(AdminAPITestCase):
+
+    def request(self, token, path='/api/ride-events/'):
+        return APIClient().get(path, headers={'Authorization': f'Bearer {token}'})
+
+    def test_roles_are_read_from_the_token(self):
+        tokens = get_tokens_for_user(self.admin, self.admin_user)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.request(tokens['access']).status_code, 200)
+        # neither the Django user nor the role is loaded
+        self.assertFalse([query for query in context if 'auth_user' in query['sql'] or 'core_user' in query['sql']])
+
+        rider, rider_user = create_user('rider', 'rider')
+        self.assertEqual(self.request(get_tokens_for_user(rider, rider_user)['access']).status_code, 403)
+
+    def test_role_change_revokes_earlier_tokens(self):
+        tokens = get_tokens_for_user(self.admin, self.admin_user)
+        # saving without a role change keeps them
+        self.admin_user.save()
+        self.assertEqual(self.request(tokens['access']).status_code, 200)
+
+        self.admin_user.role = 'rider'
+        self.admin_user.save()
+        self.assertEqual(self.request(tokens['access']).status_code, 401)
+        # so is an access token refreshed from the old refresh token
+        response = APIClient().post('/api/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(self.request(response.data['access']).status_code, 401)
+
+        # tokens issued after the change are valid, even within the same second
+        self.admin_user.role = 'admin'
+        self.admin_user.save()
+        self.assertEqual(self.request(get_tokens_for_user(self.admin, self.admin_user)['access']).status_code, 200)
+
+    def test_revocations_outlive_refreshed_access_tokens(self):
+        tokens = get_tokens_for_user(self.admin, self.admin_user)
+        revoke_token(AccessToken(tokens['access']))
+        self.assertEqual(self.request(tokens['access']).status_code, 401)
+
+        lifetime = settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME'] + settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME']
+        with mock.patch('core.utils.token_helpers.cache') as revocations:
+            revoke_user_tokens(self.admin_user.pk)
+        self.assertEqual(revocations.set.call_args.args[2], lifetime.total_seconds())
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    RIDE_LIST_CACHE_TIMEOUT=60,
+    DATABASE_REPLICAS=[],
+)
+class RideListCacheTests(AdminAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.pending = create_ride(cls.admin_user, status='pending')
+        cls.completed = create_ride(cls.admin_user, status='completed')
+
+    def list_ids(self, **params):
+        response = self.client.get('/api/rides/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return sorted(ride['id_ride'] for ride in response.data['results'])
+
+    def test_repeated_lists_are_cached(self):
+        pending = self.list_ids(status='pending')
+        Ride.objects.filter(pk=self.completed.pk).update(status='pending')
+        self.assertEqual(self.list_ids(status='pending'), pending)
+        self.assertEqual(self.list_ids(status='pending', page_size=5), sorted([self.pending.pk, self.completed.pk]))
+
+    def test_status_change_invalidates_its_statuses_only(self):
+        before = {status: self.list_ids(status=status) for status in ('pending', 'completed', 'en-route')}
+        everything = self.list_ids()
+        with self.captureOnCommitCallbacks(execute=True):
+            ride = Ride.objects.get(pk=self.pending.pk)
+            ride.status = 'en-route'
+            ride.save()
+        self.assertEqual(self.list_ids(status='pending'), [])
+        self.assertEqual(self.list_ids(status='en-route'), [self.pending.pk])
+        self.assertEqual(self.list_ids(), everything)
+
+        # a list of an untouched status stays cached: a write without signals is not seen
+        Ride.objects.filter(pk=self.completed.pk).update(status='cancelled')
+        self.assertEqual(self.list_ids(status='completed'), before['completed'])
+        self.assertEqual(self.list_ids(status='en-route'), [self.pending.pk])
+
+    def test_user_change_invalidates_every_list(self):
+        self.assertEqual(self.list_ids(status='completed'), [self.completed.pk])
+        Ride.objects.filter(pk=self.completed.pk).update(status='cancelled')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin_user.first_name = 'Renamed'
+            self.admin_user.save()
+        self.assertEqual(self.list_ids(status='completed'), [])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Row locks are only taken on PostgreSQL')
+class RecentEventsRefreshTests(TransactionTestCase):
+    """Committed transactions on two connections, so the rebuild can race a writer."""
+
+    def setUp(self):
+        _, self.rider = create_user('rider', 'rider')
+        self.ride = create_ride(self.rider)
+
+    def wait_for_lock(self):
+        for _ in range(500):
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT count(*) FROM pg_locks WHERE NOT granted')
+                if cursor.fetchone()[0]:
+                    return
+            time.sleep(0.01)
+        self.fail('the rebuild never waited for the ride lock')
+
+    def test_rebuild_waits_for_writers_of_the_ride(self):
+        def rebuild():
+            try:
+                refresh_recent_events([self.ride.pk])
+            finally:
+                connections.close_all()
+
+        with transaction.atomic():
+            # another rebuild holds the ride while this transaction adds an event
+            Ride.objects.select_for_update().get(pk=self.ride.pk)
+            event = RideEvent.objects.bulk_create([RideEvent(id_ride=self.ride, description='Status changed to pickup')])[0]
+            thread = threading.Thread(target=rebuild)
+            thread.start()
+            self.wait_for_lock()
+        thread.join()
+
+        self.ride.refresh_from_db()
+        self.assertEqual([entry['id_ride_event'] for entry in self.ride.recent_events], [event.pk])
+
+class FastRideSerializerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        _, rider = create_user('rider', 'rider')
+        _, driver = create_user('driver', 'driver')
+        with cls.captureOnCommitCallbacks(execute=True):
+            ride = create_ride(rider, driver, status='en-route', pickup_latitude=37.123456789, pickup_longitude=-122.5)
+            RideEvent.objects.create(id_ride=ride, description='Status changed to en-route')
+            RideEvent.objects.create(id_ride=ride, description='Status changed to pickup \u00e9')
+        create_ride(driver, status='completed', pickup_time=timezone.now() - timedelta(days=3))
+
+    def assertSameJSON(self, instance, **kwargs):
+        renderer = JSONRenderer()
+        many = isinstance(instance, list)
+        self.assertEqual(
+            renderer.render(FastRideSerializer(instance, many=many, **kwargs).data),
+            renderer.render(RideSerializer(instance, many=many, **kwargs).data),
+        )
+
+    def test_output_is_byte_identical(self):
+        queryset = Ride.objects.select_related('id_rider', 'id_driver').order_by('id_ride')
+        self.assertTrue(queryset[0].recent_events)
+        annotated = queryset.annotate(distance_to_pickup=calculate_distance_annotation(37.7749, -122.4194))
+        fieldsets = [
+            {},
+            {'fields': ['id_ride', 'status', 'todays_ride_events']},
+            {'fields': ['id_ride', 'rider'], 'nested_fields': {'rider': ['email', 'role']}},
+        ]
+        for rides in (queryset, annotated):
+            for kwargs in fieldsets:
+                with self.subTest(annotated=rides is annotated, **kwargs):
+                    self.assertSameJSON(list(rides), **kwargs)
+                    self.assertSameJSON(rides.first(), **kwargs)
+
+    def test_benchmark_checks_both_serializers(self):
+        out = StringIO()
+        call_command('benchmark_serializers', page_sizes=[2], repeat=1, with_distance=True, stdout=out)
+        self.assertIn('compiled', out.getvalue())
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    RIDE_LIST_CACHE_TIMEOUT=0,
+    DATABASE_REPLICAS=[],
+)
+class SparseFieldsetTests(AdminAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ride = create_ride(cls.admin_user)
+
+    def list_query(self, params):
+        """The rides of `/api/rides/` with `params` and the SQL of the query that loaded them."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/rides/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        sql = [query['sql'] for query in queries if 'FROM "core_ride"' in query['sql'] and 'COUNT' not in query['sql']]
+        self.assertEqual(len(sql), 1)
+        return response.data['results'], sql[0]
+
+    def test_fields_narrow_the_response_and_the_query(self):
+        rides, sql = self.list_query({'fields': 'id_ride,status'})
+        self.assertEqual(rides, [{'id_ride': self.ride.pk, 'status': 'pending'}])
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('"dropoff_latitude"', sql)
+
+    def test_nested_fields_join_only_what_they_render(self):
+        rides, sql = self.list_query({'fields': 'id_ride,rider', 'rider.fields': 'email'})
+        self.assertEqual(rides, [{'id_ride': self.ride.pk, 'rider': {'email': 'admin@example.com'}}])
+        self.assertEqual(sql.count('JOIN'), 1)
+        self.assertNotIn('"phone_number"', sql)
+
+    def test_unknown_fields_are_rejected(self):
+        cases = [
+            ('/api/rides/', {'fields': 'id_ride,bogus'}, 'fields', 'bogus'),
+            ('/api/rides/', {'rider.fields': 'email,bogus'}, 'rider.fields', 'bogus'),
+            ('/api/rides/', {'status.fields': 'id'}, 'status.fields', 'rider, driver'),
+            (f'/api/rides/{self.ride.pk}/', {'fields': 'bogus'}, 'fields', 'pickup_time'),
+            ('/api/users/', {'fields': 'password'}, 'fields', 'email'),
+            ('/api/ride-events/', {'fields': 'bogus'}, 'fields', 'description'),
+        ]
+        for path, params, param, expected in cases:
+            with self.subTest(path=path, **params):
+                response = self.client.get(path, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(expected, str(response.data[param][0]))
+
+    def test_async_views_reject_unknown_fields(self):
+        token = get_tokens_for_user(self.admin, self.admin_user)['access']
+        response = self.client.get('/api/async/rides/', {'fields': 'bogus'}, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('id_ride', response.json()['fields'][0])
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    DATABASE_REPLICAS=[],
+    EXPORT_CHUNK_SIZE=2,
+)
+class ExportTests(AdminAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        _, cls.driver = create_user('driver', 'driver')
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.rides = [
+                create_ride(cls.admin_user, cls.driver, status='completed' if i % 2 else 'pending')
+                for i in range(5)
+            ]
+            RideEvent.objects.create(id_ride=cls.rides[1], description='Status changed to "completed", finally')
+
+    def export(self, path, params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode('utf-8')
+
+    def test_ndjson_has_one_serialized_ride_per_line(self):
+        with mock.patch('core.utils.export_helpers.ROWS_PER_CHUNK', 2):
+            response, content = self.export('/api/rides/export/', {'status': 'completed', 'ordering': 'pickup_time'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="rides.ndjson"')
+        self.assertTrue(content.endswith('\n'))
+        rows = [json.loads(line) for line in content.splitlines()]
+        expected = RideSerializer(
+            Ride.objects.filter(status='completed').order_by('pickup_time'), many=True
+        ).data
+        self.assertEqual(rows, json.loads(JSONRenderer().render(expected)))
+        self.assertEqual(rows[0]['todays_ride_events'][0]['description'], 'Status changed to "completed", finally')
+
+    def test_csv_flattens_nested_objects(self):
+        with mock.patch('core.utils.export_helpers.ROWS_PER_CHUNK', 2):
+            response, content = self.export(
+                '/api/rides/export/',
+                {'output': 'csv', 'fields': 'id_ride,driver,todays_ride_events', 'driver.fields': 'email,first_name'},
+            )
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(list(rows[0]), ['id_ride', 'driver.first_name', 'driver.email', 'todays_ride_events'])
+        self.assertEqual(sorted(int(row['id_ride']) for row in rows), [ride.pk for ride in self.rides])
+        self.assertEqual({row['driver.first_name'] for row in rows}, {'Driver'})
+        events = {row['id_ride']: json.loads(row['todays_ride_events']) for row in rows}
+        self.assertEqual(events[str(self.rides[1].pk)][0]['description'], 'Status changed to "completed", finally')
+        self.assertEqual(events[str(self.rides[0].pk)], [])
+
+    def test_ride_events_export_and_unknown_output(self):
+        response, content = self.export('/api/ride-events/export/', {'id_ride': self.rides[1].pk, 'output': 'csv'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="ride-events.csv"')
+        self.assertEqual([row['id_ride'] for row in csv.DictReader(StringIO(content))], [str(self.rides[1].pk)])
+
+        response = self.client.get('/api/rides/export/', {'output': 'xml'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ndjson', str(response.data['output']))
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    DATABASE_REPLICAS=[],
+)
+class BulkWriteTests(AdminAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ride = create_ride(cls.admin_user)
+
+    def ride_item(self, **fields):
+        return {
+            'status': 'pending', 'id_rider': self.admin_user.pk, 'id_driver': self.admin_user.pk,
+            'pickup_latitude': 37.77, 'pickup_longitude': -122.41,
+            'dropoff_latitude': 37.78, 'dropoff_longitude': -122.42,
+            'pickup_time': timezone.now().isoformat(),
+            **fields,
+        }
+
+    def bulk(self, method, items):
+        """
+        Send a bulk ride request and return the response and, for each
+        `rides_bulk_saved` sent once it commits, `created` and the
+        `(id_ride, previous_status, status)` of its rides.
+        """
+        calls = []
+
+        def receiver(sender, rides, created, **kwargs):
+            calls.append((created, [(ride.pk, ride.previous_status, ride.status) for ride in rides]))
+
+        rides_bulk_saved.connect(receiver)
+        self.addCleanup(rides_bulk_saved.disconnect, receiver)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)('/api/rides/bulk/', items, format='json')
+        return response, calls
+
+    def test_valid_items_are_written_and_invalid_ones_reported(self):
+        items = [self.ride_item(), self.ride_item(pickup_latitude=91), self.ride_item(id_driver=0), self.ride_item()]
+        response, calls = self.bulk('post', items)
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['written'], 2)
+        self.assertEqual([result['index'] for result in response.data['results']], [0, 3])
+        self.assertEqual(
+            [(error['index'], list(error['errors'])) for error in response.data['errors']],
+            [(1, ['pickup_latitude']), (2, ['id_driver'])],
+        )
+        written = Ride.objects.filter(pk__in=[result['id_ride'] for result in response.data['results']])
+        self.assertEqual(written.count(), 2)
+        self.assertEqual(written.first().pickup_geohash, geohash.encode(37.77, -122.41))
+
+        self.assertEqual(calls, [(True, [(ride.pk, None, 'pending') for ride in written.order_by('pk')])])
+
+    def test_nothing_written_sends_no_signal(self):
+        response, calls = self.bulk('post', [self.ride_item(status='flying')])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['written'], 0)
+        self.assertEqual(calls, [])
+        self.assertEqual(Ride.objects.count(), 1)
+
+        response = self.client.post('/api/rides/bulk/', {'status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_partial_updates_report_the_previous_status(self):
+        items = [{'id_ride': self.ride.pk, 'status': 'en-route'}, {'id_ride': 0, 'status': 'completed'}, {'status': 'pickup'}]
+        response, calls = self.bulk('patch', items)
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(
+            [(error['index'], list(error['errors'])) for error in response.data['errors']],
+            [(1, ['id_ride']), (2, ['id_ride'])],
+        )
+        self.ride.refresh_from_db()
+        self.assertEqual(self.ride.status, 'en-route')
+
+        self.assertEqual(calls, [(False, [(self.ride.pk, 'pending', 'en-route')])])
+
+    def test_ndjson_events_refresh_the_recent_events_of_their_rides(self):
+        body = '\n'.join(json.dumps(item) for item in [
+            {'id_ride': self.ride.pk, 'description': 'Status changed to pickup'},
+            {'id_ride': 0, 'description': 'Status changed to pickup'},
+        ])
+        receiver = mock.Mock()
+        ride_events_bulk_saved.connect(receiver)
+        self.addCleanup(ride_events_bulk_saved.disconnect, receiver)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/ride-events/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+
+        self.assertEqual([ride.pk for ride in receiver.call_args.kwargs['rides']], [self.ride.pk])
+        self.ride.refresh_from_db()
+        self.assertEqual([entry['description'] for entry in self.ride.recent_events], ['Status changed to pickup'])
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class InitDataTests(TransactionTestCase):
+    """Committed like a real run: Postgres only truncates tables without pending constraint checks."""
+
+    def init_data(self, *args):
+        """Run `init_data` at a fixed time; returns the rides and events it left, in id order."""
+        now = timezone.now().replace(year=2026, month=3, day=4, hour=18, minute=0, second=0, microsecond=0)
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            call_command('init_data', *args, stdout=StringIO())
+        return (
+            list(Ride.objects.order_by('id_ride').values()),
+            list(RideEvent.objects.order_by('id_ride_event').values()),
+        )
+
+    def test_same_seed_generates_the_same_rows(self):
+        rides, events = self.init_data('--users=9', '--rides=25', '--seed=7', '--batch-size=10')
+        self.assertEqual(len(rides), 25)
+        self.assertTrue(events)
+        self.assertEqual(User.objects.filter(role='driver').count(), 3)
+
+        # without --users only the rides and their events are recreated
+        self.assertEqual(self.init_data('--rides=25', '--seed=7', '--batch-size=10'), (rides, events))
+        self.assertNotEqual(self.init_data('--rides=25', '--seed=8', '--batch-size=10')[0], rides)
+
+    def test_batches_do_not_depend_on_their_order(self):
+        now = timezone.now()
+        generator = lambda: SyntheticDataGenerator([1, 2, 3], [4], seed=3, now=now)
+        in_order = generator()
+        first, second = in_order.batch(0, 1, 5, 1), in_order.batch(1, 6, 5, 100)
+        reversed_order = generator()
+        self.assertEqual(reversed_order.batch(1, 6, 5, 100), second)
+        self.assertEqual(reversed_order.batch(0, 1, 5, 1), first)
+
+    def test_new_users_are_numbered_after_the_existing_ones(self):
+        self.init_data('--users=6', '--rides=0')
+        DjangoUser.objects.filter(username='driver1').delete()
+        User.objects.filter(email='driver1@example.com').delete()
+        self.init_data('--users=3', '--rides=0')
+        self.assertEqual(
+            list(DjangoUser.objects.filter(username__startswith='driver').order_by('id').values_list('username', flat=True)),
+            ['driver2', 'driver3'],
+        )
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Query plans are only checked on PostgreSQL')
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    RIDE_LIST_CACHE_TIMEOUT=0,
+    COUNT_CACHE_TIMEOUT=0,
+    DATABASE_REPLICAS=[],
+)
+class QueryPlanTests(AdminAPITestCase):
+    """
+    Every query shape of the ride and ride event endpoints must be served by
+    an index. Plans are taken with sequential scans (and, for shapes that an
+    index can return in order, sorts) disabled: the planner then only falls
+    back to them when no index can serve the query, so the result does not
+    depend on the size of the test dataset.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        rides, _ = load_synthetic_rides(create_users(60, driver_every=3), cls.admin.id, 2000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_ride, core_rideevent, core_user')
+        cls.rider = User.objects.get(pk=rides[0]['id_rider_id'])
+        cls.ride_id = rides[0]['id_ride']
+
+    @contextmanager
+    def planner_settings(self, sort_allowed):
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+            if not sort_allowed:
+                cursor.execute('SET enable_sort = off')
+        try:
+            yield
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('RESET enable_seqscan')
+                cursor.execute('RESET enable_sort')
+
+    def assertIndexedPlan(self, plan, index=None, sort_allowed=False):
+        nodes = list(iter_plan_nodes(plan))
+        for node in nodes:
+            relation = node.get('Relation Name', '')
+            self.assertFalse(
+                node['Node Type'] == 'Seq Scan' and relation.startswith('core_'),
+                f'Sequential scan on {relation}'
+            )
+            if not sort_allowed:
+                self.assertNotIn('Sort', node['Node Type'], f'{node["Node Type"]} on {node.get("Sort Key")}')
+        if index is not None:
+            self.assertUsesIndex(index, [node.get('Index Name') for node in nodes])
+
+    def assertUsesIndex(self, index, used):
+        # Prefix match, as Postgres may pick a column's pattern_ops `_like` twin
+        self.assertTrue(any(name and name.startswith(index) for name in used), f'{index} not used in {used}')
+
+    def assertIndexedRequest(self, path, params=None, index=None, sort_allowed=False):
+        """
+        Request `path` and check the plan of every query it issued on the
+        core tables. `index` must be used by at least one of them.
+        """
+        with self.planner_settings(sort_allowed):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(path, params or {})
+            self.assertEqual(response.status_code, 200, response.content)
+
+            indexes = []
+            for query in context.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or 'core_' not in sql:
+                    continue
+                plan = explain(sql)
+                self.assertIndexedPlan(plan, sort_allowed=sort_allowed)
+                indexes += [node.get('Index Name') for node in iter_plan_nodes(plan)]
+            if index is not None:
+                self.assertUsesIndex(index, indexes)
+        return response
+
+    def test_ride_list_plans(self):
+        shapes = [
+            ({}, 'ride_pickup_time_id_idx'),
+            ({'ordering': 'pickup_time'}, 'ride_pickup_time_id_idx'),
+            ({'status': 'en-route'}, 'ride_status_pickup_time_idx'),
+            ({'status': 'pending', 'ordering': 'pickup_time'}, 'ride_status_pickup_time_idx'),
+            ({'status': 'completed'}, 'ride_status_pickup_time_idx'),
+            ({'rider_email': self.rider.email}, 'ride_rider_pickup_time_idx'),
+            ({'rider_email': self.rider.email, 'ordering': 'pickup_time'}, 'ride_rider_pickup_time_idx'),
+            ({'rider_email': self.rider.email, 'status': 'completed'}, 'ride_rider_pickup_time_idx'),
+            ({'page': 3}, 'ride_pickup_time_id_idx'),
+        ]
+        for params, index in shapes:
+            with self.subTest(**params):
+                self.assertIndexedRequest('/api/rides/', params, index)
+
+    def test_ride_cursor_pagination_plans(self):
+        shapes = [
+            ({}, 'ride_pickup_time_id_idx'),
+            ({'ordering': 'pickup_time'}, 'ride_pickup_time_id_idx'),
+            ({'status': 'completed'}, 'ride_status_pickup_time_idx'),
+            ({'rider_email': self.rider.email}, 'ride_rider_pickup_time_idx'),
+        ]
+        for params, index in shapes:
+            with self.subTest(**params):
+                params = {**params, 'pagination': 'cursor', 'page_size': 2}
+                response = self.assertIndexedRequest('/api/rides/', params, index)
+                # the seek predicate of the next page must use the same index
+                next_params = parse_qs(urlparse(response.json()['next']).query)
+                self.assertIndexedRequest('/api/rides/', {**params, 'cursor': next_params['cursor'][0]}, index)
+
+    def test_ride_retrieve_plan(self):
+        self.assertIndexedRequest(f'/api/rides/{self.ride_id}/', index='core_ride_pkey')
+
+    def test_nearby_plans(self):
+        # Only the rides inside the bounding box or the searched geohash cells
+        # are sorted by distance
+        position = {'latitude': 37.7897, 'longitude': -122.4011}
+        self.assertIndexedRequest(
+            '/api/rides/', {**position, 'radius_km': 2}, 'ride_pickup_lat_lon_idx', sort_allowed=True
+        )
+        self.assertIndexedRequest(
+            '/api/rides/nearest/', {**position, 'k': 5}, 'core_ride_pickup_geohash', sort_allowed=True
+        )
+
+    def test_ride_event_plans(self):
+        since = (timezone.now() - timedelta(hours=24)).isoformat()
+        self.assertIndexedRequest('/api/ride-events/', index='core_rideevent_pkey')
+        # a ride's events are few, sorting them is bounded
+        self.assertIndexedRequest(
+            '/api/ride-events/', {'id_ride': self.ride_id}, 'rideevent_ride_created_at_idx', sort_allowed=True
+        )
+        self.assertIndexedRequest(
+            '/api/ride-events/', {'id_ride': self.ride_id, 'created_at__gte': since},
+            'rideevent_ride_created_at_idx', sort_allowed=True
+        )
+
+    def test_admin_changelist_plans(self):
+        DjangoUser.objects.filter(pk=self.admin.pk).update(is_staff=True, is_superuser=True)
+        self.client.force_login(self.admin)
+        driver = Ride.objects.get(pk=self.ride_id).id_driver_id
+        shapes = [
+            ('/admin/core/ride/', {}, 'core_ride_pkey'),
+            ('/admin/core/ride/', {'status': 'completed'}, 'ride_status_pickup_time_idx'),
+            ('/admin/core/ride/', {'id_driver': driver}, None),
+            ('/admin/core/ride/', {'q': self.ride_id}, 'core_ride_pkey'),
+            ('/admin/core/rideevent/', {}, 'core_rideevent_pkey'),
+            ('/admin/core/rideevent/', {'id_ride': self.ride_id}, 'rideevent_ride_created_at_idx'),
+            ('/admin/core/user/', {'q': self.rider.email.upper()}, 'user_email_upper_idx'),
+        ]
+        for path, params, index in shapes:
+            with self.subTest(path=path, **params):
+                # filtered lists sort the rows they match
+                self.assertIndexedRequest(path, params, index, sort_allowed=bool(params))
+
+    def test_recent_events_plans(self):
+        cutoff = timezone.now() - timedelta(hours=24)
+        ride_ids = list(Ride.objects.values_list('id_ride', flat=True)[:50])
+        with self.planner_settings(sort_allowed=True):
+            # refresh_recent_events
+            self.assertIndexedPlan(
+                explain_queryset(RideEvent.objects.filter(id_ride__in=ride_ids, created_at__gte=cutoff)),
+                'rideevent_ride_created_at_idx',
+                sort_allowed=True,
+            )
+        with self.planner_settings(sort_allowed=False):
+            # expire_recent_events
+            self.assertIndexedPlan(
+                explain_queryset(
+                    Ride.objects.filter(recent_events_expire_at__lte=timezone.now()).values_list('id_ride', 'status')[:500]
+                ),
+                'ride_recent_events_expiry_idx',
+            )
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Ride events are only partitioned on PostgreSQL')
+class RideEventPartitionTests(TestCase):
+    """Postgres DDL is transactional, so each conversion is rolled back with its test."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _, cls.user = create_user('rider1', 'rider')
+        cls.ride = create_ride(cls.user, status='completed')
+        cls.old_event = RideEvent.objects.create(id_ride=cls.ride, description='Status changed to pickup')
+        RideEvent.objects.filter(pk=cls.old_event.pk).update(created_at=timezone.now() - timedelta(days=40))
+
+    def test_convert_keeps_rows_and_ids(self):
+        self.assertEqual(convert_to_partitioned('day'), 'core_rideevent_history')
+        self.assertTrue(is_partitioned())
+        self.assertEqual(list(RideEvent.objects.values_list('pk', flat=True)), [self.old_event.pk])
+
+        create_partitions(timezone.now() + timedelta(days=2), 'day')
+        event = RideEvent.objects.create(id_ride=self.ride, description='Status changed to dropoff')
+        self.assertGreater(event.pk, self.old_event.pk)
+
+    def test_queries_prune_partitions(self):
+        convert_to_partitioned('day')
+        today = period_start(timezone.now(), 'day')
+        create_partitions(today + timedelta(days=3), 'day', start=today - timedelta(days=5))
+
+        plan = explain_queryset(RideEvent.objects.filter(
+            id_ride=self.ride, created_at__gte=today + timedelta(days=1), created_at__lt=today + timedelta(days=2)
+        ))
+        scanned = {node['Relation Name'] for node in iter_plan_nodes(plan) if 'Relation Name' in node}
+        self.assertEqual(scanned, {f'core_rideevent_p{today + timedelta(days=1):%Y%m%d}'})
+
+    def test_default_partition_catches_rows_past_the_last_range(self):
+        convert_to_partitioned('day')
+        self.assertEqual(default_partition(), 'core_rideevent_default')
+        today = period_start(timezone.now(), 'day')
+        create_partitions(today + timedelta(days=1), 'day')
+
+        # no partition covers this day yet: the insert lands in the default partition
+        event = RideEvent.objects.create(id_ride=self.ride, description='Status changed to dropoff')
+        RideEvent.objects.filter(pk=event.pk).update(created_at=today + timedelta(days=5, hours=3))
+        err = StringIO()
+        call_command('partition_ride_events', ahead=3, stdout=StringIO(), stderr=err)
+        self.assertIn('1 ride events are in the default partition', err.getvalue())
+
+        # creating the partition of its day moves the row out of the default partition
+        err = StringIO()
+        call_command('partition_ride_events', ahead=5, stdout=StringIO(), stderr=err)
+        self.assertEqual(err.getvalue(), '')
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM core_rideevent WHERE id_ride_event = %s', [event.pk])
+            self.assertEqual(cursor.fetchone()[0], f'core_rideevent_p{today + timedelta(days=5):%Y%m%d}')
+        self.assertEqual(RideEvent.objects.count(), 2)
+
+    def test_retention_drops_expired_partitions(self):
+        convert_to_partitioned('day')
+        today = period_start(timezone.now(), 'day')
+        create_partitions(today + timedelta(days=1), 'day')
+        self.assertEqual(expired_partitions(today - timedelta(days=40)), [])
+
+        # the history partition expires once its newest event is old enough
+        expired = expired_partitions(today)
+        self.assertIn('core_rideevent_history', expired)
+        for name in expired:
+            detach_partition(name)
+        self.assertFalse(RideEvent.objects.exists())
+        self.assertTrue(all(start >= today for _, start, _ in list_partitions()))
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    RIDE_LIST_CACHE_TIMEOUT=0,
+    DATABASE_REPLICAS=[],
+)
+class AsyncEndpointTests(AdminAPITestCase):
+    """The async lists share the page-number pagination of the DRF lists and nothing else."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        now = timezone.now()
+        cls.rides = [
+            create_ride(cls.admin_user, status='completed' if i % 3 else 'pending', pickup_time=now - timedelta(hours=i))
+            for i in range(7)
+        ]
+        RideEvent.objects.bulk_create([
+            RideEvent(id_ride=cls.rides[0], description=f'Status changed to pickup {i}') for i in range(4)
+        ])
+
+    def setUp(self):
+        super().setUp()
+        token = get_tokens_for_user(self.admin, self.admin_user)['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def get_both(self, path, params):
+        """The DRF and async responses of `path`, with the async links pointed at the DRF endpoint."""
+        response = self.client.get(f'/api/{path}', params)
+        async_response = self.client.get(f'/api/async/{path}', params)
+        self.assertEqual(async_response.status_code, response.status_code)
+        return response.json(), json.loads(async_response.content.decode().replace('/api/async/', '/api/'))
+
+    def test_lists_match_the_drf_lists(self):
+        cases = [
+            ('rides/', {}),
+            ('rides/', {'status': 'completed', 'page_size': 2, 'page': 2}),
+            ('rides/', {'ordering': 'pickup_time', 'page_size': 3, 'page': 'last'}),
+            ('rides/', {'rider_email': 'admin@example.com', 'fields': 'id_ride,rider', 'rider.fields': 'email'}),
+            ('ride-events/', {'id_ride': self.rides[0].pk, 'page_size': 3, 'page': 2}),
+        ]
+        for path, params in cases:
+            with self.subTest(path=path, **params):
+                data, async_data = self.get_both(path, params)
+                self.assertEqual(async_data, data)
+                self.assertTrue(data['results'])
+
+    def test_invalid_pages_are_not_found(self):
+        for page in (99, 'abc', 0):
+            with self.subTest(page=page):
+                data, async_data = self.get_both('rides/', {'page': page})
+                self.assertEqual(async_data, data)
+                self.assertIn('Invalid page', data['detail'])
+
+    def test_cursor_and_nearby_params_are_not_supported(self):
+        # the async list always pages by number; cursor and nearby search are DRF only
+        params = {'pagination': 'cursor', 'latitude': 37.77, 'longitude': -122.41, 'radius_km': 1, 'page_size': 2}
+        data = self.client.get('/api/async/rides/', params).json()
+        self.assertEqual(data['count'], len(self.rides))
+        self.assertIn('page=2', data['next'])
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    RIDE_LIST_CACHE_TIMEOUT=0,
+    DATABASE_REPLICAS=['replica_1'],
+    REPLICA_PIN_SECONDS=5,
+)
+class ReplicaRoutingTests(AdminAPITestCase):
+    """
+    There is no replica database in tests: the router records where each
+    read would go and sends it to the primary.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ride = create_ride(cls.admin_user)
+
+    def setUp(self):
+        super().setUp()
+        self.reads = []
+        route = PrimaryReplicaRouter.db_for_read
+
+        def db_for_read(router, model, **hints):
+            self.reads.append(route(router, model, **hints))
+            return None
+
+        patcher = mock.patch.object(PrimaryReplicaRouter, 'db_for_read', db_for_read)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, method='get', path='/api/rides/', data=None, client=None):
+        """Send a request; returns the databases its reads were routed to (None for the primary)."""
+        self.reads = []
+        response = getattr(client or self.client, method)(path, data, format='json')
+        reads = list(self.reads)
+        self.assertLess(response.status_code, 500)
+        self.assertIsNone(PrimaryReplicaRouter().db_for_read(Ride), 'routing outlived the request')
+        return reads, response
+
+    def test_safe_requests_read_from_a_replica(self):
+        for path in ('/api/rides/', f'/api/rides/{self.ride.pk}/', '/api/users/', '/api/ride-events/'):
+            with self.subTest(path=path):
+                reads, _ = self.request(path=path)
+                # the permission check reads from the primary
+                self.assertEqual(set(reads), {None, 'replica_1'})
+        self.assertEqual(PrimaryReplicaRouter().db_for_write(Ride), 'default')
+
+    def test_writes_pin_the_user_to_the_primary_until_the_pin_expires(self):
+        reads, response = self.request('patch', f'/api/rides/{self.ride.pk}/', {'status': 'flying'})
+        self.assertEqual(response.status_code, 400)
+        # a failed write does not pin
+        self.assertIn('replica_1', self.request()[0])
+
+        reads, response = self.request('patch', f'/api/rides/{self.ride.pk}/', {'status': 'en-route'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(reads), {None})
+        self.assertEqual(set(self.request()[0]), {None})
+
+        # other users keep reading from the replica
+        other, _ = create_user('admin2', 'admin')
+        client = APIClient()
+        client.force_authenticate(other)
+        self.assertIn('replica_1', self.request(client=client)[0])
+
+        expired = time.time() + settings.REPLICA_PIN_SECONDS + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=expired):
+            self.assertIn('replica_1', self.request()[0])
+
+    @override_settings(RIDE_LIST_CACHE_TIMEOUT=60)
+    def test_ride_list_cache_is_filled_from_the_primary(self):
+        reads, response = self.request()
+        self.assertEqual(set(reads), {None})
+        # served from the cache: only the permission check reads
+        reads, cached = self.request()
+        self.assertEqual((reads, cached.data), ([None], response.data))
+        # other lists still read from a replica
+        self.assertIn('replica_1', self.request(path='/api/ride-events/')[0])
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RideEventIngestTests(AdminAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ride = create_ride(cls.admin_user, status='en-route')
+
+    def setUp(self):
+        super().setUp()
+        self.stream = MemoryEventStream('test')
+        patcher = mock.patch('core.utils.ingest_helpers.get_stream', return_value=self.stream)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def ingest(self, items):
+        return self.client.post('/api/ride-events/ingest/', items, format='json')
+
+    def test_ingest_then_drain(self):
+        response = self.ingest([
+            {'id_ride': self.ride.pk, 'description': 'Status changed to pickup', 'dedup_key': 'device-1'},
+            {'id_ride': self.ride.pk, 'description': 'Status changed to pickup', 'dedup_key': 'device-1'},
+            {'id_ride': self.ride.pk},
+            {'id_ride': self.ride.pk + 1, 'description': 'Status changed to dropoff'},
+        ])
+        self.assertEqual(response.status_code, 207, response.data)
+        self.assertEqual(response.data['accepted'], 2)
+        self.assertEqual(response.data['duplicates'], [1])
+        self.assertEqual([error['index'] for error in response.data['errors']], [2])
+        self.assertFalse(RideEvent.objects.exists())
+        self.assertEqual(ingest_stats()['length'], 2)
+
+        entries = self.stream.read('worker', 10, 0, 60000)
+        written, duplicates, rejected = write_ingested_events(entries)
+        self.assertEqual((written, duplicates), (1, 0))
+        self.assertEqual(rejected, [response.data['results'][1]['entry_id']])
+        self.stream.ack([entry_id for entry_id, _ in entries])
+
+        event = RideEvent.objects.get()
+        self.assertEqual(event.dedup_key, 'device-1')
+        self.assertLess(event.created_at, timezone.now())
+        self.assertEqual(ingest_stats()['length'], 0)
+
+    def test_redelivered_entries_are_written_once(self):
+        self.ingest([{'id_ride': self.ride.pk, 'description': 'Status changed to pickup'}] * 3)
+        entries = self.stream.read('worker-1', 10, 0, 60000)
+        self.assertEqual(write_ingested_events(entries), (3, 0, []))
+
+        # worker-1 stopped before acknowledging: worker-2 claims the same entries
+        self.assertEqual(ingest_stats()['consumers'], {'worker-1': 3})
+        claimed = self.stream.read('worker-2', 10, 0, 0)
+        self.assertEqual(claimed, entries)
+        self.assertEqual(write_ingested_events(claimed), (0, 3, []))
+        self.assertEqual(RideEvent.objects.count(), 3)
+
+    @override_settings(RIDE_EVENT_INGEST_MAX_DELIVERIES=2)
+    def test_failing_entry_is_isolated_then_dead_lettered(self):
+        self.ingest([{'id_ride': self.ride.pk, 'description': 'Status changed to pickup'}])
+        [poison_id] = self.stream.append([(None, json.dumps({
+            'id_ride': self.ride.pk, 'description': 'Status changed to dropoff', 'dedup_key': None,
+            'created_by': self.admin_user.pk, 'created_at': 'not a date',
+        }))])
+        self.ingest([{'id_ride': self.ride.pk, 'description': 'Status changed to dropoff'}])
+
+        entries = self.stream.read('worker', 10, 0, 60000)
+        self.assertEqual(drain_batch(self.stream, entries), (2, 0, [], [poison_id], []))
+        self.assertEqual(RideEvent.objects.count(), 2)
+        self.assertEqual(ingest_stats()['pending'], 1)
+
+        claimed = self.stream.read('worker', 10, 0, 0)
+        self.assertEqual([entry_id for entry_id, _ in claimed], [poison_id])
+        self.assertEqual(drain_batch(self.stream, claimed), (0, 0, [], [], [poison_id]))
+        stats = ingest_stats()
+        self.assertEqual((stats['length'], stats['dead_letters']), (0, 1))
+        self.assertIn('ValueError', self.stream.dead_letters[0][2])
+
+    def test_connection_error_leaves_batch_pending(self):
+        self.ingest([{'id_ride': self.ride.pk, 'description': 'Status changed to pickup'}] * 2)
+        entries = self.stream.read('worker', 10, 0, 60000)
+        with mock.patch('core.utils.ingest_helpers.write_ingested_events', side_effect=OperationalError('gone')):
+            with self.assertRaises(OperationalError):
+                drain_batch(self.stream, entries)
+        self.assertEqual(ingest_stats()['pending'], 2)
+        self.assertEqual(self.stream.deliveries([entry_id for entry_id, _ in entries]), {
+            entry_id: 1 for entry_id, _ in entries
+        })
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RidePushTests(AdminAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.token = get_tokens_for_user(cls.admin, cls.admin_user)['access']
+        cls.ride = create_ride(cls.admin_user)
+
+    def change_ride(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ride = Ride.objects.get(pk=self.ride.pk)
+            ride.status = 'en-route'
+            ride.save()
+            RideEvent.objects.create(id_ride=ride, description='Status changed to en-route')
+
+    async def test_subscribers_receive_deltas_once(self):
+        response = await self.async_client.get(
+            '/api/push/rides/', {'ride': self.ride.pk, 'status': 'pending,en-route'},
+            headers={'Authorization': f'Bearer {self.token}'},
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertIn(b'event: subscribed', await anext(stream))
+
+        await sync_to_async(self.change_ride)()
+        status_delta = (await asyncio.wait_for(anext(stream), 5)).decode()
+        event_delta = (await asyncio.wait_for(anext(stream), 5)).decode()
+        await response.streaming_content.aclose()
+
+        self.assertTrue(status_delta.startswith('event: ride.status\n'))
+        data = json.loads(status_delta.split('data: ', 1)[1])
+        self.assertEqual((data['status'], data['previous_status']), ('en-route', 'pending'))
+        self.assertTrue(event_delta.startswith('event: ride.event\n'))
+        self.assertEqual(json.loads(event_delta.split('data: ', 1)[1])['description'], 'Status changed to en-route')
+
+    def test_failed_push_does_not_undo_the_write(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            rides = [create_ride(self.admin_user) for _ in range(2)]
+        generation = get_generations(status_generation('completed'))
+
+        with mock.patch('core.signals.publish', side_effect=ConnectionError('Redis is down')):
+            with self.assertLogs('django', 'ERROR') as logs, self.captureOnCommitCallbacks(execute=True):
+                rides[0].status = 'completed'
+                rides[0].save()
+                response = self.client.patch(
+                    '/api/rides/bulk/', [{'id_ride': rides[1].pk, 'status': 'completed'}], format='json',
+                )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(len(logs.records), 2)
+
+        # The callbacks after the push still ran
+        counts = RideRollup.objects.values('status').annotate(total=Sum('count')).filter(total__gt=0)
+        self.assertEqual({row['status']: row['total'] for row in counts}, {'completed': 2})
+        self.assertNotEqual(get_generations(status_generation('completed')), generation)
+
+    async def test_subscription_is_validated(self):
+        headers = {'Authorization': f'Bearer {self.token}'}
+        response = await self.async_client.get('/api/push/rides/', {'status': 'unknown'}, headers=headers)
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get('/api/push/rides/', {'ride': self.ride.pk})
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    DRIVER_INDEX_REFRESH_MS=0,
+)
+class DriverMatchingTests(AdminAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.drivers = []
+        for number in range(3):
+            user, driver = create_user(f'driver{number}', 'driver')
+            cls.drivers.append(driver)
+        cls.driver_token = get_tokens_for_user(user, cls.drivers[-1])['access']
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('core.utils.driver_helpers._live_index', LiveDriverIndex(MemoryDriverStore()))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def report(self, driver, latitude, longitude, **extra):
+        response = self.client.post('/api/drivers/location/', {
+            'id_driver': driver.id_user, 'latitude': latitude, 'longitude': longitude, **extra,
+        }, format='json')
+        self.assertEqual(response.status_code, 204, getattr(response, 'data', None))
+
+    def nearest(self, **params):
+        response = self.client.get('/api/drivers/nearest/', {'latitude': 37.7749, 'longitude': -122.4194, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return [driver['id_driver'] for driver in response.data]
+
+    def test_nearest_available_drivers(self):
+        self.report(self.drivers[0], 37.80, -122.41)
+        self.report(self.drivers[1], 37.7750, -122.4195)
+        self.report(self.drivers[2], 37.90, -122.30)
+        self.assertEqual(self.nearest(), [self.drivers[1].id_user, self.drivers[0].id_user])
+        self.assertEqual(self.nearest(k=1), [self.drivers[1].id_user])
+        self.assertEqual(len(self.nearest(radius_km=50)), 3)
+
+        # A driver who moved or stopped taking rides is matched accordingly
+        self.report(self.drivers[0], 37.7749, -122.4194)
+        self.report(self.drivers[1], 37.7750, -122.4195, available=False)
+        self.assertEqual(self.nearest(), [self.drivers[0].id_user])
+
+    def test_drivers_report_their_own_location(self):
+        client = APIClient()
+        response = client.post(
+            '/api/drivers/location/', {'id_driver': self.drivers[0].id_user, 'latitude': 37.7749, 'longitude': -122.4194},
+            format='json', headers={'Authorization': f'Bearer {self.driver_token}'},
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.nearest(), [self.drivers[-1].id_user])
+
+        response = self.client.post('/api/drivers/location/', {
+            'id_driver': self.admin.id, 'latitude': 37.7749, 'longitude': -122.4194,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_silent_drivers_are_pruned(self):
+        self.report(self.drivers[0], 37.80, -122.41)
+        with mock.patch('core.utils.driver_helpers.time.time', return_value=time.time() - 300):
+            self.report(self.drivers[1], 37.7750, -122.4195)
+        self.assertEqual(self.nearest(), [self.drivers[0].id_user])
+
+        out = StringIO()
+        call_command('prune_drivers', stdout=out)
+        self.assertIn('Removed 1 silent drivers', out.getvalue())
+        store = get_driver_store()
+        self.assertEqual([driver[0] for driver in store.snapshot()[1]], [self.drivers[0].id_user])
+        # The removal reaches the index through the updates stream
+        index = get_live_index()
+        index._sync()
+        self.assertNotIn(self.drivers[1].id_user, index.index.drivers)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    RIDE_TRACE_SIMPLIFY_METERS=3,
+)
+class RideTraceTests(AdminAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        driver, cls.driver = create_user('driver', 'driver')
+        cls.driver_token = get_tokens_for_user(driver, cls.driver)['access']
+        cls.ride = create_ride(cls.admin_user, cls.driver, status='en-route')
+        cls.other_ride = create_ride(cls.admin_user, cls.driver, status='en-route')
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('core.utils.trace_helpers._buffer', MemoryTraceBuffer())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.url = f'/api/rides/{self.ride.pk}/trace/'
+
+    def replay(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_encoding_round_trip(self):
+        points = [(1792353434000, 3777000, -12241000), (1792353435000, 3776998, -12241003), (1792353433000, 0, 0)]
+        data = encode_trace(points)
+        self.assertEqual(list(decode_trace(data)), points)
+        self.assertEqual(len(encode_trace(points[:2])) - len(encode_trace(points[:1])), 4)
+
+    def test_pings_are_compressed_when_the_ride_finishes(self):
+        start = (timezone.now() - timedelta(minutes=5)).replace(microsecond=0)
+        # A straight drive north, with one detour to the east
+        pings = [
+            {'latitude': round(37.77 + i * 0.0001, 4), 'longitude': -122.41 + (0.001 if i == 30 else 0),
+             'recorded_at': (start + timedelta(seconds=i)).isoformat()}
+            for i in range(60)
+        ]
+        client = APIClient()
+        response = client.post(
+            self.url, pings[30:], format='json', headers={'Authorization': f'Bearer {self.driver_token}'},
+        )
+        self.assertEqual(response.data, {'buffered': 30})
+        response = self.client.post(self.url, pings[:30], format='json')
+        self.assertEqual(response.data, {'buffered': 60})
+
+        rows = self.replay()
+        self.assertEqual(len(rows), 60)
+        self.assertEqual([row['latitude'] for row in rows], [ping['latitude'] for ping in pings])
+        self.assertEqual(len(self.replay(simplify_m=3)), 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ride = Ride.objects.get(pk=self.ride.pk)
+            ride.status = 'completed'
+            ride.save()
+        trace = RideTrace.objects.get(pk=self.ride.pk)
+        self.assertEqual((trace.ping_count, trace.point_count), (60, 5))
+        self.assertLess(len(trace.points), 5 * 12)
+        rows = self.replay(output='ndjson')
+        self.assertEqual([row['longitude'] for row in rows], [-122.41, -122.41, -122.409, -122.41, -122.41])
+        self.assertEqual(rows[0]['recorded_at'], pings[0]['recorded_at'])
+
+        response = self.client.post(self.url, pings[:1], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_pings_arriving_while_finishing_are_kept(self):
+        start = timezone.now() - timedelta(minutes=5)
+        record_pings(self.ride.pk, [to_point(start + timedelta(seconds=i), 37.77, -122.41) for i in range(3)])
+        late = to_point(start + timedelta(seconds=3), 37.77, -122.41)
+
+        def simplify(points, tolerance_m):
+            # A ping buffered between taking the buffer and storing the trace
+            record_pings(self.ride.pk, [late])
+            return points
+
+        with mock.patch('core.utils.trace_helpers.simplify', simplify):
+            finalize_ride_traces([self.ride.pk])
+        self.assertEqual(RideTrace.objects.get(pk=self.ride.pk).ping_count, 3)
+        self.assertEqual(buffered_points(self.ride.pk), [late])
+
+        # A failed write puts the pings back
+        with mock.patch.object(RideTrace.objects, 'bulk_create', side_effect=OperationalError('gone')):
+            with self.assertRaises(OperationalError):
+                finalize_ride_traces([self.ride.pk])
+        self.assertEqual(buffered_points(self.ride.pk), [late])
+        finalize_ride_traces([self.ride.pk])
+        self.assertEqual(RideTrace.objects.get(pk=self.ride.pk).ping_count, 4)
+        self.assertEqual(buffered_points(self.ride.pk), [])
+
+    def test_failed_trace_write_does_not_fail_the_ride(self):
+        point = to_point(timezone.now() - timedelta(minutes=1), 37.77, -122.41)
+        record_pings(self.ride.pk, [point])
+        with mock.patch.object(RideTrace.objects, 'bulk_create', side_effect=OperationalError('gone')):
+            with self.assertLogs('django', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+                ride = Ride.objects.get(pk=self.ride.pk)
+                ride.status = 'completed'
+                ride.save()
+                response = self.client.patch(
+                    '/api/rides/bulk/', [{'id_ride': self.other_ride.pk, 'status': 'completed'}], format='json',
+                )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertFalse(RideTrace.objects.exists())
+        self.assertEqual(buffered_points(self.ride.pk), [point])
+        # The rollup callback registered after the trace one still ran
+        self.assertEqual(RideRollup.objects.filter(status='completed').aggregate(total=Sum('count'))['total'], 2)
+
+    def test_drivers_record_their_own_rides_only(self):
+        driver, other = create_user('other', 'driver')
+        token = get_tokens_for_user(driver, other)['access']
+        client = APIClient()
+        response = client.post(
+            self.url, {'latitude': 37.77, 'longitude': -122.41}, format='json',
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        self.assertEqual(response.status_code, 403)
+        response = client.get(self.url, headers={'Authorization': f'Bearer {self.driver_token}'})
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    RIDE_LIST_CACHE_TIMEOUT=0,
+    COUNT_CACHE_TIMEOUT=0,
+    DATABASE_REPLICAS=[],
+)
+class RideAnalyticsTests(AdminAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pickup_time = timezone.now().replace(minute=30, second=0, microsecond=0) - timedelta(hours=2)
+
+    def create_ride(self, status, latitude=37.77):
+        return create_ride(self.admin_user, status=status, pickup_latitude=latitude, pickup_time=self.pickup_time)
+
+    def analytics(self, **params):
+        response = self.client.get('/api/analytics/rides/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_rollups_follow_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            rides = [self.create_ride('pending') for _ in range(3)] + [self.create_ride('pending', latitude=40.71)]
+            RideEvent.objects.create(id_ride=rides[0], description='Driver assigned')
+        with self.captureOnCommitCallbacks(execute=True):
+            rides[0].status = 'en-route'
+            rides[0].save()
+            rides[1].delete()
+            response = self.client.patch('/api/rides/bulk/', [{'id_ride': rides[2].pk, 'status': 'completed'}], format='json')
+            self.assertEqual(response.status_code, 200, response.data)
+            response = self.client.post('/api/ride-events/bulk/', [
+                {'id_ride': rides[0].pk, 'description': 'Driver assigned'},
+                {'id_ride': rides[3].pk, 'description': 'Ride cancelled by rider'},
+            ], format='json')
+            self.assertEqual(response.status_code, 201, response.data)
+
+        data = self.analytics()
+        self.assertEqual(data['rides'], [
+            {'status': 'completed', 'count': 1}, {'status': 'en-route', 'count': 1}, {'status': 'pending', 'count': 1},
+        ])
+        self.assertEqual(data['events'], [
+            {'description': 'Driver assigned', 'count': 2}, {'description': 'Ride cancelled by rider', 'count': 1},
+        ])
+        by_cell = self.analytics(group_by='cell,hour', status='pending')['rides']
+        self.assertEqual(by_cell, [{
+            'hour': self.pickup_time.replace(minute=0).isoformat(), 'cell': rides[3].pickup_geohash[:5], 'count': 1,
+        }])
+        self.assertEqual(self.analytics(since=(self.pickup_time + timedelta(hours=1)).isoformat())['rides'], [])
+
+        # Rebuilt from the tables, the rollups hold the same counts
+        with CaptureQueriesContext(connection) as queries:
+            self.analytics(group_by='status,hour,cell')
+        self.assertFalse([query for query in queries if 'core_ride"' in query['sql'] or 'core_ride ' in query['sql']])
+        call_command('rebuild_rollups', stdout=mock.MagicMock())
+        self.assertEqual(self.analytics(), data)
+
+    def test_analytics_parameters_are_validated(self):
+        response = self.client.get('/api/analytics/rides/', {'group_by': 'driver'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/analytics/rides/', {'since': '2026-01-02T00:00:00Z', 'until': '2026-01-01T00:00:00Z'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(DISTANCE_MATRIX_CHUNK_CELLS=5)
+class DistanceMatrixTests(AdminAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.origins = [[37.7749, -122.4194], [40.7128, -74.0060], [-33.8688, 151.2093]]
+        self.destinations = [[34.0522, -118.2437], [37.8044, -122.2712], [51.5074, -0.1278], [-37.8136, 144.9631]]
+
+    def post(self, **extra):
+        return self.client.post(
+            '/api/distance-matrix/', {'origins': self.origins, 'destinations': self.destinations, **extra},
+            format='json',
+        )
+
+    def test_matrix_matches_haversine(self):
+        response = self.post()
+        self.assertEqual(response.status_code, 200, response.data)
+        for origin, row in zip(self.origins, response.data['distances_km']):
+            for destination, distance in zip(self.destinations, row):
+                self.assertAlmostEqual(distance, haversine_km(*origin, *destination), places=3)
+
+    def test_nearest_destinations(self):
+        response = self.post(k=2)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['indexes'], [[1, 0], [0, 1], [3, 1]])
+        self.assertEqual(response.data['distances_km'][0][0], round(haversine_km(*self.origins[0], *self.destinations[1]), 3))
+
+    def test_positions_are_validated(self):
+        self.origins = [[91, 0]]
+        self.assertEqual(self.post().status_code, 400)
+        self.origins = [[37.7749]]
+        self.assertEqual(self.post().status_code, 400)
+        with override_settings(DISTANCE_MATRIX_MAX_CELLS=10):
+            self.origins = [[37.7749, -122.4194]] * 3
+            self.assertEqual(self.post().status_code, 400)
+            self.assertEqual(self.post(k=1).status_code, 200)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    COUNT_CACHE_TIMEOUT=0,
+)
+class AdminChangelistTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin, _ = create_user('admin', 'admin', is_staff=True, is_superuser=True)
+        rides, _ = load_synthetic_rides(create_users(6, driver_every=2), cls.admin.id, 40)
+        cls.ride_id = rides[0]['id_ride']
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist(self, path, **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def test_related_columns_are_joined(self):
+        for path in ('/admin/core/ride/', '/admin/core/rideevent/'):
+            with self.subTest(path=path):
+                with CaptureQueriesContext(connection) as context:
+                    cl = self.changelist(path)
+                # a query per row would be at least one per listed ride
+                self.assertGreaterEqual(len(cl.result_list), 40)
+                self.assertLess(len(context.captured_queries), 10)
+
+    def test_ride_events_are_filtered_by_typed_ride_id(self):
+        cl = self.changelist('/admin/core/rideevent/', id_ride=self.ride_id)
+        self.assertEqual(
+            {event.id_ride_id for event in cl.result_list}, {self.ride_id}
+        )
+        self.assertEqual(cl.result_count, RideEvent.objects.filter(id_ride=self.ride_id).count())
+        self.assertEqual(self.changelist('/admin/core/rideevent/', id_ride='abc').result_count, 0)
+        self.assertEqual(self.changelist('/admin/core/rideevent/', id_ride='²').result_count, 0)
+
+    def test_search_only_matches_whole_values(self):
+        user = User.objects.get(email='rider1@example.com')
+        self.assertEqual(list(self.changelist('/admin/core/user/', q='RIDER1@example.com').result_list), [user])
+        self.assertEqual(list(self.changelist('/admin/core/user/', q=user.pk).result_list), [user])
+        self.assertEqual(self.changelist('/admin/core/user/', q='rider1').result_count, 0)
+        self.assertEqual(self.changelist('/admin/core/rideevent/', q='Ride').result_count, 0)
@@ -0,0 +1,49 @@
+from asgiref.sync import sync_to_async
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from core.utils.token_helpers import ROLE_CLAIM, ais_token_revoked, is_token_revoked
+
+
+class RoleClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the role claims embedded at issue time.
+
+    Tokens carrying a `role` claim are authenticated without a database
+    lookup: the user is a `TokenUser` built from the token itself. Tokens
+    issued before role claims existed fall back to loading the Django user.
+    Revoked tokens are rejected when the revocation check is enabled.
+    `aauthenticate` does the same for async views.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if is_token_revoked(validated_token):
+            raise InvalidToken(_('Token has been revoked'))
+        return validated_token
+
+    def get_user(self, validated_token):
+        if ROLE_CLAIM in validated_token:
+            return api_settings.TOKEN_USER_CLASS(validated_token)
+        return super().get_user(validated_token)
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        # Signature and claims checks only, the revocation check is awaited
+        validated_token = JWTAuthentication.get_validated_token(self, raw_token)
+        if await ais_token_revoked(validated_token):
+            raise InvalidToken(_('Token has been revoked'))
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        if ROLE_CLAIM in validated_token:
+            return api_settings.TOKEN_USER_CLASS(validated_token)
+        return await sync_to_async(super().get_user)(validated_token)
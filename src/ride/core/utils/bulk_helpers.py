@@ -0,0 +1,195 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status as http_status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from core.models import Ride, RideEvent, User
+from core.serializers.bulk_serializers import RideBulkSerializer, RideEventBulkSerializer
+from core.signals import ride_events_bulk_saved, rides_bulk_saved
+from core.utils import geohash
+
+
+class BulkResult:
+    """
+    Outcome of a bulk write: the written objects and the per-item errors,
+    both indexed by the item's position in the request.
+    """
+
+    def __init__(self):
+        self.written = {}
+        self.errors = {}
+
+    def add_error(self, index, errors):
+        self.errors.setdefault(index, {}).update(errors)
+
+    def as_data(self, pk_name):
+        return {
+            'written': len(self.written),
+            'results': [
+                {'index': index, pk_name: obj.pk} for index, obj in sorted(self.written.items())
+            ],
+            'errors': [
+                {'index': index, 'errors': errors} for index, errors in sorted(self.errors.items())
+            ],
+        }
+
+
+def validate_batch(serializer_class, items, partial, pk_name):
+    """
+    Validate a whole batch with a single serializer instance. Returns the
+    validated data of each valid item by index and a `BulkResult` holding
+    the errors of the invalid ones.
+    """
+    if not isinstance(items, list):
+        raise ValidationError({'detail': 'Expected a list of items.'})
+    if len(items) > settings.BULK_MAX_ITEMS:
+        raise ValidationError({'detail': f'At most {settings.BULK_MAX_ITEMS} items per request.'})
+
+    result = BulkResult()
+    serializer = serializer_class(partial=partial)
+    validated = {}
+    for index, item in enumerate(items):
+        try:
+            data = serializer.run_validation(item)
+        except ValidationError as exc:
+            result.add_error(index, exc.detail if isinstance(exc.detail, dict) else {'non_field_errors': exc.detail})
+            continue
+        if partial and pk_name not in data:
+            result.add_error(index, {pk_name: ['This field is required.']})
+        else:
+            validated[index] = data
+    return validated, result
+
+
+def bulk_write_rides(items, user_id, partial=False):
+    """
+    Create (or with `partial`, update) rides in bulk: one validation pass,
+    one query per foreign key kind and a single transaction for the writes.
+    """
+    validated, result = validate_batch(RideBulkSerializer, items, partial, 'id_ride')
+
+    user_ids = {data[key] for data in validated.values() for key in ('id_rider', 'id_driver') if key in data}
+    users = User.objects.in_bulk(user_ids) if user_ids else {}
+    existing = {}
+    if partial:
+        existing = Ride.objects.in_bulk({data['id_ride'] for data in validated.values()})
+
+    now = timezone.now()
+    for index, data in list(validated.items()):
+        for key in ('id_rider', 'id_driver'):
+            if key in data and data[key] not in users:
+                result.add_error(index, {key: [f'User {data[key]} does not exist.']})
+        if partial and data['id_ride'] not in existing:
+            result.add_error(index, {'id_ride': [f'Ride {data["id_ride"]} does not exist.']})
+        if index in result.errors:
+            del validated[index]
+            continue
+
+        if partial:
+            ride = existing[data['id_ride']]
+        else:
+            ride = Ride(created_by_id=user_id, created_at=now)
+        for key, value in data.items():
+            if key in ('id_rider', 'id_driver'):
+                setattr(ride, key, users[value])
+            elif key != 'id_ride':
+                setattr(ride, key, value)
+        ride.pickup_geohash = geohash.encode(ride.pickup_latitude, ride.pickup_longitude)
+        ride.modified_by_id = user_id
+        ride.updated_at = now
+        result.written[index] = ride
+
+    rides = list(result.written.values())
+    if rides:
+        with transaction.atomic():
+            if partial:
+                fields = {key for data in validated.values() for key in data if key != 'id_ride'}
+                fields |= {'pickup_geohash', 'modified_by', 'updated_at'}
+                Ride.objects.bulk_update(rides, fields, batch_size=1000)
+            else:
+                Ride.objects.bulk_create(rides, batch_size=1000)
+            transaction.on_commit(lambda: _rides_saved(rides, created=not partial))
+    return result
+
+
+def _rides_saved(rides, created):
+    rides_bulk_saved.send_robust(sender=Ride, rides=rides, created=created)
+    for ride in rides:
+        ride._loaded_status = ride.status
+        ride._loaded_pickup = (ride.pickup_time, ride.pickup_geohash)
+
+
+def bulk_write_ride_events(items, user_id, partial=False):
+    """
+    Create (or with `partial`, update) ride events in bulk: one validation
+    pass, one query for the rides and a single transaction for the writes.
+    """
+    validated, result = validate_batch(RideEventBulkSerializer, items, partial, 'id_ride_event')
+
+    ride_ids = {data['id_ride'] for data in validated.values() if 'id_ride' in data}
+    rides = Ride.objects.only('id_ride', 'status', 'id_rider').in_bulk(ride_ids) if ride_ids else {}
+    existing = {}
+    if partial:
+        existing = RideEvent.objects.select_related('id_ride').only(
+            'id_ride_event', 'id_ride', 'description', 'created_at', 'id_ride__status', 'id_ride__id_rider'
+        ).in_bulk({data['id_ride_event'] for data in validated.values()})
+
+    now = timezone.now()
+    affected_rides = {}
+    for index, data in list(validated.items()):
+        if 'id_ride' in data and data['id_ride'] not in rides:
+            result.add_error(index, {'id_ride': [f'Ride {data["id_ride"]} does not exist.']})
+        if partial and data['id_ride_event'] not in existing:
+            result.add_error(index, {'id_ride_event': [f'Ride event {data["id_ride_event"]} does not exist.']})
+        if index in result.errors:
+            del validated[index]
+            continue
+
+        if partial:
+            event = existing[data['id_ride_event']]
+        else:
+            event = RideEvent(created_by_id=user_id, created_at=now)
+        if partial:
+            affected_rides[event.id_ride_id] = event.id_ride
+        if 'id_ride' in data:
+            event.id_ride = rides[data['id_ride']]
+        affected_rides[event.id_ride_id] = event.id_ride
+        if 'description' in data:
+            event.description = data['description']
+        event.modified_by_id = user_id
+        event.updated_at = now
+        result.written[index] = event
+
+    events = list(result.written.values())
+    if events:
+        with transaction.atomic():
+            if partial:
+                fields = {key for data in validated.values() for key in data if key != 'id_ride_event'}
+                fields |= {'modified_by', 'updated_at'}
+                RideEvent.objects.bulk_update(events, fields, batch_size=1000)
+            else:
+                RideEvent.objects.bulk_create(events, batch_size=1000)
+            transaction.on_commit(
+                lambda: ride_events_bulk_saved.send_robust(
+                    sender=RideEvent, events=events, rides=list(affected_rides.values()), created=not partial
+                )
+            )
+    return result
+
+
+def bulk_write_response(request, bulk_write, pk_name):
+    """
+    Run a bulk write on the request body: 201 (200 for PATCH) when every item
+    was written, 207 when some were and 400 when none were.
+    """
+    partial = request.method == 'PATCH'
+    result = bulk_write(request.data, request.user.id, partial=partial)
+    if not result.errors:
+        status = http_status.HTTP_200_OK if partial else http_status.HTTP_201_CREATED
+    elif result.written:
+        status = http_status.HTTP_207_MULTI_STATUS
+    else:
+        status = http_status.HTTP_400_BAD_REQUEST
+    return Response(result.as_data(pk_name), status=status)
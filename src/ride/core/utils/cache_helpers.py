@@ -0,0 +1,114 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.models import Ride
+
+GENERATION_PREFIX = 'gen:'
+
+# Generation names read by the ride list cache
+ALL_RIDES = 'rides'
+USERS = 'users'
+
+
+def get_redis_client():
+    """The raw Redis client behind the cache, None when the cache is not django-redis."""
+    client = getattr(cache, 'client', None)
+    if client is None or not hasattr(client, 'get_client'):
+        return None
+    return client.get_client(write=True)
+
+
+def params_digest(params):
+    """
+    Stable digest of a QueryDict, independent of parameter order.
+    """
+    normalized = '&'.join(
+        f'{key}={",".join(sorted(params.getlist(key)))}' for key in sorted(params.keys())
+    )
+    return hashlib.md5(normalized.encode('utf-8')).hexdigest()
+
+
+def _generation_key(name):
+    return f'{GENERATION_PREFIX}{name}'
+
+
+def get_generations(*names):
+    """
+    Return the current generation counter of each name, in one round trip.
+    Missing counters start at 1.
+    """
+    keys = [_generation_key(name) for name in names]
+    values = cache.get_many(keys)
+    generations = []
+    for key in keys:
+        if key not in values:
+            # add() keeps a counter another process created in the meantime
+            cache.add(key, 1, None)
+            values[key] = cache.get(key, 1)
+        generations.append(values[key])
+    return generations
+
+
+def bump_generations(*names):
+    """
+    Invalidate everything cached under the given generations by moving
+    their counters forward. No key scan is needed: stale entries are simply
+    never read again and expire on their own.
+    """
+    for name in set(names):
+        key = _generation_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 2, None)
+
+
+def status_generation(status):
+    return f'rides:status:{status}'
+
+
+def invalidate_ride_lists(*statuses):
+    """
+    Invalidate cached ride lists affected by a change to rides with the
+    given statuses. Lists filtered on other statuses stay cached. With no
+    status known, every ride list is invalidated.
+    """
+    statuses = [status for status in statuses if status]
+    if not statuses:
+        statuses = [status for status, _ in Ride.STATUS_CHOICES]
+    bump_generations(ALL_RIDES, *(status_generation(status) for status in statuses))
+
+
+def invalidate_user_lists():
+    bump_generations(USERS)
+
+
+def get_ride_list_cache_key(params):
+    """
+    Cache key of a ride list response: the normalized query string plus the
+    generations of the data the list reads (users, and either one status or
+    all rides).
+    """
+    status = params.get('status')
+    ride_generation = status_generation(status) if status else ALL_RIDES
+    users, rides = get_generations(USERS, ride_generation)
+
+    return f'rides:list:u{users}:r{rides}:{params_digest(params)}'
+
+
+def get_cached_ride_list(params):
+    """
+    Return `(cache_key, data)` for a ride list request; data is None on a miss
+    or when the cache is disabled.
+    """
+    if not settings.RIDE_LIST_CACHE_TIMEOUT:
+        return None, None
+    cache_key = get_ride_list_cache_key(params)
+    return cache_key, cache.get(cache_key)
+
+
+def set_cached_ride_list(cache_key, data):
+    if cache_key is not None:
+        cache.set(cache_key, data, settings.RIDE_LIST_CACHE_TIMEOUT)
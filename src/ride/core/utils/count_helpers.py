@@ -0,0 +1,171 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from core.utils.cache_helpers import params_digest
+
+
+def is_unfiltered(queryset):
+    """
+    True when the queryset counts every row of its table (no WHERE clause,
+    no DISTINCT and no slicing).
+    """
+    query = queryset.query
+    return not query.where and not query.distinct and not query.is_sliced
+
+
+def get_planner_estimate(queryset):
+    """
+    Row estimate for the queryset's table taken from the Postgres planner
+    statistics, scaled to the current relation size the same way the planner
+    does. A partitioned table is the sum of its analyzed partitions. Returns
+    None when no estimate is available (other backends or a table that has
+    never been analyzed).
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT SUM(CASE WHEN c.reltuples < 0 THEN NULL
+                            WHEN c.relpages = 0 THEN c.reltuples
+                            ELSE c.reltuples / c.relpages
+                                 * (pg_relation_size(c.oid) / current_setting('block_size')::int)
+                       END)
+            FROM pg_class c
+            WHERE (c.oid = %s::regclass AND c.relkind <> 'p')
+               OR c.oid IN (SELECT relid FROM pg_partition_tree(%s::regclass) WHERE isleaf)
+            """,
+            [queryset.model._meta.db_table] * 2
+        )
+        row = cursor.fetchone()
+
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def get_count_cache_key(queryset, params):
+    """
+    Cache key for a filtered count, built from the model and the normalized
+    filter parameters.
+    """
+    return f'count:{queryset.model._meta.label_lower}:{params_digest(params)}'
+
+
+def get_list_count(queryset, cache_key=None):
+    """
+    Return `(count, is_estimate)` for a list queryset.
+
+    - Unfiltered lists on large tables use the planner estimate.
+    - Filtered lists use an exact count cached for `COUNT_CACHE_TIMEOUT`
+      seconds under `cache_key` when one is given.
+    - Everything else falls back to an exact `COUNT(*)`.
+    """
+    if is_unfiltered(queryset):
+        estimate = get_planner_estimate(queryset)
+        if estimate is not None and estimate >= settings.COUNT_ESTIMATE_THRESHOLD:
+            return estimate, True
+        return queryset.count(), False
+
+    if cache_key is None:
+        return queryset.count(), False
+
+    count = cache.get(cache_key)
+    if count is None:
+        count = queryset.count()
+        cache.set(cache_key, count, settings.COUNT_CACHE_TIMEOUT)
+    return count, False
+
+
+async def aget_list_count(queryset, cache_key=None):
+    """Async version of `get_list_count`, counting with `acount()`."""
+    if is_unfiltered(queryset):
+        estimate = await sync_to_async(get_planner_estimate)(queryset)
+        if estimate is not None and estimate >= settings.COUNT_ESTIMATE_THRESHOLD:
+            return estimate, True
+        return await queryset.acount(), False
+
+    if cache_key is None:
+        return await queryset.acount(), False
+
+    count = await cache.aget(cache_key)
+    if count is None:
+        count = await queryset.acount()
+        await cache.aset(cache_key, count, settings.COUNT_CACHE_TIMEOUT)
+    return count, False
+
+
+class CountingPage(Page):
+
+    def __init__(self, object_list, number, paginator, has_more):
+        super().__init__(object_list, number, paginator)
+        self.has_more = has_more
+
+    def has_next(self):
+        return self.has_more
+
+
+class CountingPaginator(Paginator):
+    """
+    Paginator whose total comes from `get_list_count`.
+
+    Because the total may be an estimate, page bounds and `has_next` are not
+    derived from it: each page fetches one extra row to find out whether
+    another page exists, and only an empty page past the first is invalid.
+    """
+
+    def __init__(self, object_list, per_page, count_cache_key=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_cache_key = count_cache_key
+        self.count_is_estimate = False
+
+    @cached_property
+    def count(self):
+        count, self.count_is_estimate = get_list_count(self.object_list, self.count_cache_key)
+        return count
+
+    async def acount(self):
+        """Fill `count` with `aget_list_count`, for async views."""
+        if 'count' not in self.__dict__:
+            self.__dict__['count'], self.count_is_estimate = await aget_list_count(
+                self.object_list, self.count_cache_key
+            )
+        return self.count
+
+    def validate_number(self, number):
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        return self._page(list(self._page_slice(number)), number)
+
+    async def apage(self, number):
+        """`page` read with `aiterator()`, for async views."""
+        number = self.validate_number(number)
+        return self._page([row async for row in self._page_slice(number).aiterator()], number)
+
+    def _page_slice(self, number):
+        # One extra row tells whether there is a next page
+        bottom = (number - 1) * self.per_page
+        return self.object_list[bottom:bottom + self.per_page + 1]
+
+    def _page(self, object_list, number):
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if not object_list and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        return CountingPage(object_list, number, self, has_more)
@@ -0,0 +1,64 @@
+"""
+Routing of reads between the primary database and its read replicas.
+
+Writes, and reads outside of a routed request, always go to the primary
+(`default`). Views opt in with `ReplicaReadMixin`: their safe requests read
+from one replica, picked per request, unless the user wrote recently and is
+pinned to the primary to read their own writes.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+PRIMARY = 'default'
+
+# Database the current request reads from; None leaves reads on the primary
+_read_database = ContextVar('read_database', default=None)
+
+
+def use_read_database(alias):
+    """Route the reads of the current context to `alias`; returns the reset token."""
+    return _read_database.set(alias)
+
+
+def reset_read_database(token):
+    _read_database.reset(token)
+
+
+def pick_replica():
+    """A random replica alias, or None when no replica is configured."""
+    return random.choice(settings.DATABASE_REPLICAS) if settings.DATABASE_REPLICAS else None
+
+
+def _pin_key(user):
+    return f'db:pinned:{user.pk}'
+
+
+def pin_to_primary(user):
+    """
+    Keep the reads of `user` on the primary for `REPLICA_PIN_SECONDS`, so
+    they see their own writes before the replicas catch up. JWT clients have
+    no session, so the pin is kept in the shared cache under the user id of
+    the token.
+    """
+    if settings.DATABASE_REPLICAS and settings.REPLICA_PIN_SECONDS and user.is_authenticated:
+        cache.set(_pin_key(user), 1, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(user):
+    return user.is_authenticated and cache.get(_pin_key(user)) is not None
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same data as the primary
+        return True
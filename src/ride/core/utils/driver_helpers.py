@@ -0,0 +1,355 @@
+"""
+Locations of the available drivers and nearest-driver matching.
+
+Drivers report their position, or that they stopped taking rides, through
+the location endpoint. With a Redis cache the reports are kept in Redis: the
+`<prefix>geo` GEO set holds the position of each available driver,
+`<prefix>seen` the time of their last report and the `<prefix>updates`
+stream every change. Each worker process matches against an in-memory grid
+index of its own, built once from the GEO set and then kept current by
+replaying the stream, at most `DRIVER_INDEX_REFRESH_MS` behind. Drivers
+silent for `DRIVER_LOCATION_TTL_SECONDS` are pruned from the store by
+`prune_drivers`, as if they had reported they stopped taking rides. Without a
+Redis cache a process-local store stands in.
+"""
+import heapq
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+
+from core.utils import geohash
+from core.utils.cache_helpers import get_redis_client
+from core.utils.location_helpers import EARTH_RADIUS_KM, bounding_box, haversine_km
+
+
+class DriverIndex:
+    """
+    Available drivers bucketed by geohash cell (~1.2 x 0.6 km). A search
+    expands ring by ring around the cell of the position, as `nearest_rides`
+    does in SQL, and only measures the drivers of the cells it visits.
+    """
+
+    precision = 6
+
+    def __init__(self):
+        # cell -> {id_driver: (latitude, longitude, reported_at)}
+        self.cells = {}
+        # id_driver -> cell
+        self.drivers = {}
+
+    def __len__(self):
+        return len(self.drivers)
+
+    def set(self, id_driver, latitude, longitude, reported_at):
+        self.remove(id_driver)
+        cell = geohash.cell_of(latitude, longitude, self.precision)
+        self.cells.setdefault(cell, {})[id_driver] = (latitude, longitude, reported_at)
+        self.drivers[id_driver] = cell
+
+    def remove(self, id_driver):
+        cell = self.drivers.pop(id_driver, None)
+        if cell is not None:
+            drivers = self.cells[cell]
+            del drivers[id_driver]
+            if not drivers:
+                del self.cells[cell]
+
+    def nearest(self, latitude, longitude, k, radius_km, reported_since=0):
+        """
+        The `k` drivers closest to a position within `radius_km`, as
+        `(distance_km, id_driver, latitude, longitude, reported_at)`, closest
+        first. Drivers whose last report is older than `reported_since` are
+        skipped.
+        """
+        x, y = geohash.cell_of(latitude, longitude, self.precision)
+        columns, rows = geohash.grid_size(self.precision)
+        found = []
+
+        def measure(drivers):
+            for id_driver, (lat, lon, reported_at) in drivers.items():
+                if reported_at < reported_since:
+                    continue
+                distance = haversine_km(latitude, longitude, lat, lon)
+                if distance <= radius_km:
+                    found.append((distance, id_driver, lat, lon, reported_at))
+
+        for radius in range(max(columns, rows)):
+            if (2 * radius + 1) ** 2 > 2 * len(self.cells):
+                # Sparse surroundings: visiting the occupied cells beyond the
+                # rings searched so far is cheaper than enumerating empty ones
+                min_lat, max_lat, lon_ranges = bounding_box(latitude, longitude, radius_km)
+                min_y = geohash.cell_of(min_lat, 0, self.precision)[1]
+                max_y = geohash.cell_of(max_lat, 0, self.precision)[1]
+                x_ranges = [
+                    (geohash.cell_of(0, min_lon, self.precision)[0], geohash.cell_of(0, max_lon, self.precision)[0])
+                    for min_lon, max_lon in lon_ranges
+                ]
+                for (cell_x, cell_y), drivers in self.cells.items():
+                    if not min_y <= cell_y <= max_y or not any(low <= cell_x <= high for low, high in x_ranges):
+                        continue
+                    dx = abs(cell_x - x)
+                    if max(min(dx, columns - dx), abs(cell_y - y)) >= radius:
+                        measure(drivers)
+                break
+            for cell in geohash.ring_cells(x, y, radius, self.precision):
+                measure(self.cells.get(cell, {}))
+            covered = geohash.covered_radius_km(
+                latitude, longitude, x, y, radius, self.precision, EARTH_RADIUS_KM
+            )
+            if covered >= radius_km:
+                break
+            if len(found) >= k and heapq.nsmallest(k, found)[-1][0] <= covered:
+                break
+        return heapq.nsmallest(k, found)
+
+
+# KEYS: geo, seen, updates. ARGV: report time before which drivers are
+# removed, batch size, stream max length. Checked and removed in one script
+# so that a driver reporting meanwhile is kept. Returns the removed ids.
+_PRUNE_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', '(' .. ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, id in ipairs(ids) do
+    redis.call('ZREM', KEYS[1], id)
+    redis.call('ZREM', KEYS[2], id)
+    redis.call('XADD', KEYS[3], 'MAXLEN', '~', ARGV[3], '*', 'id', id)
+end
+return ids
+"""
+
+
+class RedisDriverStore:
+    """
+    Driver positions in Redis. The cursor of a reader is the last stream
+    entry it applied and the number of entries added to the stream up to it,
+    which tells when entries it has not read were trimmed away.
+    """
+
+    def __init__(self, client, prefix):
+        self.client = client
+        self.geo = f'{prefix}geo'
+        self.seen = f'{prefix}seen'
+        self.updates = f'{prefix}updates'
+        self._prune = client.register_script(_PRUNE_SCRIPT)
+
+    def report(self, id_driver, latitude, longitude, reported_at):
+        pipe = self.client.pipeline()
+        pipe.geoadd(self.geo, (longitude, latitude, id_driver))
+        pipe.zadd(self.seen, {id_driver: reported_at})
+        pipe.xadd(
+            self.updates, {'id': id_driver, 'lat': latitude, 'lon': longitude, 'at': reported_at},
+            maxlen=settings.DRIVER_UPDATES_MAXLEN, approximate=True,
+        )
+        pipe.execute()
+
+    def remove(self, id_driver):
+        pipe = self.client.pipeline()
+        pipe.zrem(self.geo, id_driver)
+        pipe.zrem(self.seen, id_driver)
+        pipe.xadd(self.updates, {'id': id_driver}, maxlen=settings.DRIVER_UPDATES_MAXLEN, approximate=True)
+        pipe.execute()
+
+    def prune(self, reported_before, batch_size=1000):
+        """Remove the drivers whose last report is older than `reported_before`, returning their ids."""
+        removed = []
+        while True:
+            ids = self._prune(
+                keys=[self.geo, self.seen, self.updates],
+                args=[reported_before, batch_size, settings.DRIVER_UPDATES_MAXLEN],
+            )
+            removed += [int(id_driver) for id_driver in ids]
+            if len(ids) < batch_size:
+                return removed
+
+    def _stream_position(self):
+        from redis.exceptions import ResponseError
+        try:
+            info = self.client.xinfo_stream(self.updates)
+        except ResponseError:
+            # No driver reported yet
+            return '0-0', 0
+        return info['last-generated-id'].decode(), info['entries-added']
+
+    def snapshot(self):
+        """`(cursor, drivers)`: every available driver, and where to replay the stream from."""
+        # Taken first: changes made while reading are replayed on top
+        cursor = self._stream_position()
+        seen = self.client.zrange(self.seen, 0, -1, withscores=True)
+        drivers = []
+        for start in range(0, len(seen), 1000):
+            chunk = seen[start:start + 1000]
+            positions = self.client.geopos(self.geo, *[member for member, _ in chunk])
+            for (member, reported_at), position in zip(chunk, positions):
+                if position is not None:
+                    drivers.append((int(member), position[1], position[0], reported_at))
+        return cursor, drivers
+
+    def changes(self, cursor):
+        """
+        `(cursor, changes)` since `cursor`, a change being `(id_driver,
+        latitude, longitude, reported_at)` or `(id_driver, None, None, None)`
+        for a removal. None when some changes were trimmed from the stream.
+        """
+        last_id, added = cursor
+        expected = self._stream_position()[1] - added
+        changes = []
+        while True:
+            entries = self.client.xrange(self.updates, min=f'({last_id}', count=1000)
+            for entry_id, fields in entries:
+                if b'lat' in fields:
+                    changes.append((
+                        int(fields[b'id']), float(fields[b'lat']), float(fields[b'lon']), float(fields[b'at'])
+                    ))
+                else:
+                    changes.append((int(fields[b'id']), None, None, None))
+                last_id = entry_id.decode()
+            if len(entries) < 1000:
+                break
+        if len(changes) < expected:
+            return None
+        return (last_id, added + len(changes)), changes
+
+
+class MemoryDriverStore:
+    """In-process stand-in for `RedisDriverStore`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._drivers = {}
+        # (sequence, change)
+        self._updates = deque()
+        self._sequence = 0
+
+    def _add_update(self, change):
+        self._sequence += 1
+        self._updates.append((self._sequence, change))
+        while len(self._updates) > settings.DRIVER_UPDATES_MAXLEN:
+            self._updates.popleft()
+
+    def report(self, id_driver, latitude, longitude, reported_at):
+        with self._lock:
+            self._drivers[id_driver] = (latitude, longitude, reported_at)
+            self._add_update((id_driver, latitude, longitude, reported_at))
+
+    def remove(self, id_driver):
+        with self._lock:
+            self._drivers.pop(id_driver, None)
+            self._add_update((id_driver, None, None, None))
+
+    def prune(self, reported_before, batch_size=1000):
+        with self._lock:
+            removed = [
+                id_driver for id_driver, (_, _, reported_at) in self._drivers.items() if reported_at < reported_before
+            ]
+            for id_driver in removed:
+                del self._drivers[id_driver]
+                self._add_update((id_driver, None, None, None))
+            return removed
+
+    def snapshot(self):
+        with self._lock:
+            return self._sequence, [(id_driver, *position) for id_driver, position in self._drivers.items()]
+
+    def changes(self, cursor):
+        with self._lock:
+            if self._updates and self._updates[0][0] > cursor + 1:
+                return None
+            return self._sequence, [change for sequence, change in self._updates if sequence > cursor]
+
+
+class LiveDriverIndex:
+    """`DriverIndex` of this process, synced from a store before searches."""
+
+    def __init__(self, store):
+        self.store = store
+        self.index = None
+        self.cursor = None
+        self.synced_at = 0
+        self._lock = threading.Lock()
+
+    def rebuild(self):
+        index = DriverIndex()
+        self.cursor, drivers = self.store.snapshot()
+        for driver in drivers:
+            index.set(*driver)
+        self.index = index
+        self._sync()
+
+    def _sync(self):
+        result = self.store.changes(self.cursor)
+        if result is None:
+            self.rebuild()
+            return
+        self.cursor, changes = result
+        for id_driver, latitude, longitude, reported_at in changes:
+            if latitude is None:
+                self.index.remove(id_driver)
+            else:
+                self.index.set(id_driver, latitude, longitude, reported_at)
+        self.synced_at = time.monotonic()
+
+    def nearest(self, latitude, longitude, k, radius_km, reported_since):
+        with self._lock:
+            if self.index is None:
+                self.rebuild()
+            elif time.monotonic() - self.synced_at >= settings.DRIVER_INDEX_REFRESH_MS / 1000:
+                self._sync()
+            return self.index.nearest(latitude, longitude, k, radius_km, reported_since)
+
+
+_live_index = None
+_live_index_lock = threading.Lock()
+
+
+def get_driver_store():
+    return get_live_index().store
+
+
+def get_live_index():
+    global _live_index
+    with _live_index_lock:
+        if _live_index is None:
+            client = get_redis_client()
+            if client is not None:
+                store = RedisDriverStore(client, settings.DRIVER_KEY_PREFIX)
+            else:
+                store = MemoryDriverStore()
+            _live_index = LiveDriverIndex(store)
+        return _live_index
+
+
+def report_driver_location(id_driver, latitude, longitude, available=True):
+    """Record the position of a driver, or with `available=False` that they are not taking rides."""
+    store = get_driver_store()
+    if available:
+        store.report(id_driver, latitude, longitude, time.time())
+    else:
+        store.remove(id_driver)
+
+
+def prune_drivers():
+    """Remove the drivers silent for `DRIVER_LOCATION_TTL_SECONDS` from the store, returning their ids."""
+    return get_driver_store().prune(time.time() - settings.DRIVER_LOCATION_TTL_SECONDS)
+
+
+def nearest_drivers(latitude, longitude, k, radius_km):
+    """
+    The `k` available drivers closest to a position within `radius_km`,
+    closest first. Drivers silent for `DRIVER_LOCATION_TTL_SECONDS` are
+    considered offline.
+    """
+    reported_since = time.time() - settings.DRIVER_LOCATION_TTL_SECONDS
+    return [
+        {
+            'id_driver': id_driver,
+            'latitude': lat,
+            'longitude': lon,
+            'distance_km': round(distance, 3),
+            'reported_at': datetime.fromtimestamp(reported_at, dt_timezone.utc).isoformat(),
+        }
+        for distance, id_driver, lat, lon, reported_at in get_live_index().nearest(
+            latitude, longitude, k, radius_km, reported_since
+        )
+    ]
@@ -0,0 +1,53 @@
+import json
+
+from django.db import connections
+
+# Plan nodes that read rows from a table or an index
+SCAN_NODES = ('Seq Scan', 'Index Scan', 'Index Only Scan', 'Bitmap Heap Scan', 'Tid Scan', 'Tid Range Scan')
+
+
+def explain(sql, params=None, using='default', analyze=False):
+    """
+    Return the root plan node of a query as parsed `EXPLAIN (FORMAT JSON)`
+    output. `analyze` executes the query to get actual row counts. Postgres
+    only.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        raise NotImplementedError('EXPLAIN plans are only parsed on PostgreSQL')
+
+    options = 'ANALYZE, BUFFERS, FORMAT JSON' if analyze else 'FORMAT JSON'
+    with connection.cursor() as cursor:
+        # Without params the SQL is sent as-is, so literal % signs stay intact
+        cursor.execute(f'EXPLAIN ({options}) {sql}', params)
+        output = cursor.fetchone()[0]
+    if isinstance(output, str):
+        output = json.loads(output)
+    return output[0]['Plan']
+
+
+def explain_queryset(queryset, analyze=False):
+    sql, params = queryset.query.sql_with_params()
+    return explain(sql, params, using=queryset.db, analyze=analyze)
+
+
+def iter_plan_nodes(plan):
+    """Yield every node of a plan tree, depth first."""
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from iter_plan_nodes(child)
+
+
+def rows_scanned(plan):
+    """
+    Rows read by the scan nodes of an analyzed plan: the rows they returned
+    plus the rows their filters discarded, over every loop.
+    """
+    total = 0
+    for node in iter_plan_nodes(plan):
+        if node['Node Type'] in SCAN_NODES:
+            loops = node.get('Actual Loops', 1)
+            returned = node.get('Actual Rows', 0)
+            removed = node.get('Rows Removed by Filter', 0) + node.get('Rows Removed by Index Recheck', 0)
+            total += (returned + removed) * loops
+    return total
@@ -0,0 +1,119 @@
+from functools import lru_cache
+
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+
+def parse_fieldset(params, serializer_class, fields_param='fields'):
+    """
+    Read a sparse fieldset from query params: `fields=a,b` for the top level
+    and `<nested>.fields=c,d` for nested serializers. Returns the serializer
+    kwargs (`fields`, `nested_fields`), empty when nothing was requested.
+    Names that `serializer_class` does not render raise a `ValidationError`
+    listing the valid ones.
+    """
+    available = _available_fields(serializer_class)
+    errors = {}
+    kwargs = {}
+    fields = _split(params.get(fields_param, ''))
+    if fields:
+        _check_names(errors, fields_param, fields, available)
+        kwargs['fields'] = fields
+
+    suffix = f'.{fields_param}'
+    nested_fields = {
+        key[:-len(suffix)]: _split(value)
+        for key, value in params.items()
+        if key.endswith(suffix) and _split(value)
+    }
+    nested_available = {name: nested for name, nested in available.items() if nested is not None}
+    for name, names in nested_fields.items():
+        if name not in nested_available:
+            errors[f'{name}{suffix}'] = [
+                f'Not a nested field. Nested fields: {", ".join(nested_available) or "none"}.'
+            ]
+        else:
+            _check_names(errors, f'{name}{suffix}', names, nested_available[name])
+    if errors:
+        raise ValidationError(errors)
+    if nested_fields:
+        kwargs['nested_fields'] = nested_fields
+    return kwargs
+
+
+def _split(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def _check_names(errors, param, names, available):
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        errors[param] = [
+            f'Unknown fields: {", ".join(unknown)}. Must be a comma-separated list of: {", ".join(available)}.'
+        ]
+
+
+@lru_cache(maxsize=None)
+def _available_fields(serializer_class):
+    """
+    Fields rendered by `serializer_class`, each mapped to the fields of its
+    nested serializer (or None for plain fields).
+    """
+    available = {}
+    for name, field in serializer_class().fields.items():
+        nested = getattr(field, 'child', field)
+        available[name] = tuple(nested.fields) if isinstance(nested, serializers.Serializer) else None
+    return available
+
+
+def get_fieldset_columns(serializer, model, prefix=''):
+    """
+    Return `(columns, relations)` needed to render a (pruned) serializer:
+    the model field paths for `.only()` and the relations to join with
+    `select_related`. Returns None when a field's sources cannot be known,
+    in which case the queryset must not be restricted.
+    """
+    columns = []
+    relations = []
+    model_fields = {field.name: field for field in model._meta.concrete_fields}
+    method_field_sources = getattr(serializer, 'method_field_sources', {})
+
+    for field_name, field in serializer.fields.items():
+        if field_name in method_field_sources:
+            columns.extend(prefix + source for source in method_field_sources[field_name])
+            continue
+
+        model_field = model_fields.get(field.source)
+        if isinstance(field, serializers.BaseSerializer) and not isinstance(field, serializers.ListSerializer):
+            if model_field is None or not model_field.is_relation:
+                return None
+            nested = get_fieldset_columns(field, model_field.related_model, f'{prefix}{field.source}__')
+            if nested is None:
+                return None
+            columns.append(prefix + field.source)
+            relations.append(prefix + field.source)
+            columns.extend(nested[0])
+            relations.extend(nested[1])
+        elif model_field is not None:
+            columns.append(prefix + field.source)
+        elif isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+            return None
+        # anything else is an annotation and is not a column to load
+
+    return columns, relations
+
+
+def restrict_queryset_to_fieldset(queryset, serializer, required_fields=()):
+    """
+    Narrow a queryset to what the pruned serializer renders: only the needed
+    columns are selected and only the needed relations are joined.
+    """
+    needed = get_fieldset_columns(serializer, queryset.model)
+    if needed is None:
+        return queryset
+
+    columns, relations = needed
+    queryset = queryset.select_related(None)
+    if relations:
+        queryset = queryset.select_related(*relations)
+    return queryset.only(queryset.model._meta.pk.name, *required_fields, *columns)
@@ -0,0 +1,131 @@
+"""
+Geohash encoding on an integer cell grid.
+
+A geohash of precision `p` interleaves `5 * p` bits: longitude takes the
+even positions and latitude the odd ones. Working with the integer cell
+coordinates `(x, y)` behind a hash makes neighbour and ring computations
+simple, and any prefix of a hash is the enclosing cell at a lower precision,
+so a single stored hash can be searched at every precision with a prefix
+match.
+"""
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Precision stored for ride pickups (~4.8m x 4.8m cells)
+STORED_PRECISION = 9
+
+
+def grid_bits(precision):
+    """Return the number of (longitude, latitude) bits for a precision."""
+    total = 5 * precision
+    return (total + 1) // 2, total // 2
+
+
+def grid_size(precision):
+    """Return the number of (columns, rows) of the cell grid for a precision."""
+    lon_bits, lat_bits = grid_bits(precision)
+    return 1 << lon_bits, 1 << lat_bits
+
+
+def cell_size(precision):
+    """Return the (width, height) of a cell in degrees of longitude and latitude."""
+    columns, rows = grid_size(precision)
+    return 360.0 / columns, 180.0 / rows
+
+
+def cell_of(latitude, longitude, precision):
+    """Return the integer `(x, y)` cell containing a position."""
+    columns, rows = grid_size(precision)
+    x = int((float(longitude) + 180.0) / 360.0 * columns)
+    y = int((float(latitude) + 90.0) / 180.0 * rows)
+    return min(max(x, 0), columns - 1), min(max(y, 0), rows - 1)
+
+
+def cell_to_geohash(x, y, precision):
+    """Encode the integer cell `(x, y)` as a geohash string."""
+    lon_bits, lat_bits = grid_bits(precision)
+    value = 0
+    lon_shift, lat_shift = lon_bits, lat_bits
+    for bit in range(5 * precision):
+        if bit % 2 == 0:
+            lon_shift -= 1
+            value = (value << 1) | ((x >> lon_shift) & 1)
+        else:
+            lat_shift -= 1
+            value = (value << 1) | ((y >> lat_shift) & 1)
+
+    chars = []
+    for _ in range(precision):
+        chars.append(BASE32[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+
+def encode(latitude, longitude, precision=STORED_PRECISION):
+    """Encode a position as a geohash string."""
+    x, y = cell_of(latitude, longitude, precision)
+    return cell_to_geohash(x, y, precision)
+
+
+def ring_cells(x, y, radius, precision):
+    """
+    Yield the cells at Chebyshev distance `radius` from `(x, y)`.
+
+    Columns wrap around the antimeridian and rows beyond the poles are
+    skipped; each cell is yielded once even when the ring wraps onto itself.
+    """
+    columns, rows = grid_size(precision)
+    if radius == 0:
+        yield x, y
+        return
+
+    seen = set()
+    for dy in range(-radius, radius + 1):
+        row = y + dy
+        if row < 0 or row >= rows:
+            continue
+        if abs(dy) == radius:
+            offsets = range(-radius, radius + 1)
+        else:
+            offsets = (-radius, radius)
+        for dx in offsets:
+            cell = ((x + dx) % columns, row)
+            if cell not in seen:
+                seen.add(cell)
+                yield cell
+
+
+def covered_radius_km(latitude, longitude, x, y, radius, precision, earth_radius_km):
+    """
+    Distance from a position to the nearest edge of the square of cells
+    within `radius` rings of its cell `(x, y)`. Every point closer than this
+    distance is guaranteed to lie inside the searched square.
+    """
+    columns, rows = grid_size(precision)
+    width, height = cell_size(precision)
+    lat = float(latitude)
+    lon = float(longitude)
+
+    distances = []
+    # North and south edges are parallels: distance is the meridian arc
+    north = (y + radius + 1) * height - 90.0
+    south = (y - radius) * height - 90.0
+    if north < 90.0:
+        distances.append(math.radians(north - lat) * earth_radius_km)
+    if south > -90.0:
+        distances.append(math.radians(lat - south) * earth_radius_km)
+
+    # East and west edges are meridians: use the distance to their great
+    # circle, which stays short near the poles however far the edge is in
+    # longitude
+    if 2 * radius + 1 < columns:
+        east = (x + radius + 1) * width - 180.0
+        west = (x - radius) * width - 180.0
+        for delta in (east - lon, lon - west):
+            distances.append(
+                math.asin(min(1.0, math.cos(math.radians(lat)) * abs(math.sin(math.radians(delta)))))
+                * earth_radius_km
+            )
+
+    return min(distances) if distances else math.inf
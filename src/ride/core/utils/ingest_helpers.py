@@ -0,0 +1,426 @@
+"""
+Buffered ingestion of ride events.
+
+`ingest_ride_events` validates events without any query and appends them to
+a stream; the `drain_ride_events` worker reads the stream in batches through
+a consumer group and bulk inserts them. An entry is acknowledged, and
+deleted, only once its batch is committed, so the entries of a worker that
+stops mid-batch stay pending until another worker claims them. Delivery is
+at least once: every event carries a dedup key (the client's `dedup_key`, or
+else the stream entry id) and the ingest time as `created_at`, and the
+unique index on both makes writing a redelivered entry a no-op.
+
+A batch that fails is retried entry by entry, so one bad entry does not hold
+back the others. An entry that still fails on its own stays pending and is
+retried; after `RIDE_EVENT_INGEST_MAX_DELIVERIES` deliveries it is moved to
+the `<stream>:dead` stream with its error. Connection errors are not the
+entries' fault: the batch is left pending as it is.
+
+The stream lives in Redis when the cache is django-redis. Otherwise an
+in-process stand-in is used, which only a worker in the same process (e.g.
+the tests) can drain.
+"""
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, transaction
+from django.utils import timezone
+
+from core.models import Ride, RideEvent
+from core.serializers.bulk_serializers import RideEventIngestSerializer
+from core.signals import ride_events_bulk_saved
+from core.utils.bulk_helpers import validate_batch
+from core.utils.cache_helpers import get_redis_client
+
+GROUP = 'ride-event-writers'
+DEAD_LETTER_SUFFIX = ':dead'
+
+# errors of the database itself rather than of the entries written
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+# ARGV: dedup window in seconds, then a dedup key ('' for none) and a payload
+# per event. Returns the entry id of each event, or nil for a duplicate.
+_APPEND_SCRIPT = """
+local ids = {}
+for i = 2, #ARGV, 2 do
+    local key = ARGV[i]
+    if key == '' or redis.call('SET', KEYS[1] .. ':dedup:' .. key, 1, 'NX', 'EX', ARGV[1]) then
+        ids[#ids + 1] = redis.call('XADD', KEYS[1], '*', 'event', ARGV[i + 1])
+    else
+        ids[#ids + 1] = false
+    end
+end
+return ids
+"""
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _entry_age(entry_id):
+    """Seconds since an entry was appended, from the milliseconds of its id."""
+    return max(0.0, round(time.time() - int(entry_id.split('-')[0]) / 1000, 3))
+
+
+class RedisEventStream:
+    """Redis stream read through a consumer group."""
+
+    backend = 'redis'
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._append = client.register_script(_APPEND_SCRIPT)
+        self._group_created = False
+
+    def append(self, events):
+        """
+        Append `(dedup_key, payload)` pairs in one round trip. A dedup key
+        seen within `RIDE_EVENT_INGEST_DEDUP_SECONDS` is dropped. Returns the
+        entry id of each event, None for the dropped ones.
+        """
+        args = [settings.RIDE_EVENT_INGEST_DEDUP_SECONDS]
+        for dedup_key, payload in events:
+            args += [dedup_key or '', payload]
+        return [_decode(entry_id) if entry_id else None for entry_id in self._append(keys=[self.name], args=args)]
+
+    def _ensure_group(self):
+        if self._group_created:
+            return
+        from redis.exceptions import ResponseError
+        try:
+            self.client.xgroup_create(self.name, GROUP, id='0', mkstream=True)
+        except ResponseError as exc:
+            if 'BUSYGROUP' not in str(exc):
+                raise
+        self._group_created = True
+
+    def read(self, consumer, count, block_ms, claim_idle_ms):
+        """
+        Up to `count` `(entry_id, payload)` for `consumer`: the entries left
+        unacknowledged for `claim_idle_ms` by any worker first, then new ones,
+        waiting up to `block_ms` for them.
+        """
+        self._ensure_group()
+        entries = self.client.xautoclaim(self.name, GROUP, consumer, claim_idle_ms, count=count)[1]
+        # Redis < 7 still lists the pending entries that were deleted
+        entries = [entry for entry in entries if entry[1]]
+        if not entries:
+            reply = self.client.xreadgroup(GROUP, consumer, {self.name: '>'}, count=count, block=block_ms or None)
+            entries = reply[0][1] if reply else []
+        return [(_decode(entry_id), _decode(fields[b'event'])) for entry_id, fields in entries]
+
+    def ack(self, entry_ids):
+        if not entry_ids:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        pipe.xack(self.name, GROUP, *entry_ids)
+        pipe.xdel(self.name, *entry_ids)
+        pipe.execute()
+
+    def deliveries(self, entry_ids):
+        """Number of times each pending entry was delivered, from XPENDING."""
+        pipe = self.client.pipeline(transaction=False)
+        for entry_id in entry_ids:
+            pipe.xpending_range(self.name, GROUP, min=entry_id, max=entry_id, count=1)
+        return {
+            entry_id: pending[0]['times_delivered'] if pending else 0
+            for entry_id, pending in zip(entry_ids, pipe.execute())
+        }
+
+    def dead_letter(self, entries):
+        """Move `(entry_id, payload, error)` to the dead letter stream and acknowledge them."""
+        if not entries:
+            return
+        pipe = self.client.pipeline(transaction=True)
+        for entry_id, payload, error in entries:
+            pipe.xadd(self.name + DEAD_LETTER_SUFFIX, {'entry_id': entry_id, 'event': payload, 'error': error})
+        entry_ids = [entry_id for entry_id, _, _ in entries]
+        pipe.xack(self.name, GROUP, *entry_ids)
+        pipe.xdel(self.name, *entry_ids)
+        pipe.execute()
+
+    def stats(self):
+        self._ensure_group()
+        pipe = self.client.pipeline(transaction=False)
+        pipe.xlen(self.name)
+        pipe.xpending(self.name, GROUP)
+        pipe.xrange(self.name, count=1)
+        pipe.xlen(self.name + DEAD_LETTER_SUFFIX)
+        length, pending, first, dead_letters = pipe.execute()
+        return {
+            'length': length,
+            'pending': pending['pending'],
+            'oldest_entry_id': _decode(first[0][0]) if first else None,
+            'consumers': {_decode(consumer['name']): consumer['pending'] for consumer in pending['consumers']},
+            'dead_letters': dead_letters,
+        }
+
+
+class MemoryEventStream:
+    """
+    In-process stand-in for `RedisEventStream`, with the same delivery,
+    claiming and dedup behaviour.
+    """
+
+    backend = 'memory'
+
+    def __init__(self, name):
+        self.name = name
+        self._condition = threading.Condition()
+        self._entries = {}
+        self._undelivered = deque()
+        # entry id -> (consumer, delivery time)
+        self._pending = {}
+        # entry id -> times delivered, while pending
+        self._deliveries = {}
+        # (entry id, payload, error) of the dead-lettered entries
+        self.dead_letters = []
+        # dedup key -> expiry time
+        self._dedup_keys = {}
+        self._last_id = (0, 0)
+
+    def _next_id(self):
+        ms, sequence = self._last_id
+        now_ms = int(time.time() * 1000)
+        self._last_id = (now_ms, 0) if now_ms > ms else (ms, sequence + 1)
+        return '%d-%d' % self._last_id
+
+    def append(self, events):
+        now = time.monotonic()
+        entry_ids = []
+        with self._condition:
+            if len(self._dedup_keys) > 10000:
+                self._dedup_keys = {key: expiry for key, expiry in self._dedup_keys.items() if expiry > now}
+            for dedup_key, payload in events:
+                if dedup_key:
+                    if self._dedup_keys.get(dedup_key, 0) > now:
+                        entry_ids.append(None)
+                        continue
+                    self._dedup_keys[dedup_key] = now + settings.RIDE_EVENT_INGEST_DEDUP_SECONDS
+                entry_id = self._next_id()
+                self._entries[entry_id] = payload
+                self._undelivered.append(entry_id)
+                entry_ids.append(entry_id)
+            self._condition.notify_all()
+        return entry_ids
+
+    def read(self, consumer, count, block_ms, claim_idle_ms):
+        deadline = time.monotonic() + block_ms / 1000
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                entry_ids = [
+                    entry_id for entry_id, (_, delivered_at) in self._pending.items()
+                    if now - delivered_at >= claim_idle_ms / 1000
+                ][:count]
+                if not entry_ids:
+                    while self._undelivered and len(entry_ids) < count:
+                        entry_ids.append(self._undelivered.popleft())
+                if entry_ids or now >= deadline:
+                    break
+                self._condition.wait(deadline - now)
+            for entry_id in entry_ids:
+                self._pending[entry_id] = (consumer, now)
+                self._deliveries[entry_id] = self._deliveries.get(entry_id, 0) + 1
+            return [(entry_id, self._entries[entry_id]) for entry_id in entry_ids]
+
+    def ack(self, entry_ids):
+        with self._condition:
+            for entry_id in entry_ids:
+                self._pending.pop(entry_id, None)
+                self._deliveries.pop(entry_id, None)
+                self._entries.pop(entry_id, None)
+
+    def deliveries(self, entry_ids):
+        with self._condition:
+            return {entry_id: self._deliveries.get(entry_id, 0) for entry_id in entry_ids}
+
+    def dead_letter(self, entries):
+        with self._condition:
+            self.dead_letters.extend(entries)
+        self.ack([entry_id for entry_id, _, _ in entries])
+
+    def stats(self):
+        with self._condition:
+            consumers = {}
+            for consumer, _ in self._pending.values():
+                consumers[consumer] = consumers.get(consumer, 0) + 1
+            return {
+                'length': len(self._entries),
+                'pending': len(self._pending),
+                'oldest_entry_id': next(iter(self._entries), None),
+                'consumers': consumers,
+                'dead_letters': len(self.dead_letters),
+            }
+
+
+_streams = {}
+_streams_lock = threading.Lock()
+
+
+def get_stream():
+    name = settings.RIDE_EVENT_INGEST_STREAM
+    with _streams_lock:
+        if name not in _streams:
+            client = get_redis_client()
+            if client is not None:
+                _streams[name] = RedisEventStream(client, name)
+            else:
+                _streams[name] = MemoryEventStream(name)
+        return _streams[name]
+
+
+def ingest_ride_events(items, user_id):
+    """
+    Validate ride events and append the valid ones to the stream, stamped
+    with the ingest time. Returns the response data: the entry id of each
+    accepted event, and the indexes of the duplicates and of the invalid
+    events.
+    """
+    validated, result = validate_batch(RideEventIngestSerializer, items, False, 'id_ride_event')
+    created_at = timezone.now().isoformat()
+    indexes = sorted(validated)
+    events = [
+        (validated[index].get('dedup_key'), json.dumps({
+            'id_ride': validated[index]['id_ride'],
+            'description': validated[index]['description'],
+            'dedup_key': validated[index].get('dedup_key'),
+            'created_by': user_id,
+            'created_at': created_at,
+        }, separators=(',', ':')))
+        for index in indexes
+    ]
+    entry_ids = get_stream().append(events) if events else []
+
+    accepted = [{'index': index, 'entry_id': entry_id} for index, entry_id in zip(indexes, entry_ids) if entry_id]
+    return {
+        'accepted': len(accepted),
+        'results': accepted,
+        'duplicates': [index for index, entry_id in zip(indexes, entry_ids) if not entry_id],
+        'errors': [{'index': index, 'errors': errors} for index, errors in sorted(result.errors.items())],
+    }
+
+
+def write_ingested_events(entries):
+    """
+    Insert a batch of `(entry_id, payload)` read from the stream, in one
+    transaction. Events already written, by an earlier delivery of the same
+    entry or of the same dedup key, are skipped; events of a ride that does
+    not exist are rejected. Returns `(written, duplicates, rejected)`, the
+    last one being the rejected entry ids.
+    """
+    rows = []
+    for entry_id, payload in entries:
+        data = json.loads(payload)
+        data['dedup_key'] = data['dedup_key'] or entry_id
+        data['created_at'] = datetime.fromisoformat(data['created_at'])
+        rows.append((entry_id, data))
+    if not rows:
+        return 0, 0, []
+
+    rides = Ride.objects.only('id_ride', 'status', 'id_rider').in_bulk({data['id_ride'] for _, data in rows})
+    rejected = [entry_id for entry_id, data in rows if data['id_ride'] not in rides]
+    rows = [data for _, data in rows if data['id_ride'] in rides]
+
+    with transaction.atomic():
+        seen = set()
+        if rows:
+            seen.update(RideEvent.objects.filter(
+                dedup_key__in={data['dedup_key'] for data in rows},
+                created_at__gte=min(data['created_at'] for data in rows),
+            ).values_list('dedup_key', 'created_at'))
+        events = []
+        for data in rows:
+            key = (data['dedup_key'], data['created_at'])
+            if key in seen:
+                continue
+            seen.add(key)
+            events.append(RideEvent(
+                id_ride=rides[data['id_ride']], description=data['description'], dedup_key=data['dedup_key'],
+                created_at=data['created_at'], created_by_id=data['created_by'], modified_by_id=data['created_by'],
+            ))
+        if events:
+            # A concurrent worker may have written the same entry since the check
+            RideEvent.objects.bulk_create(events, batch_size=1000, ignore_conflicts=True)
+            affected_rides = list({event.id_ride_id: event.id_ride for event in events}.values())
+            transaction.on_commit(
+                lambda: ride_events_bulk_saved.send_robust(
+                    sender=RideEvent, events=events, rides=affected_rides, created=True
+                )
+            )
+    return len(events), len(rows) - len(events), rejected
+
+
+def drain_batch(stream, entries):
+    """
+    Write a batch read from `stream` and acknowledge what was written. When
+    the batch fails, its entries are written one by one: the failing ones
+    stay pending, or are dead-lettered once delivered
+    `RIDE_EVENT_INGEST_MAX_DELIVERIES` times. Returns `(written, duplicates,
+    rejected, failed, dead)`, the last three being entry ids. Connection
+    errors are raised, leaving the unwritten entries pending.
+    """
+    try:
+        written, duplicates, rejected = write_ingested_events(entries)
+    except TRANSIENT_ERRORS:
+        raise
+    except Exception:
+        pass
+    else:
+        stream.ack([entry_id for entry_id, _ in entries])
+        return written, duplicates, rejected, [], []
+
+    written = duplicates = 0
+    rejected = []
+    written_ids = []
+    errors = {}
+    try:
+        for entry_id, payload in entries:
+            try:
+                counts = write_ingested_events([(entry_id, payload)])
+            except TRANSIENT_ERRORS:
+                raise
+            except Exception as exc:
+                errors[entry_id] = (payload, f'{type(exc).__name__}: {exc}')
+                continue
+            written_ids.append(entry_id)
+            written += counts[0]
+            duplicates += counts[1]
+            rejected += counts[2]
+    finally:
+        stream.ack(written_ids)
+
+    deliveries = stream.deliveries(list(errors))
+    dead = [
+        (entry_id, payload, error) for entry_id, (payload, error) in errors.items()
+        if deliveries[entry_id] >= settings.RIDE_EVENT_INGEST_MAX_DELIVERIES
+    ]
+    stream.dead_letter(dead)
+    dead_ids = {entry_id for entry_id, _, _ in dead}
+    failed = [entry_id for entry_id in errors if entry_id not in dead_ids]
+    return written, duplicates, rejected, failed, [entry_id for entry_id, _, _ in dead]
+
+
+def ingest_stats():
+    """
+    Lag of the ingestion stream: entries not written yet (`length`), those
+    delivered to a worker but not acknowledged (`pending`, per consumer),
+    the age of the oldest entry, i.e. how far behind the workers are, and
+    the entries moved to the dead letter stream (`dead_letters`).
+    """
+    stream = get_stream()
+    stats = stream.stats()
+    oldest = stats.pop('oldest_entry_id')
+    return {
+        'backend': stream.backend,
+        'stream': stream.name,
+        **stats,
+        'undelivered': stats['length'] - stats['pending'],
+        'lag_seconds': _entry_age(oldest) if oldest else 0,
+    }
@@ -1,5 +1,12 @@
 import math
-from django.db.models import F, Func, ExpressionWrapper, FloatField
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F, Func, ExpressionWrapper, FloatField, Q
+
+from core.utils import geohash
+
+EARTH_RADIUS_KM = 6371
 
 
 def calculate_distance_annotation(latitude, longitude):
@@ -15,7 +22,7 @@ def calculate_distance_annotation(latitude, longitude):
     
     # Create an expression to calculate the distance using the Haversine formula
     # directly in the database
-    R = 6371  # Earth radius in kilometers
+    R = EARTH_RADIUS_KM
     
     return ExpressionWrapper(
         # Haversine formula: 2 * R * asin(sqrt(sin²((lat2-lat1)/2) + cos(lat1) * cos(lat2) * sin²((lon2-lon1)/2)))
@@ -38,4 +45,214 @@ def calculate_distance_annotation(latitude, longitude):
             function='ASIN'
         ),
         output_field=FloatField()
-    )
\ No newline at end of file
+    )
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two positions, computed in Python."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    Compute the lat/lon box that contains every point within `radius_km` of
+    the given position.
+
+    Returns `(min_lat, max_lat, lon_ranges)` where `lon_ranges` is a list of
+    `(min_lon, max_lon)` tuples: one range normally, two when the box crosses
+    the antimeridian, and the full `(-180, 180)` range when it reaches a pole.
+    """
+    lat_rad = math.radians(float(latitude))
+    lon_rad = math.radians(float(longitude))
+    angular_radius = float(radius_km) / EARTH_RADIUS_KM
+
+    min_lat = lat_rad - angular_radius
+    max_lat = lat_rad + angular_radius
+
+    # A pole is inside the circle: every longitude is reachable
+    if min_lat <= -math.pi / 2 or max_lat >= math.pi / 2:
+        return (
+            math.degrees(max(min_lat, -math.pi / 2)),
+            math.degrees(min(max_lat, math.pi / 2)),
+            [(-180.0, 180.0)]
+        )
+
+    delta_lon = math.asin(math.sin(angular_radius) / math.cos(lat_rad))
+    min_lon = math.degrees(lon_rad - delta_lon)
+    max_lon = math.degrees(lon_rad + delta_lon)
+
+    # Split the longitude range when it wraps around the antimeridian
+    if min_lon < -180:
+        lon_ranges = [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    elif max_lon > 180:
+        lon_ranges = [(min_lon, 180.0), (-180.0, max_lon - 360)]
+    else:
+        lon_ranges = [(min_lon, max_lon)]
+
+    return math.degrees(min_lat), math.degrees(max_lat), lon_ranges
+
+
+def bounding_box_filter(latitude, longitude, radius_km):
+    """
+    Build an indexable `Q` on `pickup_latitude`/`pickup_longitude` that keeps
+    only rides inside the bounding box of the search circle.
+    """
+    min_lat, max_lat, lon_ranges = bounding_box(latitude, longitude, radius_km)
+
+    lon_filter = Q()
+    for min_lon, max_lon in lon_ranges:
+        lon_filter |= Q(pickup_longitude__range=(min_lon, max_lon))
+
+    return Q(pickup_latitude__range=(min_lat, max_lat)) & lon_filter
+
+
+def filter_within_radius(queryset, latitude, longitude, radius_km):
+    """
+    Restrict a ride queryset to pickups within `radius_km` of a position.
+
+    The bounding box prefilter narrows the candidates through the
+    (pickup_latitude, pickup_longitude) index, so the exact Haversine distance
+    is only evaluated for rows inside the box. The result is annotated with
+    `distance_to_pickup`.
+    """
+    return queryset.filter(
+        bounding_box_filter(latitude, longitude, radius_km)
+    ).annotate(
+        distance_to_pickup=calculate_distance_annotation(latitude, longitude)
+    ).filter(
+        distance_to_pickup__lte=float(radius_km)
+    )
+
+
+def nearest_rides(queryset, latitude, longitude, k, precision=6, rings_per_precision=4):
+    """
+    Return the `k` rides whose pickup is closest to a position, closest first,
+    annotated with `distance_to_pickup`.
+
+    The search expands ring by ring around the geohash cell of the position,
+    querying only the new cells of each ring through the indexed
+    `pickup_geohash` prefix. Exact distances are computed for those candidates
+    only, and the search stops once the k-th best distance is within the area
+    already covered. If a few rings are not enough (sparse data), the search
+    continues on coarser cells.
+    """
+    lat = float(latitude)
+    lon = float(longitude)
+    distance = calculate_distance_annotation(lat, lon)
+    candidates = {}
+
+    for current_precision in range(precision, 0, -1):
+        x, y = geohash.cell_of(lat, lon, current_precision)
+        columns, rows = geohash.grid_size(current_precision)
+        searched = set()
+        max_rings = rings_per_precision if current_precision > 1 else max(columns, rows)
+
+        for radius in range(max_rings + 1):
+            cells = [cell for cell in geohash.ring_cells(x, y, radius, current_precision) if cell not in searched]
+            searched.update(cells)
+
+            if cells:
+                cell_filter = Q()
+                for cell in cells:
+                    cell_filter |= Q(pickup_geohash__startswith=geohash.cell_to_geohash(*cell, current_precision))
+                rows_found = queryset.filter(cell_filter).exclude(
+                    pk__in=list(candidates)
+                ).annotate(
+                    distance_to_pickup=distance
+                ).values_list('pk', 'distance_to_pickup')
+                candidates.update(rows_found)
+
+            if len(candidates) >= k:
+                kth_distance = sorted(candidates.values())[k - 1]
+                covered = geohash.covered_radius_km(
+                    lat, lon, x, y, radius, current_precision, EARTH_RADIUS_KM
+                )
+                if kth_distance <= covered:
+                    return _closest(queryset, candidates, distance, k)
+
+    return _closest(queryset, candidates, distance, k)
+
+
+def _closest(queryset, candidates, distance, k):
+    ids = sorted(candidates, key=lambda pk: (candidates[pk], pk))[:k]
+    return queryset.filter(pk__in=ids).annotate(
+        distance_to_pickup=distance
+    ).order_by('distance_to_pickup', 'pk')
+
+
+def _unit_vectors(positions):
+    """`(n, 2)` latitudes/longitudes in degrees as `(n, 3)` unit vectors."""
+    radians = np.radians(np.asarray(positions, dtype=np.float64).reshape(-1, 2))
+    cos_lat = np.cos(radians[:, 0])
+    return np.column_stack((cos_lat * np.cos(radians[:, 1]), cos_lat * np.sin(radians[:, 1]), np.sin(radians[:, 0])))
+
+
+def _dot_chunks(origins, destinations):
+    """
+    Yield `(start, dots)`: the dot products of the unit vectors of a block of
+    origins, from row `start`, with every destination. Blocks hold about
+    `DISTANCE_MATRIX_CHUNK_CELLS` values so memory stays bounded.
+    """
+    origins = _unit_vectors(origins)
+    destinations_t = _unit_vectors(destinations).T.copy()
+    rows = max(1, settings.DISTANCE_MATRIX_CHUNK_CELLS // max(1, destinations_t.shape[1]))
+    for start in range(0, len(origins), rows):
+        yield start, origins[start:start + rows] @ destinations_t
+
+
+def _dots_to_km(dots):
+    """
+    Haversine distances from the dot products of unit vectors, in place:
+    `hav(d) = (1 - cos d) / 2` and `cos d` is the dot product.
+    """
+    np.subtract(1.0, dots, out=dots)
+    np.multiply(dots, 0.5, out=dots)
+    np.clip(dots, 0.0, 1.0, out=dots)
+    np.sqrt(dots, out=dots)
+    np.arcsin(dots, out=dots)
+    np.multiply(dots, 2 * EARTH_RADIUS_KM, out=dots)
+    return dots
+
+
+def distance_matrix(origins, destinations):
+    """
+    Haversine distances in km between every origin and every destination,
+    both `(n, 2)` latitudes/longitudes in degrees, as an `(m, n)` array.
+    """
+    destination_count = len(destinations)
+    matrix = np.empty((len(origins), destination_count))
+    for start, dots in _dot_chunks(origins, destinations):
+        matrix[start:start + len(dots)] = _dots_to_km(dots)
+    return matrix
+
+
+def nearest_destinations(origins, destinations, k):
+    """
+    The `k` closest destinations of each origin, closest first, as `(m, k)`
+    arrays of destination indexes and distances in km. The full matrix is
+    never held: each block of origins is reduced to its top k, ranked by dot
+    product, before the next one is computed.
+    """
+    k = min(k, len(destinations))
+    indexes = np.empty((len(origins), k), dtype=np.int64)
+    distances = np.empty((len(origins), k))
+    for start, dots in _dot_chunks(origins, destinations):
+        # The largest dot products are the closest destinations
+        if k == 1:
+            top = dots.argmax(axis=1)[:, None]
+        elif k < dots.shape[1]:
+            top = np.argpartition(dots, -k, axis=1)[:, -k:]
+        else:
+            top = np.broadcast_to(np.arange(dots.shape[1]), dots.shape)
+        top_dots = np.take_along_axis(dots, top, axis=1)
+        order = np.argsort(-top_dots, axis=1, kind='stable')
+        end = start + len(dots)
+        indexes[start:end] = np.take_along_axis(top, order, axis=1)
+        distances[start:end] = _dots_to_km(np.take_along_axis(top_dots, order, axis=1))
+    return indexes, distances
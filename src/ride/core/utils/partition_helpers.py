@@ -0,0 +1,320 @@
+"""
+Declarative range partitioning of ride events by `created_at` (Postgres).
+
+Partitions cover whole UTC days or months and are named after the period
+they start, e.g. `core_rideevent_p20261018` or `core_rideevent_p202610`.
+Converting an existing table attaches it as the `core_rideevent_history`
+partition instead of copying its rows. A `core_rideevent_default` partition
+catches the rows no range covers, so inserts never fail when maintenance
+falls behind; creating a partition moves its rows out of the default one.
+"""
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection as default_connection, transaction
+
+from core.models import RideEvent
+
+INTERVALS = ('day', 'month')
+HISTORY_SUFFIX = 'history'
+DEFAULT_SUFFIX = 'default'
+
+_BOUND_RE = re.compile(r"FROM \((MINVALUE|'[^']+')\) TO \((MAXVALUE|'[^']+')\)")
+
+
+def period_start(value, interval):
+    """Start (UTC) of the day or month containing `value`."""
+    value = value.astimezone(dt_timezone.utc)
+    if interval == 'day':
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_period(start, interval):
+    if interval == 'day':
+        return start + timedelta(days=1)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def partition_name(start, interval, table=None):
+    table = table or RideEvent._meta.db_table
+    return f'{table}_p{start:%Y%m%d}' if interval == 'day' else f'{table}_p{start:%Y%m}'
+
+
+def is_partitioned(table=None, connection=None):
+    connection = connection or default_connection
+    table = table or RideEvent._meta.db_table
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [table])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def _parse_bound(value):
+    if value in ('MINVALUE', 'MAXVALUE'):
+        return None
+    return datetime.fromisoformat(value.strip("'")).astimezone(dt_timezone.utc)
+
+
+def list_partitions(table=None, connection=None):
+    """
+    Return `(name, start, end)` of each partition, ordered by range. Open
+    bounds (MINVALUE/MAXVALUE) are None.
+    """
+    connection = connection or default_connection
+    table = table or RideEvent._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = %s::regclass
+            """,
+            [table]
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND_RE.search(bound)
+        if match is None:
+            # the DEFAULT partition has no range
+            continue
+        partitions.append((name, _parse_bound(match.group(1)), _parse_bound(match.group(2))))
+    partitions.sort(key=lambda partition: partition[1] or datetime.min.replace(tzinfo=dt_timezone.utc))
+    return partitions
+
+
+def default_partition(table=None, connection=None):
+    """Name of the DEFAULT partition, or None when there is none."""
+    connection = connection or default_connection
+    table = table or RideEvent._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname FROM pg_partitioned_table
+            JOIN pg_class child ON child.oid = pg_partitioned_table.partdefid
+            WHERE pg_partitioned_table.partrelid = %s::regclass
+            """,
+            [table]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def create_default_partition(table=None, connection=None):
+    """
+    Create the DEFAULT partition when it is missing. Returns its name if it
+    was created.
+    """
+    connection = connection or default_connection
+    table = table or RideEvent._meta.db_table
+    if default_partition(table, connection) is not None:
+        return None
+    name = f'{table}_{DEFAULT_SUFFIX}'
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {quote(name)} PARTITION OF {quote(table)} DEFAULT')
+    return name
+
+
+def count_default_rows(table=None, connection=None):
+    """Rows in the DEFAULT partition: events no range partition covered when they were written."""
+    connection = connection or default_connection
+    name = default_partition(table, connection)
+    if name is None:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(name)}')
+        return cursor.fetchone()[0]
+
+
+def _create_partition(cursor, quote, table, name, start, end, default):
+    """
+    Create the partition of `[start, end)`. Postgres refuses to while the
+    DEFAULT partition holds rows of that range, so those are moved into the
+    new partition in the same transaction.
+    """
+    moved = 0
+    if default is not None:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {quote(default)} WHERE created_at >= %s AND created_at < %s)',
+            [start, end]
+        )
+        moved = cursor.fetchone()[0]
+    if moved:
+        cursor.execute(f'CREATE TEMPORARY TABLE moved_events (LIKE {quote(table)}) ON COMMIT DROP')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {quote(default)} WHERE created_at >= %s AND created_at < %s RETURNING *) '
+            'INSERT INTO moved_events SELECT * FROM moved',
+            [start, end]
+        )
+        moved = cursor.rowcount
+    cursor.execute(
+        f'CREATE TABLE {quote(name)} PARTITION OF {quote(table)} FOR VALUES FROM (%s) TO (%s)',
+        [start, end]
+    )
+    if moved:
+        cursor.execute(f'INSERT INTO {quote(table)} SELECT * FROM moved_events')
+        cursor.execute('DROP TABLE moved_events')
+    return moved
+
+
+def create_partitions(until, interval, start=None, table=None, connection=None):
+    """
+    Create the missing partitions up to the period containing `until`,
+    starting after the last partition, or from `start` to backfill older
+    periods. Periods overlapping an existing partition are skipped. Rows of
+    a new partition's range found in the DEFAULT partition are moved into
+    it. Returns the created names.
+    """
+    connection = connection or default_connection
+    table = table or RideEvent._meta.db_table
+    partitions = list_partitions(table, connection)
+    if start is not None:
+        current = period_start(start, interval)
+    else:
+        ends = [end for _, _, end in partitions if end is not None]
+        current = max(ends) if ends else period_start(until, interval)
+
+    created = []
+    default = default_partition(table, connection)
+    quote = connection.ops.quote_name
+    while current <= until:
+        end = next_period(current, interval)
+        overlaps = any(
+            (low is None or low < end) and (high is None or high > current)
+            for _, low, high in partitions
+        )
+        if not overlaps:
+            name = partition_name(current, interval, table)
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                _create_partition(cursor, quote, table, name, current, end, default)
+            created.append(name)
+        current = end
+    return created
+
+
+def expired_partitions(cutoff, table=None, connection=None):
+    """Partitions whose every row is older than `cutoff`."""
+    return [
+        name for name, _, end in list_partitions(table, connection)
+        if end is not None and end <= cutoff
+    ]
+
+
+def detach_partition(name, drop=True, table=None, connection=None):
+    """
+    Detach a partition from the ride events table and, with `drop`, drop it.
+    Dropping a whole partition replaces a bulk DELETE and leaves nothing to
+    vacuum.
+    """
+    connection = connection or default_connection
+    table = table or RideEvent._meta.db_table
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {quote(table)} DETACH PARTITION {quote(name)}')
+        if drop:
+            cursor.execute(f'DROP TABLE {quote(name)}')
+
+
+def convert_to_partitioned(interval, table=None, connection=None):
+    """
+    Turn the regular ride events table into a table partitioned by range of
+    `created_at`, in one transaction.
+
+    The existing table becomes the `<table>_history` partition, covering
+    every row up to the end of the period of the newest one, so no row is
+    copied: attaching only checks the rows against the range and builds the
+    primary key, which must include the partition key. The id sequence and
+    the indexes keep their names on the new parent table.
+    """
+    connection = connection or default_connection
+    table = table or RideEvent._meta.db_table
+    history = f'{table}_{HISTORY_SUFFIX}'
+    quote = connection.ops.quote_name
+    pk_column = RideEvent._meta.pk.column
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE')
+        # Django's foreign keys are deferred; a table with pending checks cannot be altered
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+        cursor.execute(
+            """
+            SELECT indexname, indexdef FROM pg_indexes
+            WHERE schemaname = current_schema() AND tablename = %s
+            """,
+            [table]
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype = 'f'
+            """,
+            [table]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f'SELECT MAX({quote(pk_column)}), MAX(created_at) FROM {quote(table)}')
+        last_id, last_created_at = cursor.fetchone()
+
+        # Free the names of the indexes and of the id sequence for the parent
+        cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(history)}')
+        for name, _ in indexes:
+            cursor.execute(f'ALTER INDEX {quote(name)} RENAME TO {quote(_history_name(name))}')
+        cursor.execute(f'ALTER TABLE {quote(history)} ALTER COLUMN {quote(pk_column)} DROP IDENTITY IF EXISTS')
+        # Tables created before Django 4.1 use a serial column instead of an identity
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [quote(history), pk_column])
+        serial_sequence = cursor.fetchone()[0]
+        if serial_sequence:
+            cursor.execute(f'ALTER TABLE {quote(history)} ALTER COLUMN {quote(pk_column)} DROP DEFAULT')
+            cursor.execute(f'DROP SEQUENCE {serial_sequence}')
+
+        cursor.execute(
+            f'CREATE TABLE {quote(table)} (LIKE {quote(history)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            'PARTITION BY RANGE (created_at)'
+        )
+        sequence = f'{table}_{pk_column}_seq'
+        cursor.execute(f'CREATE SEQUENCE {quote(sequence)} OWNED BY {quote(table)}.{quote(pk_column)}')
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ALTER COLUMN {quote(pk_column)} SET DEFAULT nextval(%s)", [sequence]
+        )
+        cursor.execute('SELECT setval(%s, %s, %s)', [sequence, last_id or 1, last_id is not None])
+
+        cursor.execute(
+            f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(table + "_pkey")} '
+            f'PRIMARY KEY ({quote(pk_column)}, created_at)'
+        )
+        for name, definition in indexes:
+            if name != f'{table}_pkey':
+                # pg_indexes renders the definition with the original table name
+                cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}')
+
+        if last_created_at is not None:
+            # A partition cannot keep a primary key of its own; attaching builds
+            # the composite one and reuses the matching secondary indexes
+            cursor.execute(
+                f'ALTER TABLE {quote(history)} DROP CONSTRAINT {quote(_history_name(table + "_pkey"))}'
+            )
+            end = next_period(period_start(last_created_at, interval), interval)
+            cursor.execute(
+                f'ALTER TABLE {quote(table)} ATTACH PARTITION {quote(history)} FOR VALUES FROM (MINVALUE) TO (%s)',
+                [end]
+            )
+        else:
+            cursor.execute(f'DROP TABLE {quote(history)}')
+
+        # rows past the last range partition land here instead of failing
+        cursor.execute(f'CREATE TABLE {quote(table + "_" + DEFAULT_SUFFIX)} PARTITION OF {quote(table)} DEFAULT')
+
+    return history if last_created_at is not None else None
+
+
+def _history_name(name):
+    return f'{name[:63 - len(HISTORY_SUFFIX) - 1]}_{HISTORY_SUFFIX}'
@@ -0,0 +1,124 @@
+"""
+Connection statistics of the database aliases and the Redis cache, used to
+size the pools before adding workers. Pool counters are those of the
+current worker process; the Postgres server view counts the connections of
+every worker.
+"""
+from collections import Counter
+
+from django.db import connections
+
+from core.utils.cache_helpers import get_redis_client
+
+# alias -> database connections opened by this process
+_opened_connections = Counter()
+
+
+def record_connection_opened(alias):
+    _opened_connections[alias] += 1
+
+
+def database_mode(connection):
+    if connection.settings_dict.get('OPTIONS', {}).get('pool'):
+        return 'pool'
+    if connection.settings_dict['CONN_MAX_AGE']:
+        return 'persistent'
+    return 'per_request'
+
+
+def database_pool_stats(connection):
+    """
+    Counters of the psycopg 3 pool of an alias: connections in use and idle,
+    requests waiting for one, checkout wait time and connections replaced
+    after being lost or returned broken. None without a pool.
+    """
+    pool = connection.pool if database_mode(connection) == 'pool' else None
+    if pool is None:
+        return None
+    stats = pool.get_stats()
+    checkouts = stats.get('requests_num', 0)
+    opened = stats.get('connections_num', 0)
+    return {
+        'min_size': stats['pool_min'],
+        'max_size': stats['pool_max'],
+        'size': stats['pool_size'],
+        'in_use': stats['pool_size'] - stats['pool_available'],
+        'available': stats['pool_available'],
+        'waiting': stats.get('requests_waiting', 0),
+        'checkouts': checkouts,
+        'checkouts_queued': stats.get('requests_queued', 0),
+        'checkout_errors': stats.get('requests_errors', 0),
+        'checkout_wait_ms_avg': round(stats.get('requests_wait_ms', 0) / checkouts, 3) if checkouts else 0,
+        'connections_opened': opened,
+        'connect_ms_avg': round(stats.get('connections_ms', 0) / opened, 3) if opened else 0,
+        'recycled': stats.get('connections_lost', 0) + stats.get('returns_bad', 0),
+    }
+
+
+def database_server_stats(connection):
+    """
+    Connections of this application on the Postgres server, by state, next
+    to the server's `max_connections`.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT coalesce(state, 'unknown'), count(*) FROM pg_stat_activity
+            WHERE application_name = current_setting('application_name') AND datname = current_database()
+            GROUP BY 1
+            """
+        )
+        states = dict(cursor.fetchall())
+        cursor.execute("SELECT current_setting('max_connections')::int")
+        max_connections = cursor.fetchone()[0]
+    return {
+        'max_connections': max_connections,
+        'connections': sum(states.values()),
+        'by_state': states,
+    }
+
+
+def database_stats(alias):
+    connection = connections[alias]
+    settings_dict = connection.settings_dict
+    pool = database_pool_stats(connection)
+    return {
+        'alias': alias,
+        'mode': database_mode(connection),
+        'conn_max_age': settings_dict['CONN_MAX_AGE'],
+        'health_checks': settings_dict['CONN_HEALTH_CHECKS'],
+        # `connection_created` is also sent for each checkout from a pool
+        'connections_opened': pool['connections_opened'] if pool else _opened_connections[alias],
+        'pool': pool,
+        'server': database_server_stats(connection),
+    }
+
+
+def redis_pool_stats():
+    """
+    Connections of the django-redis connection pool of this process. None
+    when the cache is not Redis.
+    """
+    client = get_redis_client()
+    if client is None:
+        return None
+    pool = client.connection_pool
+
+    if hasattr(pool, 'pool'):
+        # BlockingConnectionPool: the queue holds idle connections and None
+        # placeholders for the ones never created
+        created = len(pool._connections)
+        available = sum(1 for connection in list(pool.pool.queue) if connection is not None)
+    else:
+        created = pool._created_connections
+        available = len(pool._available_connections)
+    return {
+        'pool_class': type(pool).__name__,
+        'max_connections': pool.max_connections,
+        'created': created,
+        'in_use': created - available,
+        'available': available,
+        'timeout': getattr(pool, 'timeout', None),
+    }
@@ -0,0 +1,170 @@
+"""
+Server push of ride changes.
+
+Writes publish small deltas on the channels `ride:<id_ride>`,
+`rider:<id_user>` and `status:<status>` once their transaction commits, and
+each connection of the push endpoint subscribes to some of them. A worker
+process keeps one hub per event loop: with a Redis cache, the hub holds a
+single pub/sub connection whatever the number of clients and fans the
+messages out to their queues. Otherwise messages go straight to the hubs of
+the publishing process.
+"""
+import asyncio
+import json
+import uuid
+import weakref
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.utils.cache_helpers import get_redis_client
+
+CHANNEL_KINDS = ('ride', 'rider', 'status')
+
+# Queued instead of a message when a client reads too slowly to keep up
+OVERFLOW = object()
+
+
+def ride_channels(ride):
+    return [f'ride:{ride.id_ride}', f'rider:{ride.id_rider_id}', f'status:{ride.status}']
+
+
+def _message(kind, **fields):
+    # The id lets a client subscribed to several channels of a ride drop the copies
+    return {'id': uuid.uuid4().hex[:16], 'type': kind, **fields}
+
+
+def ride_status_delta(ride):
+    """A ride was created or changed status; published on the channels of both statuses."""
+    channels = ride_channels(ride)
+    if ride.previous_status and ride.previous_status != ride.status:
+        channels.append(f'status:{ride.previous_status}')
+    return channels, _message(
+        'ride.status', id_ride=ride.id_ride, id_rider=ride.id_rider_id, status=ride.status,
+        previous_status=ride.previous_status, at=(ride.updated_at or timezone.now()).isoformat(),
+    )
+
+
+def ride_event_delta(event, ride):
+    """An event was added to `ride`. Events written by the ingestion worker have no id yet."""
+    return ride_channels(ride), _message(
+        'ride.event', id_ride=ride.id_ride, id_ride_event=event.id_ride_event, description=event.description,
+        status=ride.status, at=event.created_at.isoformat(),
+    )
+
+
+def publish(deltas):
+    """Publish `(channels, message)` deltas, in one round trip with Redis."""
+    payloads = [
+        (channel, json.dumps(message, separators=(',', ':')))
+        for channels, message in deltas for channel in channels
+    ]
+    if not payloads:
+        return
+    client = get_redis_client()
+    if client is not None:
+        pipe = client.pipeline(transaction=False)
+        for channel, payload in payloads:
+            pipe.publish(settings.PUSH_CHANNEL_PREFIX + channel, payload)
+        pipe.execute()
+        return
+    for loop, hub in list(_hubs.items()):
+        if not loop.is_closed():
+            for channel, payload in payloads:
+                loop.call_soon_threadsafe(hub.dispatch, channel, payload)
+
+
+class PushHub:
+    """Subscriptions of the clients of one event loop; delivers in-process messages."""
+
+    def __init__(self):
+        # channel -> queues of the clients subscribed to it
+        self.queues = defaultdict(set)
+
+    def dispatch(self, channel, payload):
+        message = json.loads(payload)
+        item = (message['id'], message['type'], payload)
+        for queue in list(self.queues.get(channel, ())):
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                # The client will be told to resync from the API instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(OVERFLOW)
+
+    async def subscribe(self, queue, channels):
+        added = []
+        for channel in channels:
+            if not self.queues[channel]:
+                added.append(channel)
+            self.queues[channel].add(queue)
+        await self._listen(added)
+
+    async def unsubscribe(self, queue, channels):
+        removed = []
+        for channel in channels:
+            self.queues[channel].discard(queue)
+            if not self.queues[channel]:
+                del self.queues[channel]
+                removed.append(channel)
+        await self._unlisten(removed)
+
+    async def _listen(self, channels):
+        pass
+
+    async def _unlisten(self, channels):
+        pass
+
+
+class RedisPushHub(PushHub):
+    """Relays the Redis channels that at least one client of the loop subscribed to."""
+
+    def __init__(self, client):
+        super().__init__()
+        self.pubsub = client.pubsub()
+        self.reader = None
+
+    async def _listen(self, channels):
+        if channels:
+            await self.pubsub.subscribe(*[settings.PUSH_CHANNEL_PREFIX + channel for channel in channels])
+            if self.reader is None:
+                self.reader = asyncio.ensure_future(self._read())
+
+    async def _unlisten(self, channels):
+        if channels:
+            await self.pubsub.unsubscribe(*[settings.PUSH_CHANNEL_PREFIX + channel for channel in channels])
+
+    async def _read(self):
+        from redis.exceptions import RedisError
+
+        prefix = len(settings.PUSH_CHANNEL_PREFIX)
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except RedisError:
+                # The next read reconnects and subscribes again
+                await asyncio.sleep(1)
+                continue
+            if message and message['type'] == 'message':
+                self.dispatch(message['channel'].decode()[prefix:], message['data'].decode())
+
+
+# event loop -> hub of its clients
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub():
+    loop = asyncio.get_running_loop()
+    if loop not in _hubs:
+        if get_redis_client() is not None:
+            import redis.asyncio
+
+            location = settings.CACHES['default']['LOCATION']
+            if isinstance(location, (list, tuple)):
+                location = location[0]
+            _hubs[loop] = RedisPushHub(redis.asyncio.Redis.from_url(location.split(',')[0]))
+        else:
+            _hubs[loop] = PushHub()
+    return _hubs[loop]
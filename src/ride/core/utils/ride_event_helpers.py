@@ -0,0 +1,89 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.models import Ride, RideEvent
+
+
+def recent_events_cutoff(now=None):
+    return (now or timezone.now()) - timedelta(hours=settings.RECENT_EVENTS_WINDOW_HOURS)
+
+
+def recent_event_entry(event):
+    """
+    Entry stored in `Ride.recent_events` for one event: the fields exposed by
+    `RideEventSerializer` plus the creation time used for expiry.
+    """
+    return {
+        'id_ride_event': event.id_ride_event,
+        'id_ride': event.id_ride_id,
+        'description': event.description,
+        'created_at': event.created_at.isoformat(),
+    }
+
+
+def current_recent_events(entries, now=None):
+    """
+    Filter stored entries down to the events still inside the window, in the
+    shape `RideEventSerializer` produces. Entries may outlive the window until
+    the next expiry run, so the window is always re-checked on read.
+    """
+    cutoff = recent_events_cutoff(now)
+    return [
+        {
+            'id_ride_event': entry['id_ride_event'],
+            'id_ride': entry['id_ride'],
+            'description': entry['description'],
+        }
+        for entry in entries
+        if parse_datetime(entry['created_at']) >= cutoff
+    ]
+
+
+def refresh_recent_events(ride_ids, now=None):
+    """
+    Rebuild the recent events window of the given rides with one query for
+    the events and one bulk update for the rides.
+
+    The rides are locked before the events are read, so concurrent rebuilds of
+    the same ride run one after the other and the last one sees every
+    committed event instead of overwriting it with an older read.
+    """
+    ride_ids = set(ride_ids)
+    if not ride_ids:
+        return
+
+    cutoff = recent_events_cutoff(now)
+    window = timedelta(hours=settings.RECENT_EVENTS_WINDOW_HOURS)
+    entries = defaultdict(list)
+    expire_at = {}
+
+    with transaction.atomic():
+        # Locking in id order keeps overlapping batches from deadlocking
+        ride_ids = list(
+            Ride.objects.select_for_update().filter(id_ride__in=ride_ids).order_by('id_ride').values_list('id_ride', flat=True)
+        )
+        if not ride_ids:
+            return
+
+        events = RideEvent.objects.filter(
+            id_ride__in=ride_ids, created_at__gte=cutoff
+        ).only(
+            'id_ride_event', 'id_ride', 'description', 'created_at'
+        ).order_by('id_ride_event')
+
+        for event in events:
+            entries[event.id_ride_id].append(recent_event_entry(event))
+            oldest = event.created_at + window
+            if event.id_ride_id not in expire_at or oldest < expire_at[event.id_ride_id]:
+                expire_at[event.id_ride_id] = oldest
+
+        rides = [
+            Ride(id_ride=ride_id, recent_events=entries[ride_id], recent_events_expire_at=expire_at.get(ride_id))
+            for ride_id in ride_ids
+        ]
+        Ride.objects.bulk_update(rides, ['recent_events', 'recent_events_expire_at'], batch_size=500)
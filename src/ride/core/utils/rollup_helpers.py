@@ -0,0 +1,180 @@
+"""
+Pre-aggregated ride analytics.
+
+`RideRollup` counts rides by status, hour of pickup and pickup cell, and
+`RideEventRollup` counts events by hour of creation and description. The
+model signals turn every ride save or delete, and every event insert or
+delete, into +1/-1 deltas on the rows they move between, added with one
+upsert once the write commits (one per batch for the bulk writes). Writes
+that send no signal (queryset `update()`, event edits, dropped partitions)
+and deltas lost by a process dying right after a commit are caught up by
+`rebuild_rollups`, which recomputes the rows from the tables.
+"""
+from collections import Counter
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Substr, TruncHour
+from django.utils import timezone
+
+from core.models import Ride, RideEvent, RideEventRollup, RideRollup
+
+RIDE_GROUPS = ('status', 'hour', 'cell')
+
+
+def truncate_hour(value):
+    return value.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def ride_rollup_key(status, pickup_time, pickup_geohash):
+    return truncate_hour(pickup_time), status, pickup_geohash[:settings.RIDE_ROLLUP_CELL_PRECISION]
+
+
+def ride_deltas(rides, deleted=False):
+    """
+    Deltas moving `rides` from the rollup row they were counted in, as last
+    loaded or saved, to the one of their current values (none when
+    `deleted`).
+    """
+    deltas = Counter()
+    for ride in rides:
+        if ride.previous_status is not None:
+            pickup_time, pickup_geohash = ride.previous_pickup
+            # A deferred pickup was not loaded, so it was not changed either
+            if pickup_time is None:
+                pickup_time = ride.pickup_time
+            if pickup_geohash is None:
+                pickup_geohash = ride.pickup_geohash
+            deltas[ride_rollup_key(ride.previous_status, pickup_time, pickup_geohash)] -= 1
+        if not deleted:
+            deltas[ride_rollup_key(ride.status, ride.pickup_time, ride.pickup_geohash)] += 1
+    return deltas
+
+
+def event_deltas(events, sign=1):
+    deltas = Counter()
+    for event in events:
+        deltas[(truncate_hour(event.created_at), event.description)] += sign
+    return deltas
+
+
+def add_counts(model, key_fields, deltas):
+    """
+    Add `deltas` (key tuple -> delta) to the counts of `model` in one
+    statement, creating the missing rows. Rows are written in key order so
+    concurrent upserts lock them in the same order.
+    """
+    rows = sorted((key, delta) for key, delta in deltas.items() if delta)
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    count = quote('count')
+    fields = [model._meta.get_field(name) for name in key_fields]
+    key_columns = ', '.join(quote(field.column) for field in fields)
+    placeholders = ', '.join(['(' + ', '.join(['%s'] * (len(fields) + 1)) + ')'] * len(rows))
+    params = []
+    for key, delta in rows:
+        params += [field.get_db_prep_value(value, connection) for field, value in zip(fields, key)]
+        params.append(delta)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({key_columns}, {count}) VALUES {placeholders} '
+            f'ON CONFLICT ({key_columns}) DO UPDATE SET {count} = {table}.{count} + EXCLUDED.{count}',
+            params,
+        )
+
+
+def apply_ride_deltas(deltas):
+    add_counts(RideRollup, ('hour', 'status', 'cell'), deltas)
+
+
+def apply_event_deltas(deltas):
+    add_counts(RideEventRollup, ('hour', 'description'), deltas)
+
+
+def rebuild_rollups(since=None):
+    """
+    Recompute the rollup rows from the ride and event tables: every row, or
+    the hours from `since` on. Returns the number of `(ride, event)` rows
+    written.
+    """
+    rides = Ride.objects.all()
+    events = RideEvent.objects.all()
+    ride_rows = RideRollup.objects.all()
+    event_rows = RideEventRollup.objects.all()
+    if since is not None:
+        since = truncate_hour(since)
+        rides = rides.filter(pickup_time__gte=since)
+        events = events.filter(created_at__gte=since)
+        ride_rows = ride_rows.filter(hour__gte=since)
+        event_rows = event_rows.filter(hour__gte=since)
+
+    ride_counts = rides.annotate(
+        hour=TruncHour('pickup_time', tzinfo=dt_timezone.utc),
+        cell=Substr('pickup_geohash', 1, settings.RIDE_ROLLUP_CELL_PRECISION),
+    ).values('hour', 'status', 'cell').annotate(count=Count('*')).order_by()
+    event_counts = events.annotate(
+        hour=TruncHour('created_at', tzinfo=dt_timezone.utc),
+    ).values('hour', 'description').annotate(count=Count('*')).order_by()
+
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # Deltas of concurrent writes wait for the rebuild instead of
+            # landing on rows about to be replaced
+            tables = ', '.join(
+                connection.ops.quote_name(model._meta.db_table) for model in (RideRollup, RideEventRollup)
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {tables} IN EXCLUSIVE MODE')
+        ride_rows.delete()
+        event_rows.delete()
+        written_rides = RideRollup.objects.bulk_create(
+            [RideRollup(**row) for row in ride_counts.iterator()], batch_size=1000
+        )
+        written_events = RideEventRollup.objects.bulk_create(
+            [RideEventRollup(**row) for row in event_counts.iterator()], batch_size=1000
+        )
+    return len(written_rides), len(written_events)
+
+
+def default_analytics_window():
+    """`(since, until)` covering the last `RIDE_ANALYTICS_DEFAULT_HOURS` hours, the current one included."""
+    until = truncate_hour(timezone.now()) + timedelta(hours=1)
+    return until - timedelta(hours=settings.RIDE_ANALYTICS_DEFAULT_HOURS), until
+
+
+def ride_rollup_counts(since, until, group_by=('status',), status=None, cell=None):
+    """
+    Ride counts between the `since` and `until` hours (pickup hour for
+    rides, creation hour for events), from the rollup rows only. Rides are
+    grouped by any of `status`, `hour` and `cell`, events by description,
+    and by hour when rides are.
+    """
+    ride_rows = RideRollup.objects.filter(hour__gte=truncate_hour(since), hour__lt=until)
+    if status:
+        ride_rows = ride_rows.filter(status=status)
+    if cell:
+        ride_rows = ride_rows.filter(cell__startswith=cell)
+    event_rows = RideEventRollup.objects.filter(hour__gte=truncate_hour(since), hour__lt=until)
+
+    group_by = [group for group in RIDE_GROUPS if group in group_by]
+    event_group_by = ['hour', 'description'] if 'hour' in group_by else ['description']
+    return {
+        'rides': [
+            _row(row) for row in ride_rows.values(*group_by).annotate(count=Sum('count'))
+            .filter(count__gt=0).order_by(*group_by)
+        ],
+        'events': [
+            _row(row) for row in event_rows.values(*event_group_by).annotate(count=Sum('count'))
+            .filter(count__gt=0).order_by(*event_group_by)
+        ],
+    }
+
+
+def _row(row):
+    if 'hour' in row:
+        row['hour'] = row['hour'].isoformat()
+    return row
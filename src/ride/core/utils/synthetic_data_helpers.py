@@ -0,0 +1,343 @@
+"""
+Deterministic synthetic rides and ride events for reproducing production
+scale query behavior locally.
+
+Pickups cluster around weighted hotspots, pickup times follow a diurnal
+profile, a few riders take most of the rides and every ride gets a
+consistent event timeline: its status and events are the milestones already
+reached at `now`. The same seed always produces the same rows.
+"""
+import json
+import math
+import random
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+from django.core.management.color import no_style
+from django.db import connections
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+from django.utils import timezone
+
+from core.utils import geohash
+from core.utils.location_helpers import EARTH_RADIUS_KM
+from core.utils.ride_event_helpers import recent_event_entry, recent_events_cutoff
+
+# (latitude, longitude, spread in km, weight) of the pickup hotspots
+HOTSPOTS = (
+    (37.7897, -122.4011, 2.5, 30),  # San Francisco downtown
+    (37.7599, -122.4148, 2.0, 12),  # Mission
+    (37.6213, -122.3790, 1.0, 8),   # SFO airport
+    (37.8044, -122.2712, 2.5, 10),  # Oakland
+    (37.8715, -122.2730, 1.5, 6),   # Berkeley
+    (37.4419, -122.1430, 2.0, 6),   # Palo Alto
+    (37.3382, -121.8863, 3.5, 14),  # San Jose
+)
+# share of pickups spread uniformly over the whole area, and its bounds
+BACKGROUND_SHARE = 0.1
+AREA = (37.0, 38.0, -122.5, -121.5)
+
+# relative ride demand per local hour
+WEEKDAY_HOURLY = (2, 1, 1, 1, 1, 3, 6, 10, 12, 8, 6, 6, 7, 6, 6, 7, 9, 12, 11, 8, 6, 5, 4, 3)
+WEEKEND_HOURLY = (6, 5, 4, 2, 1, 1, 2, 3, 4, 5, 6, 7, 8, 8, 7, 7, 7, 8, 9, 9, 9, 9, 8, 7)
+
+# milestones of a ride, and the status once the nth one has been reached
+FLOW = (
+    'Ride requested',
+    'Driver assigned',
+    'Driver en-route to pickup',
+    'Driver arrived at pickup location',
+    'Ride started',
+    'Approaching destination',
+    'Ride completed',
+    'Payment processed',
+)
+FLOW_STATUS = ('pending', 'pending', 'en-route', 'pickup', 'dropoff', 'dropoff', 'completed', 'completed')
+CANCELLATIONS = ('Ride cancelled by rider', 'Ride cancelled by driver')
+INCIDENTS = ('Route changed', 'Unexpected delay', 'Traffic encountered')
+CANCELLED_SHARE = 0.06
+
+# median trip length and the spread of its log-normal distribution
+TRIP_MEDIAN_KM = 5.0
+TRIP_SIGMA = 0.6
+
+GeneratedEvent = namedtuple('GeneratedEvent', 'id_ride_event id_ride_id description created_at')
+
+
+def parse_count_range(value):
+    """
+    Parse `N` or `MIN-MAX` into a `(min, max)` tuple of non-negative ints.
+    """
+    low, _, high = str(value).partition('-')
+    low = int(low)
+    high = int(high) if high else low
+    if low < 0 or high < low:
+        raise ValueError(f'Invalid range: {value}')
+    return low, high
+
+
+class SyntheticDataGenerator:
+    """
+    Generates ride and ride event rows as dicts keyed by field attname, with
+    explicit primary keys so events can reference rides generated in the
+    same batch.
+    """
+
+    def __init__(self, rider_ids, driver_ids, user_id=None, seed=None, now=None, days=3,
+                 events_per_ride=(2, 5)):
+        self.seed = random.randrange(2 ** 32) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.now = now or timezone.now()
+        self.days = days
+        self.events_per_ride = events_per_ride
+        self.user_id = user_id
+        self.driver_ids = list(driver_ids)
+        self.rider_ids = list(rider_ids)
+        # a few riders take most of the rides
+        self.rider_weights = self._cumulative(self.rng.paretovariate(1.2) for _ in self.rider_ids)
+        self.hotspot_weights = self._cumulative(hotspot[3] for hotspot in HOTSPOTS)
+        self.recent_cutoff = recent_events_cutoff(self.now)
+        self.window = self.now - self.recent_cutoff
+
+        local_now = timezone.localtime(self.now)
+        self.today = local_now.date()
+        self.tzinfo = local_now.tzinfo
+
+    @staticmethod
+    def _cumulative(weights):
+        total = 0
+        cumulative = []
+        for weight in weights:
+            total += weight
+            cumulative.append(total)
+        return cumulative
+
+    def pickup_point(self):
+        rng = self.rng
+        if rng.random() < BACKGROUND_SHARE:
+            return rng.uniform(AREA[0], AREA[1]), rng.uniform(AREA[2], AREA[3])
+        latitude, longitude, spread_km, _ = rng.choices(HOTSPOTS, cum_weights=self.hotspot_weights)[0]
+        return self.offset(latitude, longitude, abs(rng.gauss(0, spread_km)), rng.uniform(0, 2 * math.pi))
+
+    @staticmethod
+    def offset(latitude, longitude, distance_km, bearing):
+        """Position `distance_km` away along `bearing` (flat-earth approximation)."""
+        delta_lat = math.degrees(distance_km * math.cos(bearing) / EARTH_RADIUS_KM)
+        delta_lon = math.degrees(
+            distance_km * math.sin(bearing) / (EARTH_RADIUS_KM * math.cos(math.radians(latitude)))
+        )
+        return latitude + delta_lat, longitude + delta_lon
+
+    def pickup_time(self):
+        """
+        A pickup in the last `days` days or later today, following the
+        weekday or weekend hourly demand profile.
+        """
+        rng = self.rng
+        day = self.today - timedelta(days=rng.randrange(self.days + 1))
+        hourly = WEEKEND_HOURLY if day.weekday() >= 5 else WEEKDAY_HOURLY
+        hour = rng.choices(range(24), weights=hourly)[0]
+        pickup = datetime.combine(day, time(hour), tzinfo=self.tzinfo)
+        return pickup + timedelta(seconds=rng.randrange(3600))
+
+    def timeline(self, pickup_time, trip_km):
+        """Time of each `FLOW` milestone for a ride."""
+        rng = self.rng
+        minute = timedelta(minutes=1)
+        duration = timedelta(hours=trip_km / rng.uniform(18, 40)) + 3 * minute
+        requested = pickup_time - rng.uniform(4, 15) * minute
+        # upcoming rides were requested before now
+        requested = min(requested, self.now - rng.uniform(0.5, 30) * minute)
+        # drivers are assigned and set off shortly before the pickup
+        assigned = max(requested + rng.uniform(0.2, 2) * minute, pickup_time - rng.uniform(15, 30) * minute)
+        en_route = max(assigned + rng.uniform(0.2, 1) * minute, pickup_time - rng.uniform(3, 12) * minute)
+        started = pickup_time + rng.uniform(0.5, 3) * minute
+        completed = started + duration
+        return (
+            requested,
+            assigned,
+            en_route,
+            pickup_time,
+            started,
+            completed - rng.uniform(1, 3) * minute,
+            completed,
+            completed + rng.uniform(0.1, 1) * minute,
+        )
+
+    def batch(self, index, first_ride_id, count, first_event_id):
+        """
+        Return `(rides, events)` rows for `count` rides. Each batch reseeds
+        from `(seed, index)`, so batches can be generated in any order or in
+        parallel and still produce the same data.
+        """
+        self.rng.seed(f'{self.seed}:{index}')
+        rides = []
+        events = []
+        for id_ride in range(first_ride_id, first_ride_id + count):
+            ride, ride_events = self.ride(id_ride, first_event_id)
+            rides.append(ride)
+            events.extend(self.event_row(event) for event in ride_events)
+            first_event_id += len(ride_events)
+        return rides, events
+
+    def ride(self, id_ride, first_event_id):
+        """
+        Return `(ride, events)` for one ride: the ride row and its event rows,
+        which use consecutive ids starting at `first_event_id`.
+        """
+        rng = self.rng
+        pickup_latitude, pickup_longitude = self.pickup_point()
+        trip_km = min(rng.lognormvariate(math.log(TRIP_MEDIAN_KM), TRIP_SIGMA), 60.0)
+        dropoff_latitude, dropoff_longitude = self.offset(
+            pickup_latitude, pickup_longitude, trip_km, rng.uniform(0, 2 * math.pi)
+        )
+        pickup_time = self.pickup_time()
+        times = self.timeline(pickup_time, trip_km)
+
+        if times[2] <= self.now and rng.random() < CANCELLED_SHARE:
+            status = 'cancelled'
+            cancelled_at = min(times[1] + timedelta(minutes=rng.uniform(0.5, 5)), self.now)
+            flow = [(FLOW[0], times[0]), (FLOW[1], times[1]), (rng.choice(CANCELLATIONS), cancelled_at)]
+        else:
+            reached = sum(1 for moment in times if moment <= self.now)
+            status = FLOW_STATUS[reached - 1]
+            flow = list(zip(FLOW[:reached], times[:reached]))
+
+        events = self.events(id_ride, first_event_id, flow)
+        recent = [event for event in events if event.created_at >= self.recent_cutoff]
+        ride = {
+            'id_ride': id_ride,
+            'status': status,
+            'id_rider_id': rng.choices(self.rider_ids, cum_weights=self.rider_weights)[0],
+            'id_driver_id': rng.choice(self.driver_ids),
+            'pickup_latitude': pickup_latitude,
+            'pickup_longitude': pickup_longitude,
+            'dropoff_latitude': dropoff_latitude,
+            'dropoff_longitude': dropoff_longitude,
+            'pickup_time': pickup_time,
+            'pickup_geohash': geohash.encode(pickup_latitude, pickup_longitude),
+            'recent_events': [recent_event_entry(event) for event in recent],
+            'recent_events_expire_at': min(event.created_at for event in recent) + self.window if recent else None,
+            'created_at': times[0],
+            'updated_at': events[-1].created_at if events else times[0],
+            'created_by_id': self.user_id,
+            'modified_by_id': self.user_id,
+        }
+        return ride, events
+
+    def events(self, id_ride, first_event_id, flow):
+        """
+        Pick `events_per_ride` events from the milestones reached so far,
+        keeping the first and latest ones, padded with incidents in between.
+        """
+        rng = self.rng
+        count = rng.randint(*self.events_per_ride)
+        if count < len(flow):
+            flow = flow[:max(count - 1, 0)] + flow[-1:] if count else []
+        else:
+            start = flow[0][1]
+            end = max(flow[-1][1], start)
+            flow = flow + [
+                (rng.choice(INCIDENTS), start + (end - start) * rng.random())
+                for _ in range(count - len(flow))
+            ]
+            flow.sort(key=lambda item: item[1])
+
+        return [
+            GeneratedEvent(first_event_id + offset, id_ride, description, created_at)
+            for offset, (description, created_at) in enumerate(flow)
+        ]
+
+    def event_row(self, event):
+        return {
+            'id_ride_event': event.id_ride_event,
+            'id_ride_id': event.id_ride_id,
+            'description': event.description,
+            'dedup_key': None,
+            'created_at': event.created_at,
+            'updated_at': event.created_at,
+            'created_by_id': self.user_id,
+            'modified_by_id': self.user_id,
+        }
+
+
+def _copy_text(value):
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _copy_converter(field):
+    """Converter of a field value to the COPY text format."""
+    internal_type = field.get_internal_type()
+    if internal_type == 'DateTimeField':
+        return lambda value: '\\N' if value is None else value.isoformat()
+    if internal_type == 'JSONField':
+        return lambda value: _copy_text(json.dumps(value))
+    if internal_type in ('CharField', 'TextField', 'EmailField'):
+        return lambda value: '\\N' if value is None else _copy_text(value)
+    if internal_type == 'FloatField':
+        return lambda value: '\\N' if value is None else repr(value)
+    return lambda value: '\\N' if value is None else str(value)
+
+
+class _CopyStream:
+    """File-like object feeding COPY FROM STDIN from an iterable of lines."""
+
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            try:
+                self.buffer += next(self.lines)
+            except StopIteration:
+                break
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def load_rows(model, rows, using='default'):
+    """
+    Insert generated rows (dicts keyed by attname, primary key included).
+    Postgres loads them with a single `COPY FROM STDIN`; other backends fall
+    back to one batched `INSERT`.
+    """
+    connection = connections[using]
+    fields = model._meta.concrete_fields
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            converters = [(field.attname, _copy_converter(field)) for field in fields]
+            lines = (
+                '\t'.join([convert(row[attname]) for attname, convert in converters]) + '\n'
+                for row in rows
+            )
+            sql = f'COPY {table} ({columns}) FROM STDIN'
+            if is_psycopg3:
+                with cursor.copy(sql) as copy:
+                    for line in lines:
+                        copy.write(line)
+            else:
+                cursor.copy_expert(sql, _CopyStream(lines))
+        else:
+            placeholders = ', '.join(['%s'] * len(fields))
+            cursor.executemany(
+                f'INSERT INTO {table} ({columns}) VALUES ({placeholders})',
+                [
+                    [field.get_db_prep_save(row[field.attname], connection) for field in fields]
+                    for row in rows
+                ]
+            )
+
+
+def reset_sequences(models, using='default'):
+    """Move the primary key sequences past the explicitly inserted ids."""
+    connection = connections[using]
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
@@ -0,0 +1,103 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import User as CustomUser
+
+ROLE_CLAIM = 'role'
+ID_USER_CLAIM = 'id_user'
+# Original issue time, to the microsecond; unlike `iat` (whole seconds) it is
+# copied from a refresh token to the access tokens minted from it, so
+# revocation also covers refreshed tokens.
+AUTH_TIME_CLAIM = 'auth_time'
+
+
+def add_role_claims(token, user, custom_user=None):
+    """
+    Embed the `core.models.User` role and id in a token so permission checks
+    can be answered without loading any user from the database.
+    """
+    if not settings.JWT_ROLE_CLAIMS:
+        return token
+
+    if custom_user is None:
+        custom_user = CustomUser.objects.filter(email=user.email).only('id_user', 'role').first()
+
+    token[AUTH_TIME_CLAIM] = token.current_time.timestamp()
+    if custom_user is not None:
+        token[ROLE_CLAIM] = custom_user.role
+        token[ID_USER_CLAIM] = custom_user.id_user
+    return token
+
+
+def get_tokens_for_user(user, custom_user=None):
+    """
+    Issue a refresh/access token pair for a Django auth user.
+    """
+    refresh = add_role_claims(RefreshToken.for_user(user), user, custom_user)
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+    }
+
+
+def _user_revocation_key(id_user):
+    return f'auth:revoked_before:{id_user}'
+
+
+def _token_revocation_key(jti):
+    return f'auth:revoked:{jti}'
+
+
+def _revocation_timeout():
+    # An access token minted from a refresh token about to expire outlives it
+    # by up to the access token lifetime
+    lifetime = settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME'] + settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME']
+    return int(lifetime.total_seconds())
+
+
+def revoke_user_tokens(id_user):
+    """
+    Invalidate every token issued so far for a `core.models.User`, for
+    instance after a role change.
+    """
+    cache.set(_user_revocation_key(id_user), time.time(), _revocation_timeout())
+
+
+def revoke_token(token):
+    """
+    Invalidate a single token by its `jti`.
+    """
+    cache.set(_token_revocation_key(token['jti']), 1, _revocation_timeout())
+
+
+def _revocation_keys(token):
+    return [_user_revocation_key(token.get(ID_USER_CLAIM)), _token_revocation_key(token.get('jti'))]
+
+
+def _is_revoked(token, revoked):
+    user_key, token_key = _revocation_keys(token)
+    if token_key in revoked:
+        return True
+    revoked_before = revoked.get(user_key)
+    issued_at = token.get(AUTH_TIME_CLAIM, token.get('iat'))
+    return revoked_before is not None and ID_USER_CLAIM in token and issued_at <= revoked_before
+
+
+def is_token_revoked(token):
+    """
+    Check a validated token against the revocations stored in the cache,
+    with a single cache round trip.
+    """
+    if not settings.JWT_REVOCATION_CHECK:
+        return False
+    return _is_revoked(token, cache.get_many(_revocation_keys(token)))
+
+
+async def ais_token_revoked(token):
+    """Async version of `is_token_revoked`."""
+    if not settings.JWT_REVOCATION_CHECK:
+        return False
+    return _is_revoked(token, await cache.aget_many(_revocation_keys(token)))
@@ -0,0 +1,260 @@
+"""
+GPS traces of rides.
+
+While a ride is active its location pings are appended, 16 bytes each, to a
+buffer of its own: a Redis string with a Redis cache, a `bytearray`
+otherwise. Once the ride is completed or cancelled the buffer is sorted,
+simplified with Douglas-Peucker and compressed into one `RideTrace` row.
+Each point is stored as the delta of its time (ms), latitude and longitude
+(1e-5 degree, ~1.1 m) from the previous point, zigzag and varint encoded:
+a ping every second of a city drive takes 3 to 5 bytes.
+"""
+import math
+import struct
+import threading
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+
+from core.models import RideTrace
+from core.utils.cache_helpers import get_redis_client
+from core.utils.location_helpers import EARTH_RADIUS_KM
+
+FINISHED_STATUSES = ('completed', 'cancelled')
+
+# time (ms since the epoch), latitude and longitude (1e-5 degree)
+PING = struct.Struct('<qii')
+SCALE = 100000
+
+FORMAT_VERSION = 1
+
+
+def to_point(recorded_at, latitude, longitude):
+    return int(recorded_at.timestamp() * 1000), round(latitude * SCALE), round(longitude * SCALE)
+
+
+def point_row(point):
+    time_ms, latitude, longitude = point
+    return {
+        'recorded_at': datetime.fromtimestamp(time_ms / 1000, dt_timezone.utc).isoformat(),
+        'latitude': latitude / SCALE,
+        'longitude': longitude / SCALE,
+    }
+
+
+def encode_trace(points):
+    """Compress `(time_ms, latitude, longitude)` points, in order."""
+    out = bytearray([FORMAT_VERSION])
+    previous = (0, 0, 0)
+    for point in points:
+        for value, last in zip(point, previous):
+            delta = value - last
+            # zigzag: small negative deltas stay small
+            delta = delta << 1 if delta >= 0 else (-delta << 1) - 1
+            while delta > 0x7f:
+                out.append(delta & 0x7f | 0x80)
+                delta >>= 7
+            out.append(delta)
+        previous = point
+    return bytes(out)
+
+
+def decode_trace(data):
+    """Yield the `(time_ms, latitude, longitude)` points of `encode_trace` data."""
+    data = bytes(data)
+    if not data:
+        return
+    if data[0] != FORMAT_VERSION:
+        raise ValueError(f'Unknown trace format {data[0]}.')
+    point = [0, 0, 0]
+    field = value = shift = 0
+    for byte in data[1:]:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        point[field] += value >> 1 if not value & 1 else -((value + 1) >> 1)
+        value = shift = 0
+        field += 1
+        if field == 3:
+            yield tuple(point)
+            field = 0
+
+
+def simplify(points, tolerance_m):
+    """
+    Douglas-Peucker: drop the points closer than `tolerance_m` to the
+    segment between the points kept around them. The first and last points
+    are always kept.
+    """
+    if tolerance_m <= 0 or len(points) < 3:
+        return points
+    # Local equirectangular projection in metres; traces span a city at most
+    meters = EARTH_RADIUS_KM * 1000 * math.pi / 180 / SCALE
+    x_scale = meters * math.cos(math.radians(points[0][1] / SCALE))
+    xs = [point[2] * x_scale for point in points]
+    ys = [point[1] * meters for point in points]
+
+    keep = bytearray(len(points))
+    keep[0] = keep[-1] = 1
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xs[first], ys[first]
+        dx, dy = xs[last] - ax, ys[last] - ay
+        length = dx * dx + dy * dy
+        farthest, index = 0.0, 0
+        for i in range(first + 1, last):
+            px, py = xs[i] - ax, ys[i] - ay
+            t = min(1.0, max(0.0, (px * dx + py * dy) / length)) if length else 0.0
+            distance = math.hypot(px - t * dx, py - t * dy)
+            if distance > farthest:
+                farthest, index = distance, i
+        if farthest > tolerance_m:
+            keep[index] = 1
+            stack.append((first, index))
+            stack.append((index, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+class RedisTraceBuffer:
+    """Pings appended to a Redis string per ride, expired if never finished."""
+
+    def __init__(self, client, prefix):
+        self.client = client
+        self.prefix = prefix
+
+    def append(self, id_ride, points):
+        key = f'{self.prefix}{id_ride}'
+        pipe = self.client.pipeline()
+        pipe.append(key, b''.join(PING.pack(*point) for point in points))
+        pipe.expire(key, settings.RIDE_TRACE_BUFFER_TTL_SECONDS)
+        return pipe.execute()[0] // PING.size
+
+    def read(self, id_rides):
+        values = self.client.mget([f'{self.prefix}{id_ride}' for id_ride in id_rides])
+        return {id_ride: value for id_ride, value in zip(id_rides, values) if value}
+
+    def take(self, id_rides):
+        """Read and delete buffers at once: pings appended afterwards start a new buffer."""
+        pipe = self.client.pipeline(transaction=False)
+        for id_ride in id_rides:
+            pipe.getdel(f'{self.prefix}{id_ride}')
+        return {id_ride: value for id_ride, value in zip(id_rides, pipe.execute()) if value}
+
+    def restore(self, buffered):
+        """Put back buffers taken with `take`, with the pings appended since."""
+        pipe = self.client.pipeline()
+        for id_ride, data in buffered.items():
+            key = f'{self.prefix}{id_ride}'
+            pipe.append(key, data)
+            pipe.expire(key, settings.RIDE_TRACE_BUFFER_TTL_SECONDS)
+        pipe.execute()
+
+
+class MemoryTraceBuffer:
+    """In-process stand-in for `RedisTraceBuffer`, without expiry."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffers = {}
+
+    def append(self, id_ride, points):
+        with self._lock:
+            buffer = self._buffers.setdefault(id_ride, bytearray())
+            for point in points:
+                buffer += PING.pack(*point)
+            return len(buffer) // PING.size
+
+    def read(self, id_rides):
+        with self._lock:
+            return {id_ride: bytes(self._buffers[id_ride]) for id_ride in id_rides if id_ride in self._buffers}
+
+    def take(self, id_rides):
+        with self._lock:
+            return {
+                id_ride: bytes(self._buffers.pop(id_ride)) for id_ride in id_rides if id_ride in self._buffers
+            }
+
+    def restore(self, buffered):
+        with self._lock:
+            for id_ride, data in buffered.items():
+                self._buffers.setdefault(id_ride, bytearray()).extend(data)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_trace_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            client = get_redis_client()
+            if client is not None:
+                _buffer = RedisTraceBuffer(client, settings.RIDE_TRACE_KEY_PREFIX)
+            else:
+                _buffer = MemoryTraceBuffer()
+        return _buffer
+
+
+def record_pings(id_ride, points):
+    """Buffer pings of an active ride. Returns the number of pings buffered for it."""
+    return get_trace_buffer().append(id_ride, points)
+
+
+def buffered_points(id_ride):
+    """Points buffered for an active ride, in time order."""
+    data = get_trace_buffer().read([id_ride]).get(id_ride, b'')
+    return sorted(PING.iter_unpack(data))
+
+
+def stored_points(trace):
+    return list(decode_trace(trace.points))
+
+
+def finalize_ride_traces(id_rides):
+    """
+    Compress the buffered pings of finished rides into their `RideTrace`.
+    The buffers are taken atomically, so pings arriving meanwhile are kept
+    for the next finish, and put back if the trace cannot be stored. A ride
+    finished again, e.g. after being reopened, has its new pings added to
+    its trace.
+    """
+    if not id_rides:
+        return
+    buffer = get_trace_buffer()
+    buffered = buffer.take(list(id_rides))
+    if not buffered:
+        return
+    try:
+        _store_traces(buffered)
+    except Exception:
+        buffer.restore(buffered)
+        raise
+
+
+def _store_traces(buffered):
+    with transaction.atomic():
+        existing = RideTrace.objects.select_for_update().in_bulk(list(buffered))
+        traces = []
+        for id_ride, data in buffered.items():
+            pings = list(PING.iter_unpack(data))
+            trace = existing.get(id_ride)
+            if trace is not None:
+                points = sorted(stored_points(trace) + pings)
+                ping_count = trace.ping_count + len(pings)
+            else:
+                points = sorted(pings)
+                ping_count = len(pings)
+            points = simplify(points, settings.RIDE_TRACE_SIMPLIFY_METERS)
+            traces.append(RideTrace(
+                id_ride_id=id_ride, points=encode_trace(points), point_count=len(points), ping_count=ping_count,
+                started_at=datetime.fromtimestamp(points[0][0] / 1000, dt_timezone.utc),
+                ended_at=datetime.fromtimestamp(points[-1][0] / 1000, dt_timezone.utc),
+            ))
+        RideTrace.objects.bulk_create(
+            traces, update_conflicts=True, unique_fields=['id_ride'],
+            update_fields=['points', 'point_count', 'ping_count', 'started_at', 'ended_at', 'updated_at'],
+        )
@@ -1,2 +1,10 @@
 from .ride_views import *
-from .auth_views import *
\ No newline at end of file
+from .auth_views import *
+from .async_views import *
+from .stats_views import *
+from .ingest_views import *
+from .push_views import *
+from .driver_views import *
+from .trace_views import *
+from .analytics_views import *
+from .distance_views import *
\ No newline at end of file
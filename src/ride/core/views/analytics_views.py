@@ -0,0 +1,27 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from core.serializers.analytics_serializers import RideAnalyticsSerializer
+from core.utils.rollup_helpers import ride_rollup_counts
+from core.views.ride_views import IsAdminRole
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminRole])
+def ride_analytics(request):
+    """
+    Ride counts by status, pickup hour and/or pickup cell (`group_by`), and
+    event counts by description, between `since` and `until`. Read from the
+    rollup tables, never from the ride table.
+    """
+    serializer = RideAnalyticsSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    params = serializer.validated_data
+    return Response({
+        'since': params['since'],
+        'until': params['until'],
+        'group_by': params['group_by'],
+        **ride_rollup_counts(
+            params['since'], params['until'], params['group_by'], params.get('status'), params.get('cell')
+        ),
+    })
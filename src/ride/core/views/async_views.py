@@ -0,0 +1,208 @@
+"""
+Async (ASGI) read endpoints for rides and ride events.
+
+They return the same JSON as the list/retrieve actions of `RideViewSet` and
+`RideEventViewSet`, but authentication, permission checks and queries are
+awaited (`aget`, `aiterator`, `acount`) instead of holding a worker thread
+for the whole request, so one ASGI worker can keep many slow clients
+connected at once.
+"""
+import asyncio
+import weakref
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework import status as http_status
+from rest_framework.exceptions import (
+    APIException, AuthenticationFailed, MethodNotAllowed, NotAuthenticated, NotFound, PermissionDenied,
+    ValidationError
+)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from core.models import Ride, RideEvent, User
+from core.serializers import FastRideSerializer, RideEventSerializer, RideSerializer
+from core.utils.authentication import RoleClaimsJWTAuthentication
+from core.utils.fieldset_helpers import parse_fieldset, restrict_queryset_to_fieldset
+from core.views.pagination import StandardResultsSetPagination
+from core.views.ride_views import IsAdminRole
+
+authenticator = RoleClaimsJWTAuthentication()
+permission = IsAdminRole()
+
+# event loop -> semaphore bounding its requests that hold a database connection
+_db_slots = weakref.WeakKeyDictionary()
+
+
+def db_slots():
+    loop = asyncio.get_running_loop()
+    if loop not in _db_slots:
+        _db_slots[loop] = asyncio.Semaphore(settings.ASYNC_DB_CONCURRENCY)
+    return _db_slots[loop]
+
+
+def release_connections():
+    """
+    Close the database connections of the current request once its data is
+    read. Each ASGI request runs its queries in a thread of its own, so its
+    connection could not be reused by another request anyway (with
+    `DATABASE_POOL`, closing returns it to the pool). Releasing it early
+    means a slow client does not hold it while the response is sent.
+    """
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+def async_api_view(view):
+    """
+    Run an async GET view behind the JWT authentication and `IsAdminRole`,
+    and render the returned data, or the raised `APIException`, as JSON the
+    way the DRF views do.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            if request.method != 'GET':
+                raise MethodNotAllowed(request.method)
+            async with db_slots():
+                try:
+                    await authenticate(request)
+                    data = await view(request, *args, **kwargs)
+                finally:
+                    await sync_to_async(release_connections)()
+        except APIException as exc:
+            return exception_response(request, exc)
+        return HttpResponse(JSONRenderer().render(data), content_type='application/json')
+
+    return wrapper
+
+
+def exception_response(request, exc):
+    """Render an `APIException` as JSON, with the status and headers DRF uses."""
+    headers = {}
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    status = exc.status_code
+    if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+        status = http_status.HTTP_401_UNAUTHORIZED
+        headers['WWW-Authenticate'] = authenticator.authenticate_header(request)
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status, headers=headers)
+
+
+async def authenticate(request):
+    result = await authenticator.aauthenticate(request)
+    if result is None:
+        raise NotAuthenticated()
+    request.user, request.auth = result
+    if not await permission.ahas_permission(request, None):
+        raise PermissionDenied(permission.message)
+
+
+def clean_param(params, name, field):
+    """Validate an optional query param with a form field, as django-filter does."""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return field.clean(value)
+    except DjangoValidationError as exc:
+        raise ValidationError({name: exc.messages})
+
+
+async def paginate(request, queryset, serializer):
+    """
+    Page-number pagination by `StandardResultsSetPagination`, the one of the
+    DRF lists: same limits, count logic, links and response shape.
+    """
+    pagination = StandardResultsSetPagination()
+    rows = await pagination.apaginate_queryset(queryset, Request(request))
+    return pagination.get_paginated_data(serializer(rows).data)
+
+
+def ride_queryset(request):
+    queryset = Ride.objects.select_related('id_rider', 'id_driver')
+    fieldset = parse_fieldset(request.GET, RideSerializer)
+    if fieldset:
+        # `pickup_time` is the sort key of the list
+        queryset = restrict_queryset_to_fieldset(queryset, RideSerializer(**fieldset), ('pickup_time',))
+    return queryset, fieldset
+
+
+def ride_event_queryset(request):
+    queryset = RideEvent.objects.all()
+    fieldset = parse_fieldset(request.GET, RideEventSerializer)
+    if fieldset:
+        queryset = restrict_queryset_to_fieldset(queryset, RideEventSerializer(**fieldset), ())
+    return queryset, fieldset
+
+
+@async_api_view
+async def async_ride_list(request):
+    """
+    Rides, newest pickup first, filtered by `status` and `rider_email` and
+    ordered by `ordering=pickup_time|-pickup_time`.
+    """
+    params = request.GET
+    queryset, fieldset = ride_queryset(request)
+
+    status = clean_param(params, 'status', forms.ChoiceField(choices=Ride.STATUS_CHOICES))
+    if status:
+        queryset = queryset.filter(status=status)
+
+    email = params.get('rider_email')
+    if email:
+        id_rider = await User.objects.filter(email=email).values_list('id_user', flat=True).afirst()
+        queryset = queryset.filter(id_rider=id_rider) if id_rider is not None else queryset.none()
+
+    ordering = params.get('ordering')
+    if ordering not in ('pickup_time', '-pickup_time'):
+        ordering = '-pickup_time'
+    queryset = queryset.order_by(ordering, ordering.replace('pickup_time', 'id_ride'))
+
+    return await paginate(request, queryset, lambda rides: FastRideSerializer(rides, many=True, **fieldset))
+
+
+@async_api_view
+async def async_ride_detail(request, pk):
+    queryset, fieldset = ride_queryset(request)
+    try:
+        ride = await queryset.aget(pk=pk)
+    except Ride.DoesNotExist:
+        raise NotFound('No Ride matches the given query.')
+    return FastRideSerializer(ride, **fieldset).data
+
+
+@async_api_view
+async def async_ride_event_list(request):
+    """
+    Ride events, newest first, filtered by `id_ride`, `created_at__gte` and
+    `created_at__lt`.
+    """
+    params = request.GET
+    queryset, fieldset = ride_event_queryset(request)
+
+    id_ride = clean_param(params, 'id_ride', forms.IntegerField())
+    if id_ride is not None:
+        queryset = queryset.filter(id_ride=id_ride)
+    for lookup in ('created_at__gte', 'created_at__lt'):
+        value = clean_param(params, lookup, forms.DateTimeField())
+        if value is not None:
+            queryset = queryset.filter(**{lookup: value})
+
+    queryset = queryset.order_by('id_ride_event')
+    return await paginate(request, queryset, lambda events: RideEventSerializer(events, many=True, **fieldset))
+
+
+@async_api_view
+async def async_ride_event_detail(request, pk):
+    queryset, fieldset = ride_event_queryset(request)
+    try:
+        event = await queryset.aget(pk=pk)
+    except RideEvent.DoesNotExist:
+        raise NotFound('No RideEvent matches the given query.')
+    return RideEventSerializer(event, **fieldset).data
@@ -3,9 +3,11 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView
 
 from core.models import User as CustomUser
+from core.serializers import RoleTokenObtainPairSerializer
+from core.utils.token_helpers import get_tokens_for_user
 
 User = get_user_model()
 
@@ -50,7 +52,7 @@ def register_user(request):
     )
     
     # Generate tokens
-    refresh = RefreshToken.for_user(user)
+    tokens = get_tokens_for_user(user, cu)
     
     return Response({
         'user': {
@@ -59,8 +61,12 @@ def register_user(request):
             'email': user.email,
             'role': getattr(cu, 'role', None)
         },
-        'tokens': {
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
-        }
-    }, status=status.HTTP_201_CREATED)
\ No newline at end of file
+        'tokens': tokens
+    }, status=status.HTTP_201_CREATED)
+
+
+class RoleTokenObtainPairView(TokenObtainPairView):
+    """
+    Obtain a JWT token pair carrying the user's role claims
+    """
+    serializer_class = RoleTokenObtainPairSerializer
\ No newline at end of file
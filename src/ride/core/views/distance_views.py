@@ -0,0 +1,24 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from core.serializers.distance_serializers import DistanceMatrixSerializer
+from core.utils.location_helpers import distance_matrix, nearest_destinations
+from core.views.ride_views import IsAdminRole
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminRole])
+def batch_distance_matrix(request):
+    """
+    Haversine distances in km between `origins` and `destinations` (lists
+    of `[latitude, longitude]`): the full matrix, one row per origin, or
+    with `k` the indexes of the `k` closest destinations of each origin and
+    their distances, closest first.
+    """
+    serializer = DistanceMatrixSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+    if 'k' not in data:
+        return Response({'distances_km': distance_matrix(data['origins'], data['destinations']).round(3).tolist()})
+    indexes, distances = nearest_destinations(data['origins'], data['destinations'], data['k'])
+    return Response({'indexes': indexes.tolist(), 'distances_km': distances.round(3).tolist()})
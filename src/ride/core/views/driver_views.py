@@ -0,0 +1,64 @@
+from rest_framework import status as http_status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
+
+from core.models import User
+from core.serializers.driver_serializers import DriverLocationSerializer, NearestDriversSerializer
+from core.utils.driver_helpers import nearest_drivers, report_driver_location
+from core.utils.token_helpers import ID_USER_CLAIM, ROLE_CLAIM
+from core.views.ride_views import IsAdminRole
+
+
+def driver_claim(request):
+    """Id of the driver a token was issued to, from its claims."""
+    if request.auth is not None and request.auth.get(ROLE_CLAIM) == 'driver':
+        return request.auth.get(ID_USER_CLAIM)
+    return None
+
+
+class IsDriverOrAdminRole(BasePermission):
+    """
+    Drivers, identified by the role claim of their token, and admins.
+    """
+    message = "Only drivers and users with admin role are allowed to perform this action."
+
+    def has_permission(self, request, view):
+        return driver_claim(request) is not None or IsAdminRole().has_permission(request, view)
+
+
+@api_view(['POST'])
+@permission_classes([IsDriverOrAdminRole])
+def driver_location(request):
+    """
+    Report the position of a driver, or with `available: false` that they
+    stopped taking rides. Drivers report their own position; admins give
+    `id_driver`. Nothing is written to the database.
+    """
+    serializer = DriverLocationSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+
+    id_driver = driver_claim(request)
+    if id_driver is None:
+        id_driver = data.get('id_driver')
+        if id_driver is None:
+            raise ValidationError({'id_driver': ['This field is required.']})
+        if not User.objects.filter(id_user=id_driver, role='driver').exists():
+            raise ValidationError({'id_driver': [f'Driver {id_driver} does not exist.']})
+
+    report_driver_location(id_driver, data['latitude'], data['longitude'], data['available'])
+    return Response(status=http_status.HTTP_204_NO_CONTENT)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminRole])
+def nearest_available_drivers(request):
+    """
+    The `k` available drivers closest to `latitude`/`longitude` within
+    `radius_km`, closest first, searched in the driver index of this process.
+    """
+    serializer = NearestDriversSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    return Response(nearest_drivers(**serializer.validated_data))
@@ -0,0 +1,38 @@
+from rest_framework import status as http_status
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+
+from core.utils.ingest_helpers import ingest_ride_events, ingest_stats
+from core.utils.parsers import NDJSONParser
+from core.views.ride_views import IsAdminRole
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminRole])
+@parser_classes([JSONParser, NDJSONParser])
+def ride_event_ingest(request):
+    """
+    Queue ride events (one object, a JSON array or NDJSON) for the
+    `drain_ride_events` worker and answer 202 without waiting for the
+    database. Events repeating a recent `dedup_key` are reported as
+    duplicates; invalid ones by index.
+    """
+    items = request.data if isinstance(request.data, list) else [request.data]
+    data = ingest_ride_events(items, request.user.id)
+    if not data['errors']:
+        status = http_status.HTTP_202_ACCEPTED
+    elif data['accepted'] or data['duplicates']:
+        status = http_status.HTTP_207_MULTI_STATUS
+    else:
+        status = http_status.HTTP_400_BAD_REQUEST
+    return Response(data, status=status)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminRole])
+def ride_event_ingest_stats(request):
+    """
+    Lag of the ride event ingestion stream
+    """
+    return Response(ingest_stats())
@@ -0,0 +1,75 @@
+from rest_framework.permissions import SAFE_METHODS
+
+from core.utils.db_router import (
+    is_pinned_to_primary, pick_replica, pin_to_primary, reset_read_database, use_read_database
+)
+from core.utils.fieldset_helpers import parse_fieldset, restrict_queryset_to_fieldset
+
+
+class SparseFieldsetMixin:
+    """
+    Lets clients pick the fields of read responses with `?fields=a,b` and
+    `?<nested>.fields=c,d`. The requested fields prune the serializer and
+    drive the query: only their columns are loaded and only the relations
+    they need are joined.
+    """
+    # Fields loaded even when not requested (e.g. needed for pagination)
+    sparse_required_fields = ()
+
+    def get_fieldset_kwargs(self):
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return {}
+        return parse_fieldset(self.request.query_params, self.serializer_class)
+
+    def get_serializer(self, *args, **kwargs):
+        for key, value in self.get_fieldset_kwargs().items():
+            kwargs.setdefault(key, value)
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fieldset = self.get_fieldset_kwargs()
+        if not fieldset:
+            return queryset
+        return restrict_queryset_to_fieldset(
+            queryset, self.serializer_class(**fieldset), self.sparse_required_fields
+        )
+
+
+class ReplicaReadMixin:
+    """
+    Serves the safe requests of a view from a read replica. After a
+    successful write the user is pinned to the primary for
+    `REPLICA_PIN_SECONDS` (read-your-writes). Authentication and permission
+    checks run before the replica is picked, so they read from the primary.
+    """
+    pinned_to_primary = False
+    _read_database_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method not in SAFE_METHODS:
+            return
+        self.pinned_to_primary = is_pinned_to_primary(request.user)
+        replica = None if self.pinned_to_primary else pick_replica()
+        if replica is not None:
+            self._read_database_token = use_read_database(replica)
+
+    def read_from_primary(self):
+        """Send the remaining reads of the current request to the primary."""
+        if self._read_database_token is not None:
+            reset_read_database(self._read_database_token)
+            self._read_database_token = None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self._read_database_token is not None:
+                reset_read_database(self._read_database_token)
+                self._read_database_token = None
@@ -0,0 +1,250 @@
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from core.utils.count_helpers import CountingPaginator, get_count_cache_key
+
+
+class StandardResultsSetPagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    django_paginator_class = CountingPaginator
+
+    # query params that do not change which rows are counted
+    count_ignored_params = ('page', 'page_size', 'ordering', 'pagination', 'cursor', 'html', 'format')
+
+    def get_paginator(self, queryset, request):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        params = request.query_params.copy()
+        for param in self.count_ignored_params:
+            params.pop(param, None)
+        return self.django_paginator_class(
+            queryset, page_size, count_cache_key=get_count_cache_key(queryset, params)
+        )
+
+    def invalid_page(self, page_number, exc):
+        msg = self.invalid_page_message.format(
+            page_number=page_number, message=str(exc)
+        )
+        return NotFound(msg)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = self.get_paginator(queryset, request)
+        if paginator is None:
+            return None
+        page_number = self.get_page_number(request, paginator)
+
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise self.invalid_page(page_number, exc)
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+
+        return list(self.page)
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        `paginate_queryset` for the async views: the page is read with
+        `aiterator()` and the total with `aget_list_count`.
+        """
+        self.request = request
+        paginator = self.get_paginator(queryset, request)
+        # counted first, so `page=last` does not count synchronously
+        await paginator.acount()
+        page_number = self.get_page_number(request, paginator)
+
+        try:
+            self.page = await paginator.apage(page_number)
+        except InvalidPage as exc:
+            raise self.invalid_page(page_number, exc)
+        return list(self.page)
+
+    def get_paginated_data(self, data):
+        return {
+            'count': self.page.paginator.count,
+            'count_is_estimate': self.page.paginator.count_is_estimate,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        }
+
+    # Add this method to ensure pagination is being respected
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+
+class NearbyPagination(BasePagination):
+    """
+    The single page of the nearby mode: the `limit` rides closest to the
+    position. There are no further pages and `count` is the number of
+    rides returned.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page = list(queryset[:self.limit])
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': len(self.page),
+            'count_is_estimate': False,
+            'next': None,
+            'previous': None,
+            'results': data
+        })
+
+
+class RideCursorPagination(BasePagination):
+    """
+    Keyset (cursor) pagination for the ride list.
+
+    Instead of OFFSET/COUNT, each page is fetched with a seek predicate on the
+    last row of the previous page: `(sort_value, id_ride)` is compared against
+    the cursor, with `id_ride` as a stable tie-breaker. Page N therefore costs
+    the same as page 1 and no count query is issued.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    # requested ordering -> (sort field, tie-breaker field)
+    orderings = {
+        '-pickup_time': ('-pickup_time', '-id_ride'),
+        'pickup_time': ('pickup_time', 'id_ride'),
+        'distance_to_pickup': ('distance_to_pickup', 'id_ride'),
+    }
+    default_ordering = '-pickup_time'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering_key = self.get_ordering_key(request, queryset)
+        cursor = self.decode_cursor(request)
+
+        reverse = bool(cursor and cursor['r'])
+        ordering = self.orderings[self.ordering_key]
+        if reverse:
+            ordering = tuple(_invert(field) for field in ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None:
+            queryset = queryset.filter(self._seek_filter(ordering, cursor))
+
+        # Fetch one extra row to know whether there is another page
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering_key(self, request, queryset):
+        ordering = request.query_params.get('ordering') or self.default_ordering
+        if ordering not in self.orderings:
+            return self.default_ordering
+        # Distance ordering is only possible when the view annotated it
+        if ordering == 'distance_to_pickup' and 'distance_to_pickup' not in queryset.query.annotations:
+            return self.default_ordering
+        return ordering
+
+    def _seek_filter(self, ordering, cursor):
+        sort_field, tie_field = (field.lstrip('-') for field in ordering)
+        descending = ordering[0].startswith('-')
+        op = 'lt' if descending else 'gt'
+        value = cursor['v']
+        # Equivalent to (sort, id) > (value, id) but keeps a plain range bound
+        # on the sort column so an index on (sort, id) can be used.
+        return (
+            Q(**{f'{sort_field}__{op}e': value}) &
+            (Q(**{f'{sort_field}__{op}': value}) | Q(**{f'{tie_field}__{op}': cursor['id']}))
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii'), altchars=b'-_').decode('utf-8'))
+            if cursor['o'] != self.ordering_key:
+                raise ValueError('Cursor ordering does not match the requested ordering')
+            value = cursor['v']
+            if self.ordering_key.endswith('pickup_time'):
+                value = parse_datetime(value)
+                if value is None:
+                    raise ValueError('Invalid cursor position')
+            else:
+                value = float(value)
+            return {'v': value, 'id': int(cursor['id']), 'r': bool(cursor.get('r'))}
+        except (TypeError, ValueError, KeyError, UnicodeError, BinasciiError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance, reverse):
+        value = getattr(instance, self.ordering_key.lstrip('-'))
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        payload = {'o': self.ordering_key, 'v': value, 'id': instance.id_ride, 'r': int(reverse)}
+        encoded = b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'), altchars=b'-_')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
+
+
+def _invert(field):
+    return field[1:] if field.startswith('-') else '-' + field
@@ -0,0 +1,96 @@
+"""
+Server-sent events (ASGI) pushing ride changes to the clients that would
+otherwise poll the ride list.
+"""
+import asyncio
+import json
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import APIException, MethodNotAllowed, ValidationError
+
+from core.models import Ride
+from core.utils.push_helpers import CHANNEL_KINDS, OVERFLOW, get_hub
+from core.views.async_views import authenticate, db_slots, exception_response, release_connections
+
+STATUSES = {status for status, _ in Ride.STATUS_CHOICES}
+
+
+def subscription_channels(params):
+    """
+    Channels requested with `ride`, `rider` and `status`, each repeated or
+    comma-separated.
+    """
+    channels = []
+    errors = {}
+    for kind in CHANNEL_KINDS:
+        for value in (value for param in params.getlist(kind) for value in param.split(',') if value):
+            valid = value in STATUSES if kind == 'status' else value.isdigit()
+            if valid:
+                channels.append(f'{kind}:{value}')
+            else:
+                errors.setdefault(kind, []).append(f'Invalid value "{value}".')
+    if errors:
+        raise ValidationError(errors)
+    if not channels:
+        raise ValidationError({'detail': f'Subscribe to at least one of: {", ".join(CHANNEL_KINDS)}.'})
+    channels = list(dict.fromkeys(channels))
+    if len(channels) > settings.PUSH_MAX_CHANNELS:
+        raise ValidationError({'detail': f'At most {settings.PUSH_MAX_CHANNELS} channels per connection.'})
+    return channels
+
+
+def sse(event, data):
+    return f'event: {event}\ndata: {data}\n\n'
+
+
+async def event_stream(channels):
+    hub = get_hub()
+    queue = asyncio.Queue(maxsize=settings.PUSH_QUEUE_SIZE)
+    await hub.subscribe(queue, channels)
+    try:
+        yield 'retry: 3000\n' + sse('subscribed', json.dumps({'channels': channels}))
+        # A delta is published on every channel of its ride; send it once
+        sent = deque(maxlen=64)
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), settings.PUSH_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+                continue
+            if item is OVERFLOW:
+                yield sse('overflow', '{}')
+                return
+            message_id, kind, payload = item
+            if message_id not in sent:
+                sent.append(message_id)
+                yield sse(kind, payload)
+    finally:
+        await hub.unsubscribe(queue, channels)
+
+
+async def ride_push(request):
+    """
+    Stream `ride.status` and `ride.event` deltas of the subscribed rides
+    (`ride=<id_ride>`), riders (`rider=<id_user>`) and statuses
+    (`status=<status>`) as server-sent events. After an `overflow` event
+    the stream ends and the client should reload from the API.
+    """
+    try:
+        if request.method != 'GET':
+            raise MethodNotAllowed(request.method)
+        async with db_slots():
+            try:
+                await authenticate(request)
+            finally:
+                await sync_to_async(release_connections)()
+        channels = subscription_channels(request.GET)
+    except APIException as exc:
+        return exception_response(request, exc)
+    return StreamingHttpResponse(
+        event_stream(channels), content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
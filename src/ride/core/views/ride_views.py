@@ -1,29 +1,25 @@
+import math
+from django.conf import settings
 from rest_framework import viewsets, renderers, filters
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import BasePermission
 from rest_framework.response import Response
-from django.utils import timezone
-from datetime import timedelta
-from django.db.models import Prefetch
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import _positive_int
 from django_filters.rest_framework import DjangoFilterBackend
 
 from core.serializers import *
 from core.models import *
-from core.utils.location_helpers import calculate_distance_annotation
-
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
-
-    # Add this method to ensure pagination is being respected
-    def get_paginated_response(self, data):
-        return Response({
-            'count': self.page.paginator.count,
-            'next': self.get_next_link(),
-            'previous': self.get_previous_link(),
-            'results': data
-        })
+from core.utils.token_helpers import ROLE_CLAIM
+from core.utils.cache_helpers import get_cached_ride_list, set_cached_ride_list
+from core.utils.location_helpers import calculate_distance_annotation, filter_within_radius, nearest_rides
+from core.utils.export_helpers import export_queryset
+from core.utils.bulk_helpers import bulk_write_response, bulk_write_ride_events, bulk_write_rides
+from core.utils.parsers import NDJSONParser
+from core.views.mixins import ReplicaReadMixin, SparseFieldsetMixin
+from core.views.pagination import NearbyPagination, StandardResultsSetPagination, RideCursorPagination
+
 
 class IsAdminRole(BasePermission):
     """
@@ -35,6 +31,10 @@ class IsAdminRole(BasePermission):
         # Check if user is authenticated
         if not request.user.is_authenticated:
             return False
+
+        # Answer from the validated token when the role was embedded at issue time
+        if request.auth is not None and ROLE_CLAIM in request.auth:
+            return request.auth[ROLE_CLAIM] == 'admin'
             
         try:
             custom_user = User.objects.get(email=request.user.email)
@@ -42,26 +42,42 @@ class IsAdminRole(BasePermission):
         except User.DoesNotExist:
             return False
 
-class RideViewSet(viewsets.ModelViewSet):
+    async def ahas_permission(self, request, view):
+        # Same check for the async views, with the fallback lookup awaited
+        if not request.user.is_authenticated:
+            return False
+
+        if request.auth is not None and ROLE_CLAIM in request.auth:
+            return request.auth[ROLE_CLAIM] == 'admin'
+
+        role = await User.objects.filter(email=request.user.email).values_list('role', flat=True).afirst()
+        return role == 'admin'
+
+class RideViewSet(ReplicaReadMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
 
     serializer_class = RideSerializer
+    read_serializer_class = FastRideSerializer
     pagination_class = StandardResultsSetPagination
+    cursor_pagination_class = RideCursorPagination
+    nearby_limit = None
+    # sort keys of the cursor pagination
+    sparse_required_fields = ('pickup_time',)
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['status']
     ordering_fields = ['pickup_time', 'distance_to_pickup']
     permission_classes = [IsAdminRole]
 
-    def get_queryset(self):
+    def get_base_queryset(self):
 
-        queryset = Ride.objects.select_related('id_rider', 'id_driver')
+        # today's events are read from the denormalized `recent_events` column
+        return Ride.objects.select_related('id_rider', 'id_driver')
 
-        # getting today events
-        twenty_four_hours_ago = timezone.now() - timedelta(hours=24)
-        queryset = queryset.prefetch_related(Prefetch(
-            'ride_events',
-            queryset=RideEvent.objects.filter(created_at__gte=twenty_four_hours_ago),
-            to_attr='prefetched_todays_events'
-        ))
+    def get_rider_queryset(self):
+        """
+        The base queryset, restricted to the rider of `rider_email` when
+        given. Every ride read starts from it.
+        """
+        queryset = self.get_base_queryset()
 
         # apply filters based on email if provided
         email = self.request.query_params.get('rider_email', None)
@@ -71,11 +87,17 @@ class RideViewSet(viewsets.ModelViewSet):
                 queryset = queryset.filter(id_rider=user.id_user)
             except User.DoesNotExist:
                 return Ride.objects.none()
+        return queryset
+
+    def get_queryset(self):
+
+        queryset = self.get_rider_queryset()
 
 
         # Check if we need to sort by distance to a specific location
         latitude = self.request.query_params.get('latitude')
         longitude = self.request.query_params.get('longitude')
+        ordering = self.request.query_params.get('ordering')
         
         if latitude and longitude:
             try:
@@ -84,12 +106,20 @@ class RideViewSet(viewsets.ModelViewSet):
                 lon_float = float(longitude)
                 
                 if -90 <= lat_float <= 90 and -180 <= lon_float <= 180:
-                    # Add distance annotation for sorting
-                    distance_annotation = calculate_distance_annotation(lat_float, lon_float)
-                    queryset = queryset.annotate(distance_to_pickup=distance_annotation)
+                    radius_km = self.get_radius_km()
+                    if radius_km:
+                        # Nearby mode: bounding box prefilter, exact distance only for the survivors
+                        queryset = filter_within_radius(queryset, lat_float, lon_float, radius_km)
+                        self.nearby_limit = self.get_nearby_limit()
+                        if not ordering:
+                            return queryset.order_by('distance_to_pickup', 'id_ride')
+                    else:
+                        # Add distance annotation for sorting
+                        distance_annotation = calculate_distance_annotation(lat_float, lon_float)
+                        queryset = queryset.annotate(distance_to_pickup=distance_annotation)
                     
                     # Let the ordering filter handle this
-                    if self.request.query_params.get('ordering') == 'distance_to_pickup':
+                    if ordering == 'distance_to_pickup':
                         queryset = queryset.order_by('distance_to_pickup')
                         
             except (ValueError, TypeError):
@@ -97,31 +127,158 @@ class RideViewSet(viewsets.ModelViewSet):
                 pass
         
         # Default ordering if no specific ordering is requested
-        ordering = self.request.query_params.get('ordering')
         if not ordering:
             queryset = queryset.order_by('-pickup_time')
 
         return queryset
 
+    def get_serializer_class(self):
+        # Read-only responses use the compiled serializer, which renders the
+        # same JSON; the browsable API needs the full serializer for its forms
+        if (
+            settings.FAST_READ_SERIALIZERS
+            and self.action in ('list', 'retrieve', 'nearest', 'export')
+            and 'html' not in self.request.query_params
+        ):
+            return self.read_serializer_class
+        return super().get_serializer_class()
+
+    def get_radius_km(self):
+        """
+        Search radius for the nearby mode, or None when not requested or invalid.
+        """
+        try:
+            radius_km = float(self.request.query_params.get('radius_km', ''))
+        except ValueError:
+            return None
+        return radius_km if 0 < radius_km < math.inf else None
+
+    def get_nearby_limit(self):
+        try:
+            return _positive_int(
+                self.request.query_params['limit'],
+                strict=True,
+                cutoff=self.pagination_class.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.pagination_class.page_size
+
+    def list(self, request, *args, **kwargs):
+        # Serve repeated list queries from the cache until a write invalidates them.
+        # Users pinned to the primary skip it, so they read their own writes
+        if self.pinned_to_primary:
+            return super().list(request, *args, **kwargs)
+        cache_key, data = get_cached_ride_list(request.query_params)
+        if data is not None:
+            return Response(data)
+
+        if cache_key is not None:
+            # Entries are only filled from the primary: rows read from a lagging
+            # replica would be stored under the generation of a newer write
+            self.read_from_primary()
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            set_cached_ride_list(cache_key, response.data)
+        return response
+
+    @action(detail=False, methods=['get'])
+    def nearest(self, request):
+        """
+        The `k` rides with the closest pickup to `latitude`/`longitude`,
+        found through the geohash cell index instead of sorting every ride.
+        """
+        try:
+            lat_float = float(request.query_params['latitude'])
+            lon_float = float(request.query_params['longitude'])
+        except (KeyError, ValueError):
+            raise ValidationError({'detail': 'Valid latitude and longitude are required.'})
+        if not (-90 <= lat_float <= 90 and -180 <= lon_float <= 180):
+            raise ValidationError({'detail': 'Valid latitude and longitude are required.'})
+
+        try:
+            k = _positive_int(request.query_params['k'], strict=True, cutoff=self.pagination_class.max_page_size)
+        except (KeyError, ValueError):
+            k = self.pagination_class.page_size
+
+        queryset = DjangoFilterBackend().filter_queryset(request, self.get_rider_queryset(), self)
+        rides = nearest_rides(queryset, lat_float, lon_float, k)
+        serializer = self.get_serializer(rides, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream every ride matching the list filters as NDJSON (default) or
+        CSV (`?output=csv`), read through a server-side cursor.
+        """
+        return export_queryset(self, request, 'rides')
+
+    @action(detail=False, methods=['post', 'patch'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Create (POST) or update (PATCH) rides from a JSON array or NDJSON
+        body. Valid items are written in one transaction; invalid ones are
+        reported by index.
+        """
+        return bulk_write_response(request, bulk_write_rides, 'id_ride')
+
+    @property
+    def paginator(self):
+        """
+        Page-number pagination by default; keyset pagination when the client
+        asks for it with `?pagination=cursor` or is following a `cursor` link.
+        The nearby mode lists at most `limit` rides, closest first, in one
+        page; detail actions and exports are not limited.
+        """
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if self.nearby_limit:
+                self._paginator = NearbyPagination(self.nearby_limit)
+            elif params.get('pagination') == 'cursor' or self.cursor_pagination_class.cursor_query_param in params:
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_renderers(self):
         if 'html' in self.request.query_params:
             return [renderers.BrowsableAPIRenderer()]
         return [renderers.JSONRenderer()]
     
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ReplicaReadMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows users to be viewed or edited.
     Only users with admin privileges can access this viewset.
     """
-    queryset = User.objects.all()
+    queryset = User.objects.order_by('id_user')
     serializer_class = UserSerializer
+    pagination_class = StandardResultsSetPagination
     permission_classes = [IsAdminRole]
 
-class RideEventViewSet(viewsets.ModelViewSet):
+class RideEventViewSet(ReplicaReadMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows ride events to be viewed or edited.
     Only users with admin privileges can access this viewset.
     """
-    queryset = RideEvent.objects.all()
+    queryset = RideEvent.objects.order_by('id_ride_event')
     serializer_class = RideEventSerializer
-    permission_classes = [IsAdminRole]
\ No newline at end of file
+    pagination_class = StandardResultsSetPagination
+    filterset_fields = {'id_ride': ['exact'], 'created_at': ['gte', 'lt']}
+    permission_classes = [IsAdminRole]
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream every ride event matching the filters as NDJSON (default) or
+        CSV (`?output=csv`), read through a server-side cursor.
+        """
+        return export_queryset(self, request, 'ride-events')
+
+    @action(detail=False, methods=['post', 'patch'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Create (POST) or update (PATCH) ride events from a JSON array or
+        NDJSON body. Valid items are written in one transaction; invalid ones
+        are reported by index.
+        """
+        return bulk_write_response(request, bulk_write_ride_events, 'id_ride_event')
\ No newline at end of file
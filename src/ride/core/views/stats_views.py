@@ -0,0 +1,19 @@
+from django.conf import settings
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from core.utils.pool_helpers import database_stats, redis_pool_stats
+from core.views.ride_views import IsAdminRole
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminRole])
+def pool_stats(request):
+    """
+    Database and Redis connection pool statistics of the worker process that
+    serves the request, plus the app's connections on the Postgres server
+    """
+    return Response({
+        'databases': [database_stats(alias) for alias in settings.DATABASES],
+        'redis': redis_pool_stats(),
+    })
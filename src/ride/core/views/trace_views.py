@@ -0,0 +1,87 @@
+from django.utils import timezone
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
+
+from core.models import Ride, RideTrace
+from core.serializers.trace_serializers import TracePingSerializer, TraceReplaySerializer
+from core.utils.export_helpers import export_response
+from core.utils.parsers import NDJSONParser
+from core.utils.trace_helpers import (
+    FINISHED_STATUSES, buffered_points, point_row, record_pings, simplify, stored_points, to_point
+)
+from core.views.driver_views import IsDriverOrAdminRole, driver_claim
+from core.views.ride_views import IsAdminRole
+
+# Pings accepted per request
+MAX_PINGS = 1000
+
+
+class IsTraceRecorderOrAdminRole(BasePermission):
+    """
+    Drivers and admins record pings; only admins replay traces.
+    """
+    message = "Only users with admin role are allowed to replay ride traces."
+
+    def has_permission(self, request, view):
+        if request.method == 'POST':
+            return IsDriverOrAdminRole().has_permission(request, view)
+        return IsAdminRole().has_permission(request, view)
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsTraceRecorderOrAdminRole])
+@parser_classes([JSONParser, NDJSONParser])
+def ride_trace(request, pk):
+    """
+    POST: buffer location pings (one object, a JSON array or NDJSON) of an
+    active ride. Drivers record the pings of their own rides.
+
+    GET: stream the trace of a ride as NDJSON (default) or CSV
+    (`?output=csv`), in time order: the stored trace of a finished ride, or
+    the pings buffered so far of an active one. `?simplify_m=` drops the
+    points closer than that many metres to the simplified line.
+    """
+    ride = Ride.objects.only('id_ride', 'status', 'id_driver').filter(pk=pk).first()
+    if ride is None:
+        raise NotFound(f'Ride {pk} does not exist.')
+    if request.method == 'POST':
+        return record_trace_pings(request, ride)
+    return replay_trace(request, ride)
+
+
+def record_trace_pings(request, ride):
+    id_driver = driver_claim(request)
+    if id_driver is not None and id_driver != ride.id_driver_id:
+        raise PermissionDenied(f'Ride {ride.pk} is not assigned to you.')
+    if ride.status in FINISHED_STATUSES:
+        raise ValidationError({'detail': f'Ride {ride.pk} is {ride.status}: its trace is closed.'})
+
+    items = request.data if isinstance(request.data, list) else [request.data]
+    serializer = TracePingSerializer(data=items, many=True, allow_empty=False, max_length=MAX_PINGS)
+    serializer.is_valid(raise_exception=True)
+    now = timezone.now()
+    points = [
+        to_point(ping.get('recorded_at', now), ping['latitude'], ping['longitude'])
+        for ping in serializer.validated_data
+    ]
+    return Response({'buffered': record_pings(ride.pk, points)})
+
+
+def replay_trace(request, ride):
+    serializer = TraceReplaySerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    params = serializer.validated_data
+
+    # Pings not stored yet are buffered: those of an active ride, or of a
+    # finished one whose trace failed to be stored
+    points = buffered_points(ride.pk)
+    trace = RideTrace.objects.filter(pk=ride.pk).first()
+    if trace is not None:
+        points = sorted(stored_points(trace) + points)
+    if not points and ride.status in FINISHED_STATUSES:
+        raise NotFound(f'No trace was recorded for ride {ride.pk}.')
+    points = simplify(points, params['simplify_m'])
+    return export_response((point_row(point) for point in points), params['output'], f'ride-{ride.pk}-trace')
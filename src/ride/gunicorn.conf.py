@@ -0,0 +1,22 @@
+"""
+Gunicorn configuration for serving the project over ASGI with Uvicorn workers:
+
+    cd src/ride && gunicorn -c gunicorn.conf.py ride.asgi:application
+
+Every setting can be overridden from the environment.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8080')
+worker_class = 'uvicorn_worker.UvicornWorker'
+# An async worker keeps many connections open on one event loop, so one
+# worker per core is enough
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
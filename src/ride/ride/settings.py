@@ -88,7 +88,7 @@ ACCOUNT_EMAIL_VERIFICATION = "none"
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication'
+        'core.utils.authentication.RoleClaimsJWTAuthentication'
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAdminUser',
@@ -138,9 +138,46 @@ DATABASES = {
         'PASSWORD': 'ridepassword',
         'HOST': 'rider-postgres',
         'PORT': '5432',
+        # Connections stay open between requests and are checked before reuse
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # tells the app's connections apart in pg_stat_activity
+            'application_name': 'ride',
+        },
     },
 }
 
+# DATABASE_POOL=1 replaces the persistent connections with a psycopg 3 pool per
+# worker process; size it from GET /api/admin/pool-stats/
+if os.environ.get('DATABASE_POOL') == '1':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+        # seconds a request waits for a free connection before failing
+        'timeout': int(os.environ.get('DATABASE_POOL_TIMEOUT', 10)),
+    }
+
+# Read replicas of the primary, e.g. DATABASE_REPLICAS="replica-1:5432,replica-2:5432".
+# Each becomes a `replica_<n>` alias with the primary's credentials; with SQLite,
+# list database files instead. Safe reads of the API views are routed to them.
+DATABASE_REPLICAS = []
+for number, location in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), 1):
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+        replica = {'NAME': location.strip()}
+    else:
+        host, _, port = location.strip().partition(':')
+        replica = {'HOST': host, 'PORT': port or DATABASES['default']['PORT']}
+    # tests read the replicas from the primary's test database
+    DATABASES[f'replica_{number}'] = {**DATABASES['default'], **replica, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['core.utils.db_router.PrimaryReplicaRouter']
+
+# Seconds the reads of a user stay on the primary after one of their writes
+REPLICA_PIN_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -199,10 +236,99 @@ CACHES = {
             "PARSER_CLASS": "redis.connection.HiredisParser",
             "SOCKET_TIMEOUT": 10,
             "SOCKET_CONNECT_TIMEOUT": 10,
+            # Callers wait up to `timeout` seconds for a free connection
+            # instead of failing once `max_connections` are open
+            "CONNECTION_POOL_CLASS": "redis.BlockingConnectionPool",
+            "CONNECTION_POOL_KWARGS": {
+                "max_connections": int(os.environ.get("REDIS_MAX_CONNECTIONS", 50)),
+                "timeout": 5,
+                "health_check_interval": 30,
+                "socket_keepalive": True,
+            },
         },
     }
 }
 
+# Paginated list counts
+# Unfiltered lists use the planner estimate once a table holds at least
+# COUNT_ESTIMATE_THRESHOLD rows; filtered counts are cached for
+# COUNT_CACHE_TIMEOUT seconds, keyed by the filter parameters.
+COUNT_ESTIMATE_THRESHOLD = 10000
+COUNT_CACHE_TIMEOUT = 30
+
+# Ride list responses are cached for RIDE_LIST_CACHE_TIMEOUT seconds and
+# invalidated through generation counters when rides, events or users change.
+# Set to 0 to disable.
+RIDE_LIST_CACHE_TIMEOUT = 60
+
+# Window of events kept in Ride.recent_events (see `expire_recent_events`)
+RECENT_EVENTS_WINDOW_HOURS = 24
+
+# Render ride list/retrieve responses with the compiled read-only serializer
+FAST_READ_SERIALIZERS = True
+
+# Rows fetched per round trip by the server-side cursor of the export endpoints
+EXPORT_CHUNK_SIZE = 2000
+
+# Maximum number of items accepted by one bulk create/update request
+BULK_MAX_ITEMS = 10000
+
+# Requests of the async (ASGI) endpoints querying the database at once, per
+# worker event loop; each holds one database connection while it does
+ASYNC_DB_CONCURRENCY = 20
+
+# Range partitioning of ride events by created_at (PostgreSQL, see `partition_ride_events`):
+# partition size ('day' or 'month'), future partitions kept created, and retention
+# in days (None keeps every event)
+RIDE_EVENT_PARTITION_INTERVAL = 'day'
+RIDE_EVENT_PARTITIONS_AHEAD = 7
+RIDE_EVENT_RETENTION_DAYS = None
+
+# Buffered ride event ingestion (see `drain_ride_events`): stream key, window in
+# seconds within which a repeated dedup_key is dropped, idle time after which
+# a worker takes over the entries another worker did not acknowledge, and
+# deliveries after which an entry that fails on its own is dead-lettered
+RIDE_EVENT_INGEST_STREAM = 'ride-events:ingest'
+RIDE_EVENT_INGEST_DEDUP_SECONDS = 24 * 3600
+RIDE_EVENT_INGEST_CLAIM_IDLE_MS = 60000
+RIDE_EVENT_INGEST_MAX_DELIVERIES = 5
+
+# Server push of ride changes (`/api/push/rides/`): prefix of the Redis pub/sub
+# channels, seconds between keepalive comments, messages buffered per client
+# before its stream is ended with an `overflow` event, channels per connection
+PUSH_CHANNEL_PREFIX = 'push:'
+PUSH_HEARTBEAT_SECONDS = 15
+PUSH_QUEUE_SIZE = 100
+PUSH_MAX_CHANNELS = 50
+
+# Driver matching (`/api/drivers/`): prefix of the Redis keys, entries kept in
+# the stream of location changes, how far behind the index of a worker may be,
+# and seconds without a report after which a driver is considered offline
+DRIVER_KEY_PREFIX = 'drivers:'
+DRIVER_UPDATES_MAXLEN = 200000
+DRIVER_INDEX_REFRESH_MS = 500
+DRIVER_LOCATION_TTL_SECONDS = 120
+
+# GPS traces (`/api/rides/<id>/trace/`): prefix of the Redis buffers of active
+# rides, seconds a buffer is kept if its ride never finishes, and distance
+# under which points are dropped when a finished trace is simplified (0 keeps all)
+RIDE_TRACE_KEY_PREFIX = 'trace:'
+RIDE_TRACE_BUFFER_TTL_SECONDS = 24 * 60 * 60
+RIDE_TRACE_SIMPLIFY_METERS = 3
+
+# Analytics rollups (`/api/analytics/rides/`): geohash precision of the pickup
+# cells (~4.9 x 4.9 km at 5; run `rebuild_rollups` after changing it) and
+# hours covered when no range is given
+RIDE_ROLLUP_CELL_PRECISION = 5
+RIDE_ANALYTICS_DEFAULT_HOURS = 24
+
+# Distance matrices (`/api/distance-matrix/`): values computed per block, which
+# bounds the memory of a request, positions accepted per side, and size of the
+# full matrix returned when no `k` is given
+DISTANCE_MATRIX_CHUNK_CELLS = 1 << 20
+DISTANCE_MATRIX_MAX_POSITIONS = 10000
+DISTANCE_MATRIX_MAX_CELLS = 250000
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
@@ -232,6 +358,12 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Embed the core user role and id as claims when tokens are issued, so
+# permission checks are answered from the token without user lookups
+JWT_ROLE_CLAIMS = True
+# Reject tokens revoked through the cache (role changes, explicit revocation)
+JWT_REVOCATION_CHECK = True
+
 # Django-allauth settings
 ACCOUNT_EMAIL_REQUIRED = True
 ACCOUNT_UNIQUE_EMAIL = True
@@ -18,7 +18,6 @@ from django.contrib import admin
 from django.urls import include, path, re_path
 from rest_framework import routers
 from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
     TokenRefreshView,
     TokenVerifyView,
 )
@@ -38,7 +37,7 @@ urlpatterns = [
     path("admin/", admin.site.urls),
 
     # jwt authentication and generation
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('api/token/', RoleTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
 
@@ -46,5 +45,32 @@ urlpatterns = [
     path('api/register/', register_user, name='register_user'),
     path('__debug__/', include(debug_toolbar.urls)),
 
+    # connection pool statistics
+    path('api/admin/pool-stats/', pool_stats, name='pool_stats'),
+
+    # buffered ride event ingestion
+    path('api/ride-events/ingest/', ride_event_ingest, name='ride_event_ingest'),
+    path('api/admin/ingest-stats/', ride_event_ingest_stats, name='ride_event_ingest_stats'),
+
+    # pre-aggregated ride analytics
+    path('api/analytics/rides/', ride_analytics, name='ride_analytics'),
+
+    # async (ASGI) read endpoints
+    path('api/async/rides/', async_ride_list, name='async_ride_list'),
+    path('api/async/rides/<int:pk>/', async_ride_detail, name='async_ride_detail'),
+    path('api/async/ride-events/', async_ride_event_list, name='async_ride_event_list'),
+    path('api/async/ride-events/<int:pk>/', async_ride_event_detail, name='async_ride_event_detail'),
+
+    # driver locations and matching
+    path('api/drivers/location/', driver_location, name='driver_location'),
+    path('api/drivers/nearest/', nearest_available_drivers, name='nearest_available_drivers'),
+    path('api/distance-matrix/', batch_distance_matrix, name='distance_matrix'),
+
+    # GPS traces of rides
+    path('api/rides/<int:pk>/trace/', ride_trace, name='ride_trace'),
+
+    # server-sent ride updates (ASGI)
+    path('api/push/rides/', ride_push, name='ride_push'),
+
     re_path(r'^api/', include(router.urls)),
 ]